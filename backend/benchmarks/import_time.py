@@ -0,0 +1,95 @@
+"""
+import_time.py
+
+Boot-latency benchmark: runs `python -X importtime -c "import <module>"`
+in a fresh interpreter and summarizes where import time goes.
+
+Usage (from backend/):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module main --top 15 --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str = "main") -> dict:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    wall_s = time.perf_counter() - started
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    # "import time: self [us] | cumulative | imported package"
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us)
+        })
+
+    target = next((e for e in reversed(entries) if e["module"] == module), None)
+
+    return {
+        "module": module,
+        "wall_s": round(wall_s, 4),
+        "import_us": target["cumulative_us"] if target else None,
+        "modules_imported": len(entries),
+        "entries": entries
+    }
+
+
+def summarize(result: dict, top: int = 10) -> dict:
+    heaviest = sorted(
+        result["entries"], key=lambda e: e["cumulative_us"], reverse=True
+    )
+    return {
+        "module": result["module"],
+        "wall_s": result["wall_s"],
+        "import_ms": round(result["import_us"] / 1000, 2) if result["import_us"] else None,
+        "modules_imported": result["modules_imported"],
+        "heaviest": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 2)}
+            for e in heaviest[:top]
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    summary = summarize(measure_import(args.module), args.top)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"import {summary['module']}: {summary['import_ms']} ms "
+          f"({summary['modules_imported']} modules, wall {summary['wall_s']} s)")
+    for e in summary["heaviest"]:
+        print(f"  {e['cumulative_ms']:>10.2f} ms  {e['module']}")
+
+
+if __name__ == "__main__":
+    main()
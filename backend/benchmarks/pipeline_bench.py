@@ -0,0 +1,332 @@
+"""
+pipeline_bench.py
+
+Microbenchmarks for the graph post-processing pipeline on synthetic inputs:
+1. Synthetic catalogs (10 .. 10k nodes across aws / gcp / azure)
+2. Synthetic logical graphs (10 .. 5k nodes, varied edge density)
+3. Per-stage timing (best / median of N) and allocations (tracemalloc peak)
+4. Comparison against a baseline; exits 1 on regressions. Allocations are
+   gated by default; timings only with --gate-time (median, on a quiet
+   machine), since wall time does not transfer between machines
+
+Stages: connectivity index, graph parse, normalize, compile_to_canvas,
+InfraSpecBuilder.build, get_nodes (SQLite / snapshot / filtered page).
+
+The baseline is machine-specific and not committed: record it with
+--save-baseline on the machine that runs the comparison, at the commit
+you compare against (e.g. main), then run the comparison on your branch.
+
+Usage (from backend/):
+    python benchmarks/pipeline_bench.py --save-baseline
+    python benchmarks/pipeline_bench.py --quick
+    python benchmarks/pipeline_bench.py --gate-time --repeat 15
+    python benchmarks/pipeline_bench.py --threshold 0.3 --json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.canvas_compiler import compile_to_canvas  # noqa: E402
+from services.catalog_ingest import ingest_entries  # noqa: E402
+from services.connectivity import ConnectivityIndex  # noqa: E402
+from services.graph_generator import InfraGraphGenerator  # noqa: E402
+from services.graph_ir import Graph  # noqa: E402
+from services.infra_spec_builder import InfraSpecBuilder  # noqa: E402
+from services.node_catalog import query_nodes  # noqa: E402
+
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmarks", "pipeline_baseline.json")
+
+CLOUDS = ("aws", "gcp", "azure")
+CATEGORIES = ("compute", "networking", "storage", "database", "messaging", "security")
+CATALOG_SIZES = (10, 100, 1000, 10000)
+GRAPH_SIZES = (10, 100, 1000, 5000)
+EDGE_DENSITIES = (1.5, 4.0)
+QUICK_CATALOG_SIZES = (10, 1000)
+QUICK_GRAPH_SIZES = (10, 1000)
+
+# catalog ids InfraSpecBuilder can map, per cloud (real ids, synthetic labels)
+MAPPED_IDS = {
+    "aws": ["ec2", "ecs", "lambda", "s3", "rds", "dynamodb", "alb", "iam-role", "sqs"],
+    "gcp": ["compute-engine", "cloud-run", "gke-cluster", "cloud-storage", "cloud-sql", "pub-sub"],
+    "azure": ["azure-vm", "aks", "azure-functions", "blob-storage", "azure-sql", "service-bus"]
+}
+BASE_LABELS = {"vpc": "VPC", "subnet": "Subnet", "ec2": "EC2", "rds": "RDS", "s3": "S3"}
+
+
+# ==============================
+# SYNTHETIC INPUTS
+# ==============================
+def synthetic_catalog(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    nodes = []
+    for cloud, ids in MAPPED_IDS.items():
+        for cid in ids:
+            nodes.append({"id": cid, "label": BASE_LABELS.get(cid, cid.upper()), "cloud": cloud})
+    for cid in ("vpc", "subnet"):
+        nodes.append({"id": cid, "label": BASE_LABELS[cid], "cloud": "aws"})
+
+    i = 0
+    while len(nodes) < size:
+        nodes.append({"id": f"svc-{i}", "label": f"Service {i}", "cloud": CLOUDS[i % len(CLOUDS)]})
+        i += 1
+    nodes = nodes[:max(size, 1)]
+
+    ids = [n["id"] for n in nodes]
+    for n in nodes:
+        n["category"] = rng.choice(CATEGORIES)
+        n["icon"] = n["id"]
+        n["description"] = f"Synthetic {n['label']}"
+        n["connections"] = {
+            "canConnectTo": rng.sample(ids, min(len(ids), rng.randint(0, 8))),
+            "canReceiveFrom": rng.sample(ids, min(len(ids), rng.randint(0, 4)))
+        }
+    return nodes
+
+
+def synthetic_graph(size: int, density: float, seed: int = 0) -> dict:
+    """LLM-shaped logical graph: VPC/Subnet hierarchy plus random service edges."""
+    rng = random.Random(seed)
+    labels = ["EC2", "RDS", "S3"] + [f"Service {i}" for i in range(50)]
+
+    nodes = [
+        {"id": "vpc", "type": "cloudNode", "data": {"label": "VPC", "category": "networking", "icon": "vpc", "cloud": "aws"}, "config": {}},
+        {"id": "subnet", "type": "cloudNode", "data": {"label": "Subnet", "category": "networking", "icon": "subnet", "cloud": "aws"}, "config": {}}
+    ]
+    edges = [{"source": "vpc", "target": "subnet", "relation": "contains"}]
+
+    for i in range(max(size - 2, 0)):
+        label = rng.choice(labels)
+        nodes.append({
+            "id": f"n{i}",
+            "type": "cloudNode",
+            "data": {"label": label, "category": "compute", "icon": label.lower(), "cloud": "aws"},
+            "config": {}
+        })
+
+    ids = [n["id"] for n in nodes]
+    for _ in range(int(size * density)):
+        src, tgt = rng.sample(ids, 2) if len(ids) > 1 else (ids[0], ids[0])
+        edges.append({"source": src, "target": tgt, "relation": rng.choice(("contains", "connects_to"))})
+
+    return {"nodes": nodes, "edges": edges}
+
+
+def synthetic_canvas(size: int, density: float, seed: int = 0) -> dict:
+    """UI canvas graph of mapped aws services, the InfraSpecBuilder input."""
+    rng = random.Random(seed)
+    ids = MAPPED_IDS["aws"]
+    nodes = []
+    for i in range(size):
+        cid = rng.choice(ids)
+        nodes.append({
+            "id": f"c{i}",
+            "type": "awsNode",
+            "data": {"label": BASE_LABELS.get(cid, cid.upper()), "category": "compute", "config": {}}
+        })
+    edges = [
+        {"id": f"e{i}", "source": f"c{rng.randrange(size)}", "target": f"c{rng.randrange(size)}"}
+        for i in range(int(size * density))
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def build_catalog_db(catalog: list, workdir: str) -> tuple:
+    db_path = os.path.join(workdir, "nodes.db")
+    snapshot_path = os.path.join(workdir, "catalog.snap")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS nodes (
+        id TEXT PRIMARY KEY,
+        label TEXT NOT NULL,
+        category TEXT NOT NULL,
+        cloud TEXT NOT NULL,
+        icon TEXT NOT NULL,
+        description TEXT,
+        connections TEXT
+    )
+    """)
+    conn.commit()
+    conn.close()
+
+    ingest_entries(catalog, db_path=db_path, snapshot_path=snapshot_path)
+    return db_path, snapshot_path
+
+
+# ==============================
+# MEASUREMENT
+# ==============================
+def measure(fn, setup=None, repeat: int = 5) -> dict:
+    """Best-of-N wall time, then one tracemalloc pass (kept out of the timings)."""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - started)
+
+    arg = setup() if setup else None
+    tracemalloc.start()
+    fn(arg)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "best_ms": round(min(timings) * 1000, 4),
+        "median_ms": round(sorted(timings)[len(timings) // 2] * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(current / 1024, 1)
+    }
+
+
+def run_suite(quick: bool = False, repeat: int = 9, seed: int = 0) -> dict:
+    results = {}
+    catalog_sizes = QUICK_CATALOG_SIZES if quick else CATALOG_SIZES
+    graph_sizes = QUICK_GRAPH_SIZES if quick else GRAPH_SIZES
+
+    # replay provider: no SDK, no network; normalize never calls the LLM
+    generator = InfraGraphGenerator(llm_provider="replay")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for catalog_size in catalog_sizes:
+            catalog = synthetic_catalog(catalog_size, seed)
+            catalog_dir = os.path.join(workdir, str(catalog_size))
+            os.makedirs(catalog_dir)
+            db_path, snapshot_path = build_catalog_db(catalog, catalog_dir)
+            tag = f"catalog={catalog_size}"
+
+            results[f"connectivity_index/{tag}"] = measure(lambda _: ConnectivityIndex(catalog), repeat=repeat)
+            results[f"get_nodes_db/{tag}"] = measure(
+                lambda _: query_nodes(db_path=db_path), repeat=repeat
+            )
+            results[f"get_nodes_snapshot/{tag}"] = measure(
+                lambda _: query_nodes(db_path=db_path, snapshot_path=snapshot_path), repeat=repeat
+            )
+            results[f"get_nodes_page/{tag}"] = measure(
+                lambda _: query_nodes(
+                    db_path=db_path, snapshot_path=snapshot_path,
+                    cloud="aws", fields=("id", "label", "icon"), limit=100
+                ),
+                repeat=repeat
+            )
+
+        connectivity = ConnectivityIndex(synthetic_catalog(max(catalog_sizes), seed))
+        spec_builder = InfraSpecBuilder(synthetic_catalog(max(catalog_sizes), seed))
+
+        for graph_size in graph_sizes:
+            for density in EDGE_DENSITIES:
+                raw = synthetic_graph(graph_size, density, seed)
+                tag = f"graph={graph_size},density={density}"
+
+                results[f"parse/{tag}"] = measure(lambda _: Graph.from_dict(raw), repeat=repeat)
+                results[f"normalize/{tag}"] = measure(
+                    lambda g: generator.normalize(g, connectivity),
+                    setup=lambda: Graph.from_dict(raw),
+                    repeat=repeat
+                )
+
+                normalized = generator.normalize(Graph.from_dict(raw), connectivity)
+                results[f"compile_to_canvas/{tag}"] = measure(
+                    lambda _: compile_to_canvas(normalized), repeat=repeat
+                )
+
+                canvas = synthetic_canvas(graph_size, density, seed)
+                results[f"spec_build/{tag}"] = measure(
+                    lambda _: spec_builder.build(canvas), repeat=repeat
+                )
+
+    return results
+
+
+# ==============================
+# BASELINE
+# ==============================
+def compare(
+    results: dict,
+    baseline: dict,
+    threshold: float,
+    min_ms: float = 0.5,
+    gate_time: bool = False
+) -> list:
+    """
+    A case regresses when peak_kb (or, with gate_time, median_ms) exceeds
+    baseline * (1 + threshold). Cases faster than min_ms are timing noise
+    and only checked for memory.
+    """
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+
+        if (
+            gate_time
+            and base["median_ms"] >= min_ms
+            and current["median_ms"] > base["median_ms"] * (1 + threshold)
+        ):
+            regressions.append({
+                "case": case, "metric": "median_ms",
+                "baseline": base["median_ms"], "current": current["median_ms"]
+            })
+        if base["peak_kb"] > 0 and current["peak_kb"] > base["peak_kb"] * (1 + threshold):
+            regressions.append({
+                "case": case, "metric": "peak_kb",
+                "baseline": base["peak_kb"], "current": current["peak_kb"]
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--quick", action="store_true", help="small subset of sizes")
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative growth")
+    parser.add_argument("--gate-time", action="store_true", help="also fail on median time regressions")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run_suite(quick=args.quick, repeat=args.repeat, seed=args.seed)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✅ Baseline saved: {args.baseline} ({len(results)} cases)")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, gate_time=args.gate_time)
+
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    else:
+        for case, r in results.items():
+            base = baseline.get(case)
+            delta = f"  ({r['median_ms'] / base['median_ms'] - 1:+.0%})" if base and base["median_ms"] else ""
+            print(f"  {r['median_ms']:>10.3f} ms  {r['peak_kb']:>10.1f} KiB  {case}{delta}")
+
+        if not baseline:
+            print("⚠️ No baseline to compare against; run with --save-baseline")
+        for reg in regressions:
+            print(f"❌ {reg['case']}: {reg['metric']} {reg['baseline']} -> {reg['current']}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
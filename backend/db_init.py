@@ -19,6 +19,14 @@ def init_db():
     )
     """)
 
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """)
+    cur.execute("INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('version', '1')")
+
     conn.commit()
     conn.close()
 init_db()
\ No newline at end of file
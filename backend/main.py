@@ -1,22 +1,185 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import sqlite3
-import json
+import os
+import re
+import shlex
+import threading
 import requests
 from typing import Optional
+from pydantic import BaseModel
 
+from services.architecture_store import ArchitectureStore
+from services.cancellation import (
+    REASON_CLIENT_DISCONNECTED,
+    REASON_DEADLINE,
+    CancelToken,
+    Cancelled,
+    cancellation_stats,
+    use_token
+)
 from services.canvas_compiler import compile_to_canvas
+from services.connectivity import load_connectivity_index
+from services.node_catalog import parse_fields, query_nodes
+from services.profiling import PROFILE_FORMATS, REQUEST_ID_HEADER, RequestProfiler
 from fastapi.middleware.cors import CORSMiddleware
-from services.graph_generator import InfraGraphGenerator
+from services.graph_generator import MODES as GRAPH_MODES, InfraGraphGenerator
+from services.llmchat.admission import AdmissionRejected, admission_stats
+from services.run_bundle import BUNDLE_FORMATS, build_bundle
+from services.run_logs import get_run_log
+from services.run_registry import RunRegistry
+from services.terraform_jobs import TerraformJobQueue
+from services.terraform_runners import WarmRunnerPool
 app = FastAPI(title="Cloud Node Registry API")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-Profile-Id"],
 )
 
 DB_NAME = "nodes.db"
-generator = InfraGraphGenerator()
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "catalog.snap")
+RUNS_DIR = "runs"
+LOG_POLL_INTERVAL = 0.25
+LOG_KEEPALIVE_INTERVAL = 15
+RUN_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+# server-side deadline for LLM-backed requests; 0 disables it
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "120"))
+DISCONNECT_POLL_INTERVAL = 0.5
+generator = InfraGraphGenerator(
+    os.getenv("GRAPH_LLM_PROVIDER", "gemini"),
+    use_templates=os.getenv("GRAPH_TEMPLATES", "1") != "0"
+)
+
+PLUGIN_CACHE_DIR = os.getenv("TERRAFORM_PLUGIN_CACHE_DIR")
+PROVIDER_MIRROR_DIR = os.getenv("TERRAFORM_PROVIDER_MIRROR")
+
+run_registry = RunRegistry(os.getenv("RUNS_DB", "runs.db"))
+architecture_store = ArchitectureStore(os.getenv("ARCHITECTURES_DB", "architectures.db"))
+
+# opt-in: X-Profile: <PROFILE_ADMIN_TOKEN> or PROFILE_SAMPLE_RATE > 0
+request_profiler = RequestProfiler(
+    os.getenv("PROFILES_DIR", "profiles"),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    admin_token=os.getenv("PROFILE_ADMIN_TOKEN") or None,
+    mode=os.getenv("PROFILE_MODE", "deterministic")
+)
+
+warm_pool = None
+if int(os.getenv("TERRAFORM_WARM_RUNNERS", "0")) > 0:
+    warm_pool = WarmRunnerPool(
+        size=int(os.getenv("TERRAFORM_WARM_RUNNERS")),
+        runs_dir=RUNS_DIR,
+        plugin_cache_dir=PLUGIN_CACHE_DIR,
+        mirror_dir=PROVIDER_MIRROR_DIR
+    )
+
+# TERRAFORM_RUNNER_CMD swaps docker for a local stand-in (tests / dev)
+job_queue = TerraformJobQueue(
+    max_workers=int(os.getenv("TERRAFORM_WORKERS", "2")),
+    total_memory=os.getenv("TERRAFORM_TOTAL_MEMORY", "2g"),
+    total_cpus=float(os.getenv("TERRAFORM_TOTAL_CPUS", "2")),
+    runner_cmd=shlex.split(os.getenv("TERRAFORM_RUNNER_CMD", "")) or None,
+    plugin_cache_dir=PLUGIN_CACHE_DIR,
+    mirror_dir=PROVIDER_MIRROR_DIR,
+    warm_pool=warm_pool,
+    registry=run_registry
+)
+
+
+@app.exception_handler(AdmissionRejected)
+def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(Cancelled)
+def request_cancelled(request: Request, exc: Cancelled):
+    # 499: client closed the request (nobody reads it); 504: deadline
+    status_code = 504 if exc.reason == REASON_DEADLINE else 499
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": str(exc), "reason": exc.reason}
+    )
+
+
+async def run_cancellable(request: Request, response: Response, scope: str, func, *args):
+    """
+    Run blocking work in the threadpool under a CancelToken that is
+    cancelled when the client disconnects or REQUEST_TIMEOUT_S passes.
+    The worker stops at its next checkpoint (LLM attempt, admission wait).
+    Requests picked by the profiler are profiled on the worker thread.
+    """
+    token = CancelToken(scope, timeout_s=REQUEST_TIMEOUT_S or None)
+
+    trigger = request_profiler.wanted(request.headers)
+    if trigger:
+        profile_id = request_profiler.new_profile_id(scope, request.headers.get(REQUEST_ID_HEADER))
+        response.headers["X-Profile-Id"] = profile_id
+
+    def call():
+        with use_token(token):
+            if not trigger:
+                return func(*args)
+            with request_profiler.capture(profile_id, scope, trigger):
+                return func(*args)
+
+    task = asyncio.ensure_future(run_in_threadpool(call))
+    # a task abandoned after cancel still finishes; swallow its outcome
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if task.done():
+                break
+            if await request.is_disconnected():
+                token.cancel(REASON_CLIENT_DISCONNECTED)
+            if token.cancelled:
+                # respond now; the worker unwinds on its own
+                raise Cancelled(token.reason, scope)
+        return task.result()
+    finally:
+        token.close()
+
+
+@app.on_event("startup")
+def start_warm_runners():
+    if warm_pool:
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        warm_pool.start()
+
+
+@app.on_event("startup")
+def warm_up_llm():
+    # provider SDKs load lazily; opt in to paying that cost before traffic
+    if os.getenv("LLM_WARMUP") == "1":
+        threading.Thread(target=generator.warm_up, name="llm-warmup", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_run_gc():
+    run_registry.sync_from_disk(RUNS_DIR)
+    run_registry.start_gc(
+        interval_s=float(os.getenv("RUN_GC_INTERVAL", "3600")),
+        active_runs=job_queue.active_runs,
+        max_age_days=float(os.getenv("RUN_RETENTION_DAYS", "30")),
+        max_count=int(os.getenv("RUN_RETENTION_COUNT", "500")),
+        compact_after_days=float(os.getenv("RUN_COMPACT_AFTER_DAYS", "3"))
+    )
+
+
+@app.on_event("shutdown")
+def stop_warm_runners():
+    if warm_pool:
+        warm_pool.stop()
 
 def get_db():
     conn = sqlite3.connect(DB_NAME)
@@ -26,52 +189,399 @@ def get_db():
 
 @app.get("/nodes")
 def get_nodes(
+    response: Response,
     cloud: Optional[str] = Query(None, description="gcp | aws | azure"),
     category: Optional[str] = Query(None, description="compute | networking | storage | database | messaging | security"),
-    label: Optional[str] = Query(None, description="Search by label")
+    label: Optional[str] = Query(None, description="Search by label"),
+    fields: Optional[str] = Query(None, description="Comma-separated projection, e.g. id,label,icon,category"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor (X-Next-Cursor of the previous page)")
 ):
-    conn = get_db()
-    cur = conn.cursor()
-
-    query = "SELECT * FROM nodes WHERE 1=1"
-    params = []
-
-    if cloud:
-        query += " AND cloud = ?"
-        params.append(cloud)
-
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-
-    if label:
-        query += " AND label LIKE ?"
-        params.append(f"%{label}%")
-
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
-
-    nodes = []
-    for row in rows:
-        nodes.append({
-            "id": row["id"],
-            "label": row["label"],
-            "category": row["category"],
-            "cloud": row["cloud"],
-            "icon": row["icon"],  # 👈 IMPORTANT
-            "description": row["description"],
-            "connections": json.loads(row["connections"]) if row["connections"] else {
-                "canConnectTo": [],
-                "canReceiveFrom": []
-            }
-        })
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    nodes, next_cursor = query_nodes(
+        db_path=DB_NAME,
+        snapshot_path=CATALOG_SNAPSHOT,
+        cloud=cloud,
+        category=category,
+        label=label,
+        fields=projection,
+        limit=limit,
+        after=after
+    )
 
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
     return nodes
+
+
+@app.get("/nodes/{node_id}/compatible")
+def get_compatible_nodes(node_id: str):
+    connectivity = load_connectivity_index(DB_NAME, CATALOG_SNAPSHOT)
+    if node_id not in connectivity:
+        raise HTTPException(status_code=404, detail=f"Node not found: {node_id}")
+    return connectivity.compatible(node_id)
+
+
 @app.post("/generate-graph")
-def generate_graph(prompt: str):
+async def generate_graph(
+    request: Request,
+    response: Response,
+    prompt: str,
+    mode: str = Query("single", description="single | hierarchical (large architectures)"),
+    save: bool = Query(False, description="store the result in the architecture store"),
+    name: Optional[str] = None
+):
+    if mode not in GRAPH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {GRAPH_MODES}")
+
+    return await run_cancellable(request, response, "generate-graph", _generate_graph, prompt, mode, save, name)
+
+
+def _generate_graph(prompt: str, mode: str, save: bool, name: Optional[str]):
     nodes = requests.get("http://localhost:8000/nodes").json()
-    logical_graph = generator.generate(prompt, nodes)
+    logical_graph = generator.generate(
+        prompt,
+        nodes,
+        connectivity=load_connectivity_index(DB_NAME, CATALOG_SNAPSHOT),
+        mode=mode,
+        as_ir=True
+    )
     canvas_graph = compile_to_canvas(logical_graph["graph"])
+    result = {
+        "summary": logical_graph["summary"],"graph": canvas_graph,
+        "template": logical_graph["template"],
+        # input for /refine-graph when the result is not saved
+        "logical_graph": logical_graph["graph"].to_dict()}
+
+    if save:
+        result["architecture"] = architecture_store.save(
+            graph=logical_graph["graph"].to_dict(),
+            canvas=canvas_graph,
+            summary=logical_graph["summary"],
+            name=name,
+            prompt=prompt
+        )
+    return result
+
+
+class RefineRequest(BaseModel):
+    instruction: str
+    graph: Optional[dict] = None
+    arch_id: Optional[str] = None
+    version_id: Optional[str] = None
+    save: bool = False
+
+
+@app.post("/refine-graph")
+async def refine_graph(request: Request, response: Response, req: RefineRequest):
+    """
+    Edit an existing logical graph (inline, or a stored architecture
+    version) with a small LLM edit script instead of regenerating it.
+    """
+    return await run_cancellable(request, response, "refine-graph", _refine_graph, req)
+
+
+def _refine_graph(req: RefineRequest):
+    graph = req.graph
+    if req.arch_id:
+        architecture = architecture_store.load(req.arch_id, req.version_id)
+        if not architecture:
+            raise HTTPException(status_code=404, detail=f"Architecture not found: {req.arch_id}")
+        graph = architecture["graph"]
+    if graph is None:
+        raise HTTPException(status_code=400, detail="graph or arch_id is required")
+
+    refined = generator.refine(
+        graph,
+        req.instruction,
+        connectivity=load_connectivity_index(DB_NAME, CATALOG_SNAPSHOT),
+        as_ir=True
+    )
+    canvas_graph = compile_to_canvas(refined["graph"])
+    result = {
+        "summary": refined["summary"],
+        "graph": canvas_graph,
+        "logical_graph": refined["graph"].to_dict(),
+        "operations": refined["operations"],
+        "skipped": refined["skipped"]
+    }
+
+    if req.save:
+        # stored architectures get a new version on top of the edited one
+        result["architecture"] = architecture_store.save(
+            graph=result["logical_graph"],
+            canvas=canvas_graph,
+            summary=refined["summary"],
+            arch_id=req.arch_id,
+            parent_id=architecture["version_id"] if req.arch_id else None,
+            prompt=None if req.arch_id else req.instruction
+        )
+    return result
+
+
+class ArchitectureVersion(BaseModel):
+    graph: dict
+    canvas: Optional[dict] = None
+    summary: str = ""
+    parent_id: Optional[str] = None
+    name: Optional[str] = None
+    prompt: Optional[str] = None
+
+
+@app.post("/architectures")
+def create_architecture(req: ArchitectureVersion):
+    return architecture_store.save(
+        graph=req.graph,
+        canvas=req.canvas,
+        summary=req.summary,
+        name=req.name,
+        prompt=req.prompt
+    )
+
+
+@app.get("/architectures")
+def list_architectures(
+    before: Optional[str] = Query(None, description="updated_at cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    return architecture_store.list_architectures(before=before, limit=limit)
+
+
+@app.get("/architectures/{arch_id}")
+def get_architecture(arch_id: str, version_id: Optional[str] = None):
+    architecture = architecture_store.load(arch_id, version_id)
+    if not architecture:
+        raise HTTPException(status_code=404, detail=f"Architecture not found: {arch_id}")
+    return architecture
+
+
+@app.post("/architectures/{arch_id}/versions")
+def save_architecture_version(arch_id: str, req: ArchitectureVersion):
+    try:
+        return architecture_store.save(
+            graph=req.graph,
+            canvas=req.canvas,
+            summary=req.summary,
+            arch_id=arch_id,
+            parent_id=req.parent_id,
+            name=req.name,
+            prompt=req.prompt
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+@app.get("/architectures/{arch_id}/versions")
+def list_architecture_versions(arch_id: str):
+    versions = architecture_store.list_versions(arch_id)
+    if not versions:
+        raise HTTPException(status_code=404, detail=f"Architecture not found: {arch_id}")
+    return versions
+
+
+class JobRequest(BaseModel):
+    action: str = "apply"
+    project_id: str
+    sa_key_json: str
+    confirm_destroy: bool = False
+    plan_first: bool = False
+    # deadline counted from submission, so it includes time spent queued
+    timeout_s: Optional[float] = None
+
+
+def get_run_path(run_id: str) -> str:
+    # strict ids only: "..", "." or encoded separators must never escape runs/
+    if not RUN_ID_RE.match(run_id):
+        raise HTTPException(status_code=404, detail=f"Run not found: {run_id}")
+
+    runs_root = os.path.realpath(RUNS_DIR)
+    run_path = os.path.join(RUNS_DIR, run_id)
+    if (
+        os.path.commonpath([runs_root, os.path.realpath(run_path)]) != runs_root
+        or not os.path.isdir(run_path)
+    ):
+        raise HTTPException(status_code=404, detail=f"Run not found: {run_id}")
+    return run_path
+
+
+@app.get("/llm/admission")
+def get_llm_admission():
+    return admission_stats()
+
+
+@app.get("/runs")
+def list_runs(
+    provider: Optional[str] = None,
+    status: Optional[str] = None,
+    service: Optional[str] = None,
+    spec_hash: Optional[str] = None,
+    before: Optional[str] = Query(None, description="created_at cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    return run_registry.list_runs(
+        provider=provider,
+        status=status,
+        service=service,
+        spec_hash=spec_hash,
+        before=before,
+        limit=limit
+    )
+
+
+@app.get("/runs/{run_id}")
+def get_run(run_id: str):
+    run = run_registry.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail=f"Run not found: {run_id}")
+    return run
+
+
+@app.get("/runs/{run_id}/bundle")
+def download_run_bundle(
+    run_id: str,
+    format: str = Query("tar.gz", description="tar.gz | zip")
+):
+    if format not in BUNDLE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(BUNDLE_FORMATS)}")
+
+    # cached next to meta.json; FileResponse streams it (sendfile, Range requests)
+    archive = build_bundle(get_run_path(run_id), format)
+    return FileResponse(
+        archive,
+        media_type=BUNDLE_FORMATS[format],
+        filename=f"{run_id}.{format}"
+    )
+
+
+@app.post("/runs/{run_id}/jobs")
+def submit_job(run_id: str, body: JobRequest):
+    try:
+        job_id = job_queue.submit(
+            run_path=get_run_path(run_id),
+            action=body.action,
+            project_id=body.project_id,
+            sa_key_json=body.sa_key_json,
+            confirm_destroy=body.confirm_destroy,
+            plan_first=body.plan_first,
+            timeout_s=body.timeout_s
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return job_queue.status(job_id)
+
+
+@app.get("/jobs")
+def list_jobs(run_id: Optional[str] = None):
+    return job_queue.list_jobs(run_id)
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, wait: float = Query(0, description="Seconds to wait for completion")):
+    try:
+        if wait:
+            return job_queue.result(job_id, timeout=min(wait, 60))
+        return job_queue.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    try:
+        return job_queue.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/cancellations")
+def get_cancellations():
+    return cancellation_stats()
+
+
+@app.get("/profiles")
+def list_profiles(request: Request, limit: int = Query(50, ge=1, le=500)):
+    if not request_profiler.authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Profiling admin header required (PROFILE_ADMIN_TOKEN)")
+    return request_profiler.list_profiles(limit)
+
+
+@app.get("/profiles/{profile_id}")
+def download_profile(
+    request: Request,
+    profile_id: str,
+    format: str = Query("pstats", description="pstats | txt | collapsed")
+):
+    if not request_profiler.authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Profiling admin header required (PROFILE_ADMIN_TOKEN)")
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(PROFILE_FORMATS)}")
+
+    path = request_profiler.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}.{format}")
+    return FileResponse(path, media_type=PROFILE_FORMATS[format], filename=os.path.basename(path))
+
+
+@app.get("/runs/{run_id}/logs")
+def get_run_logs(
+    run_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    log = get_run_log(get_run_path(run_id))
+    lines, next_offset = log.read(offset, limit)
+
     return {
-        "summary": logical_graph["summary"],"graph": canvas_graph}
\ No newline at end of file
+        "lines": [{"offset": n, "line": line} for n, line in lines],
+        "next_offset": next_offset,
+        "closed": log.closed
+    }
+
+
+@app.get("/runs/{run_id}/logs/stream")
+async def stream_run_logs(run_id: str, request: Request, offset: int = Query(0, ge=0)):
+    """
+    Server-Sent Events tail. Each event id is the line offset, so
+    reconnecting clients resume via Last-Event-ID (or ?offset=).
+    """
+    log = get_run_log(get_run_path(run_id))
+
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id) + 1
+
+    async def events():
+        nonlocal offset
+        idle = 0.0
+
+        while not await request.is_disconnected():
+            # file reads for old offsets must not block the event loop
+            lines, offset = await run_in_threadpool(log.read, offset)
+            if lines:
+                idle = 0.0
+                for n, line in lines:
+                    yield f"id: {n}\ndata: {line}\n\n"
+                continue
+
+            if log.closed and offset >= log.next_offset:
+                yield "event: end\ndata: \n\n"
+                return
+
+            await asyncio.sleep(LOG_POLL_INTERVAL)
+            idle += LOG_POLL_INTERVAL
+            if idle >= LOG_KEEPALIVE_INTERVAL:
+                idle = 0.0
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
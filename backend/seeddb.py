@@ -1,5 +1,4 @@
-import sqlite3
-import json
+from services.catalog_ingest import ingest_entries
 
 DB_NAME = "nodes.db"
 
@@ -255,27 +254,16 @@ nodes = [
 ]
 
 def seed_db():
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
+    report = ingest_entries(nodes, DB_NAME)
 
-    for node in nodes:
-        cur.execute("""
-        INSERT OR REPLACE INTO nodes
-        (id, label, category, cloud, icon, description, connections)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            node["id"],
-            node["label"],
-            node["category"],
-            node["cloud"],
-            node["icon"],
-            node["description"],
-            json.dumps(node["connections"])
-        ))
+    for item in report["invalid"]:
+        print(f"⚠️ Skipped {item['location']}: {item['error']}")
 
-    conn.commit()
-    conn.close()
-    print("✅ Nodes inserted successfully")
+    print(
+        f"✅ Nodes synced: {report['inserted']} inserted, "
+        f"{report['updated']} updated, {report['unchanged']} unchanged "
+        f"(catalog v{report['catalog_version']})"
+    )
 
 if __name__ == "__main__":
     seed_db()
@@ -0,0 +1,243 @@
+"""
+architecture_store.py
+
+Persistent, versioned store for generated architectures (SQLite):
+1. Graph / canvas payloads as zlib-compressed blobs keyed by content hash,
+   so identical payloads are stored once across all architectures
+2. Versions keyed by content hash, with parent links (edit history)
+3. Saving content identical to an existing version of the same
+   architecture reuses that version instead of creating a new one
+Reloading a saved architecture is a local read, not an LLM call.
+"""
+
+import json
+import uuid
+import zlib
+import sqlite3
+import hashlib
+from datetime import datetime
+
+ARCHITECTURES_DB = "architectures.db"
+COMPRESS_LEVEL = 6
+
+
+def canonical_json(payload) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ArchitectureStore:
+    def __init__(self, db_path: str = ARCHITECTURES_DB):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS architectures (
+            arch_id TEXT PRIMARY KEY,
+            name TEXT,
+            prompt TEXT,
+            head_version TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS versions (
+            version_id TEXT NOT NULL,
+            arch_id TEXT NOT NULL REFERENCES architectures(arch_id),
+            parent_id TEXT,
+            graph_hash TEXT NOT NULL REFERENCES blobs(hash),
+            canvas_hash TEXT REFERENCES blobs(hash),
+            summary TEXT,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (arch_id, version_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_arch_updated ON architectures(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_versions_created ON versions(arch_id, created_at);
+        """)
+        conn.commit()
+        conn.close()
+
+    # -------------------------
+    # BLOBS
+    # -------------------------
+    def _put_blob(self, conn, payload) -> str:
+        raw = canonical_json(payload)
+        digest = content_hash(raw)
+        # identical payloads (any architecture) are stored once
+        conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)",
+            (digest, zlib.compress(raw, COMPRESS_LEVEL), len(raw))
+        )
+        return digest
+
+    def _get_blob(self, conn, digest: str):
+        if digest is None:
+            return None
+        row = conn.execute("SELECT data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        return json.loads(zlib.decompress(row["data"])) if row else None
+
+    # -------------------------
+    # WRITES
+    # -------------------------
+    def save(
+        self,
+        graph: dict,
+        canvas: dict = None,
+        summary: str = "",
+        arch_id: str = None,
+        parent_id: str = None,
+        name: str = None,
+        prompt: str = None
+    ) -> dict:
+        """
+        Save a version. Without arch_id a new architecture is created;
+        otherwise the version is added on top of parent_id (default: head).
+        """
+        now = datetime.utcnow().isoformat()
+        conn = self._connect()
+        try:
+            with conn:
+                if arch_id is None:
+                    arch_id = self._create_arch_id()
+                    conn.execute("""
+                    INSERT INTO architectures (arch_id, name, prompt, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """, (arch_id, name, prompt, now, now))
+                    head = None
+                else:
+                    row = conn.execute(
+                        "SELECT head_version FROM architectures WHERE arch_id = ?", (arch_id,)
+                    ).fetchone()
+                    if row is None:
+                        raise KeyError(f"Architecture not found: {arch_id}")
+                    head = row["head_version"]
+
+                if parent_id is None:
+                    parent_id = head
+                elif not self._version_exists(conn, arch_id, parent_id):
+                    raise KeyError(f"Version not found: {arch_id}/{parent_id}")
+
+                graph_hash = self._put_blob(conn, graph)
+                canvas_hash = self._put_blob(conn, canvas) if canvas is not None else None
+                version_id = content_hash(
+                    f"{graph_hash}:{canvas_hash or ''}:{summary or ''}".encode("utf-8")
+                )[:16]
+
+                existing = conn.execute(
+                    "SELECT parent_id FROM versions WHERE arch_id = ? AND version_id = ?",
+                    (arch_id, version_id)
+                ).fetchone()
+                created = existing is None
+                if existing is not None:
+                    # identical content: reuse the version, only move head
+                    parent_id = existing["parent_id"]
+                else:
+                    conn.execute("""
+                    INSERT INTO versions
+                    (version_id, arch_id, parent_id, graph_hash, canvas_hash, summary, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (version_id, arch_id, parent_id, graph_hash, canvas_hash, summary, now))
+
+                conn.execute("""
+                UPDATE architectures
+                SET head_version = ?, updated_at = ?,
+                    name = COALESCE(?, name), prompt = COALESCE(?, prompt)
+                WHERE arch_id = ?
+                """, (version_id, now, name, prompt, arch_id))
+        finally:
+            conn.close()
+
+        return {
+            "arch_id": arch_id,
+            "version_id": version_id,
+            "parent_id": parent_id,
+            "created": created
+        }
+
+    def _version_exists(self, conn, arch_id: str, version_id: str) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM versions WHERE arch_id = ? AND version_id = ?", (arch_id, version_id)
+        ).fetchone() is not None
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def load(self, arch_id: str, version_id: str = None):
+        """Full version (graph + canvas); head when version_id is None."""
+        conn = self._connect()
+        try:
+            arch = conn.execute(
+                "SELECT * FROM architectures WHERE arch_id = ?", (arch_id,)
+            ).fetchone()
+            if arch is None:
+                return None
+
+            row = conn.execute(
+                "SELECT * FROM versions WHERE arch_id = ? AND version_id = ?",
+                (arch_id, version_id or arch["head_version"])
+            ).fetchone()
+            if row is None:
+                return None
+
+            return {
+                **dict(arch),
+                **self._version_to_dict(row),
+                "graph": self._get_blob(conn, row["graph_hash"]),
+                "canvas": self._get_blob(conn, row["canvas_hash"])
+            }
+        finally:
+            conn.close()
+
+    def list_architectures(self, before: str = None, limit: int = 50) -> list:
+        """Most recently updated first; pass the last updated_at as `before`."""
+        query = "SELECT * FROM architectures"
+        params = []
+        if before:
+            query += " WHERE updated_at < ?"
+            params.append(before)
+        query += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    def list_versions(self, arch_id: str) -> list:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT * FROM versions WHERE arch_id = ? ORDER BY created_at DESC", (arch_id,)
+        ).fetchall()
+        conn.close()
+        return [self._version_to_dict(r) for r in rows]
+
+    def _version_to_dict(self, row) -> dict:
+        return {
+            "arch_id": row["arch_id"],
+            "version_id": row["version_id"],
+            "parent_id": row["parent_id"],
+            "summary": row["summary"],
+            "graph_hash": row["graph_hash"],
+            "canvas_hash": row["canvas_hash"],
+            "created_at": row["created_at"]
+        }
+
+    def _create_arch_id(self) -> str:
+        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        uid = uuid.uuid4().hex[:6]
+        return f"arch_{ts}_{uid}"
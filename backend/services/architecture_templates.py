@@ -0,0 +1,402 @@
+"""
+architecture_templates.py
+
+Local fast path for common architectures:
+1. Parameterized templates written against CANONICAL_SERVICE_MAP services
+   (slots list alternatives, e.g. serverless | cloud_run)
+2. TF-IDF intent matcher over each template's name, description and examples;
+   every required slot besides the primary one must be asked for, so a
+   short prompt never gets resources it did not mention
+3. Instantiation against the live catalog for the requested cloud,
+   with simple parameters (cloud, instance count)
+Only confident matches are answered locally; anything else goes to the LLM.
+"""
+
+import math
+import re
+from collections import Counter
+
+from services.service_registry import CANONICAL_SERVICE_MAP
+
+# a match must clear both to skip the LLM
+MIN_SCORE = 0.35
+MIN_MARGIN = 0.08
+# every content word must be known to the matched template: unknown
+# services ("redis", "kafka") or another template's ("postgres" for a
+# NoSQL template) mean the request is bespoke
+MIN_COVERAGE = 1.0
+# "without a database", "no load balancer": templates cannot drop slots
+NEGATIONS = {"no", "not", "without", "except", "excluding", "exclude", "never", "don", "dont", "skip"}
+# phrases that evidence a slot (matched as whole tokenized terms)
+LB_EVIDENCE = ["load balancer", "balancer", "lb", "alb", "elb", "ingress"]
+SQL_EVIDENCE = ["database", "db", "sql", "mysql", "postgres", "postgresql", "relational", "rds", "cloud sql"]
+NOSQL_EVIDENCE = ["database", "db", "nosql", "dynamodb", "firestore", "cosmos"]
+STORAGE_EVIDENCE = ["bucket", "storage", "object storage", "s3", "gcs", "blob"]
+QUEUE_EVIDENCE = ["queue", "sqs", "pubsub", "pub sub", "message", "topic"]
+
+# long prompts describe bespoke architectures, one-word prompts are too vague
+MAX_PROMPT_WORDS = 40
+MIN_PROMPT_WORDS = 2
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "with", "for", "to", "of", "on", "in", "into", "from",
+    "i", "we", "need", "want", "build", "create", "design", "make", "deploy", "set", "up",
+    "using", "use", "my", "our", "that", "some", "plus"
+}
+
+CLOUD_KEYWORDS = {
+    "aws": ("aws", "amazon"),
+    "gcp": ("gcp", "google"),
+    "azure": ("azure", "microsoft")
+}
+
+CLOUD_WORDS = {w for keywords in CLOUD_KEYWORDS.values() for w in keywords}
+
+_COUNT_RE = re.compile(
+    r"\b(\d{1,2})\s+(?:web\s+|app\s+|application\s+|worker\s+)?"
+    r"(?:servers?|instances?|vms?|machines?|replicas?|workers?)\b"
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ==============================
+# TEMPLATES
+# ==============================
+# slot: {"id", "services": [canonical alternatives], "in_subnet", "optional", "scales",
+#        "primary" (what the template is about), "evidence" (phrases asking for it)}
+# implies: phrases that ask for every slot at once ("3-tier", "wordpress")
+# edges: (source slot, target slot, relation); vpc/subnet slots are implicit
+TEMPLATES = [
+    {
+        "name": "three_tier_web",
+        "summary": "Three-tier web application: a load balancer in front of VMs in a private subnet, backed by a managed relational database.",
+        "description": "three tier web app frontend backend database load balancer servers",
+        "examples": [
+            "3-tier web app",
+            "three tier web application with a database",
+            "web application behind a load balancer with a sql database",
+            "classic web app with web servers and postgres"
+        ],
+        "implies": ["three tier", "3 tier"],
+        "slots": [
+            {"id": "lb", "services": ["load_balancer"], "evidence": LB_EVIDENCE},
+            {"id": "web", "services": ["compute_vm"], "in_subnet": True, "scales": True, "primary": True},
+            {"id": "db", "services": ["relational_db", "cloud_sql"], "in_subnet": True, "evidence": SQL_EVIDENCE}
+        ],
+        "edges": [("lb", "web", "connects_to"), ("web", "db", "connects_to")]
+    },
+    {
+        "name": "static_site_cdn",
+        "summary": "Static website: files in object storage served through an HTTP load balancer / CDN edge.",
+        "description": "static site website cdn bucket hosting html assets",
+        "examples": [
+            "static site + cdn",
+            "host a static website from a bucket",
+            "static website with cdn in front",
+            "serve static html and assets"
+        ],
+        "slots": [
+            {"id": "cdn", "services": ["load_balancer"], "evidence": ["cdn", "edge", *LB_EVIDENCE]},
+            {"id": "site", "services": ["object_storage", "cloud_storage"], "primary": True}
+        ],
+        "edges": [("cdn", "site", "connects_to")]
+    },
+    {
+        "name": "queue_worker",
+        "summary": "Queue worker: producers publish jobs to a queue consumed by worker VMs that store results in object storage.",
+        "description": "queue worker background jobs consumer processing tasks messages",
+        "examples": [
+            "queue worker",
+            "background job workers reading from a queue",
+            "message queue with worker instances",
+            "async task processing with workers"
+        ],
+        "slots": [
+            {"id": "queue", "services": ["queue", "pubsub"], "evidence": QUEUE_EVIDENCE},
+            {"id": "worker", "services": ["compute_vm"], "in_subnet": True, "scales": True, "primary": True},
+            {"id": "results", "services": ["object_storage", "cloud_storage"], "optional": True}
+        ],
+        "edges": [("queue", "worker", "connects_to"), ("worker", "results", "connects_to")]
+    },
+    {
+        "name": "serverless_api",
+        "summary": "Serverless API: a load balancer routing to serverless functions backed by a NoSQL database.",
+        "description": "serverless api functions lambda rest endpoint nosql",
+        "examples": [
+            "serverless api",
+            "rest api with lambda and dynamodb",
+            "serverless backend with a nosql database",
+            "api using cloud functions and firestore"
+        ],
+        "slots": [
+            {"id": "lb", "services": ["load_balancer"], "evidence": ["api", "endpoint", "gateway", *LB_EVIDENCE]},
+            {"id": "api", "services": ["serverless", "cloud_run"], "primary": True},
+            {"id": "db", "services": ["nosql_db", "firestore"], "evidence": NOSQL_EVIDENCE}
+        ],
+        "edges": [("lb", "api", "connects_to"), ("api", "db", "connects_to")]
+    },
+    {
+        "name": "container_app",
+        "summary": "Containerized application: a load balancer in front of a managed container service with a relational database.",
+        "description": "container docker containerized app service cloud run ecs",
+        "examples": [
+            "containerized web app",
+            "docker app on cloud run with a database",
+            "run containers behind a load balancer",
+            "container service with postgres"
+        ],
+        "slots": [
+            {"id": "lb", "services": ["load_balancer"], "evidence": LB_EVIDENCE},
+            {"id": "app", "services": ["container_service", "cloud_run"], "primary": True},
+            {"id": "db", "services": ["relational_db", "cloud_sql"], "in_subnet": True, "evidence": SQL_EVIDENCE}
+        ],
+        "edges": [("lb", "app", "connects_to"), ("app", "db", "connects_to")]
+    },
+    {
+        "name": "kubernetes_microservices",
+        "summary": "Microservices on Kubernetes: a load balancer in front of a private cluster with a relational database and object storage.",
+        "description": "kubernetes k8s cluster microservices gke eks aks pods",
+        "examples": [
+            "microservices on kubernetes",
+            "k8s cluster with a database",
+            "gke cluster behind a load balancer",
+            "kubernetes platform for services"
+        ],
+        "slots": [
+            {"id": "lb", "services": ["load_balancer"], "evidence": LB_EVIDENCE},
+            {"id": "cluster", "services": ["kubernetes"], "in_subnet": True, "primary": True},
+            {"id": "db", "services": ["relational_db", "cloud_sql"], "in_subnet": True, "evidence": SQL_EVIDENCE},
+            {"id": "storage", "services": ["object_storage", "cloud_storage"], "optional": True}
+        ],
+        "edges": [("lb", "cluster", "connects_to"), ("cluster", "db", "connects_to"), ("cluster", "storage", "connects_to")]
+    },
+    {
+        "name": "event_driven",
+        "summary": "Event-driven processing: events published to a topic trigger serverless handlers that write to a NoSQL database.",
+        "description": "event driven pubsub topic trigger handlers events stream",
+        "examples": [
+            "event driven architecture",
+            "pub/sub events triggering functions",
+            "process events from a topic with serverless handlers",
+            "event processing pipeline"
+        ],
+        "slots": [
+            {"id": "events", "services": ["pubsub", "queue"], "evidence": ["event", "stream", *QUEUE_EVIDENCE]},
+            {"id": "handler", "services": ["serverless", "cloud_run"], "primary": True},
+            {"id": "db", "services": ["nosql_db", "firestore"], "evidence": NOSQL_EVIDENCE}
+        ],
+        "edges": [("events", "handler", "connects_to"), ("handler", "db", "connects_to")]
+    },
+    {
+        "name": "single_vm",
+        "summary": "A single virtual machine in a private subnet.",
+        "description": "single vm virtual machine server instance simple",
+        "examples": [
+            "a single vm",
+            "one virtual machine",
+            "simple server",
+            "just a compute instance"
+        ],
+        "slots": [
+            {"id": "vm", "services": ["compute_vm"], "in_subnet": True, "scales": True, "primary": True}
+        ],
+        "edges": []
+    },
+    {
+        "name": "vm_with_database",
+        "summary": "Application VM in a private subnet connected to a managed relational database, with object storage for uploads.",
+        "description": "wordpress blog cms vm database uploads storage",
+        "examples": [
+            "wordpress site",
+            "blog with a database",
+            "vm with a mysql database and storage",
+            "cms server with database"
+        ],
+        "implies": ["wordpress"],
+        "slots": [
+            {"id": "app", "services": ["compute_vm"], "in_subnet": True, "scales": True, "primary": True},
+            {"id": "db", "services": ["relational_db", "cloud_sql"], "in_subnet": True, "evidence": SQL_EVIDENCE},
+            {"id": "uploads", "services": ["object_storage", "cloud_storage"], "optional": True}
+        ],
+        "edges": [("app", "db", "connects_to"), ("app", "uploads", "connects_to")]
+    },
+    {
+        "name": "data_ingestion",
+        "summary": "Data ingestion: a queue buffers incoming records, serverless processors transform them into object storage.",
+        "description": "data ingestion pipeline etl records batch transform storage",
+        "examples": [
+            "data ingestion pipeline",
+            "etl pipeline into a bucket",
+            "ingest data through a queue into storage",
+            "batch data processing"
+        ],
+        "slots": [
+            {"id": "ingest", "services": ["queue", "pubsub"], "evidence": ["ingest", "ingestion", "stream", *QUEUE_EVIDENCE]},
+            {"id": "processor", "services": ["serverless", "cloud_run"], "primary": True},
+            {"id": "lake", "services": ["object_storage", "cloud_storage"], "evidence": ["lake", *STORAGE_EVIDENCE]}
+        ],
+        "edges": [("ingest", "processor", "connects_to"), ("processor", "lake", "connects_to")]
+    }
+]
+
+
+# ==============================
+# MATCHING
+# ==============================
+def tokenize(text: str) -> list:
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in _TOKEN_RE.findall(text.lower())]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def _terms(phrases) -> set:
+    """Phrases as the single terms tokenize() yields for them ("load balancer" -> "load_balancer")."""
+    return {"_".join(w for w in tokenize(p) if "_" not in w) for p in phrases}
+
+
+class TemplateMatcher:
+    def __init__(self, templates: list = None):
+        self.templates = templates or TEMPLATES
+
+        docs = [
+            Counter(tokenize(" ".join([t["name"].replace("_", " "), t["description"], *t["examples"]])))
+            for t in self.templates
+        ]
+        df = Counter(term for doc in docs for term in doc)
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self.vectors = [self._vector(doc) for doc in docs]
+        self.implied = [_terms(t.get("implies", [])) for t in self.templates]
+        self.evidence = [
+            {slot["id"]: _terms(slot.get("evidence", [])) for slot in t["slots"]}
+            for t in self.templates
+        ]
+        # evidence words ("lb", "mysql") are part of what a template knows
+        self.vocabularies = [
+            {term for term in doc if "_" not in term}
+            | {w for terms in (*evidence.values(), implied) for term in terms for w in term.split("_")}
+            for doc, evidence, implied in zip(docs, self.evidence, self.implied)
+        ]
+
+    def coverage(self, prompt: str, template: dict) -> float:
+        """Share of the prompt's content words the template knows about."""
+        vocabulary = self.vocabularies[self.templates.index(template)]
+        words = [w for w in tokenize(prompt) if "_" not in w and w not in STOPWORDS and not w.isdigit()]
+        if not words:
+            return 0.0
+        return sum(w in vocabulary or w in CLOUD_WORDS for w in words) / len(words)
+
+    def unrequested_slots(self, prompt: str, template: dict) -> list:
+        """Required slots besides the primary one the prompt gives no evidence for."""
+        i = self.templates.index(template)
+        terms = set(tokenize(prompt))
+        if terms & self.implied[i]:
+            return []
+        return [
+            slot["id"] for slot in template["slots"]
+            if not slot.get("primary") and not slot.get("optional")
+            and not terms & self.evidence[i][slot["id"]]
+        ]
+
+    def _vector(self, counts: Counter) -> dict:
+        vec = {t: c * self.idf[t] for t, c in counts.items() if t in self.idf}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def scores(self, prompt: str) -> list:
+        query = self._vector(Counter(tokenize(prompt)))
+        ranked = [
+            (sum(w * vec.get(t, 0.0) for t, w in query.items()), template)
+            for template, vec in zip(self.templates, self.vectors)
+        ]
+        return sorted(ranked, key=lambda r: r[0], reverse=True)
+
+    def match(self, prompt: str):
+        """(template, score) for a confident match, else None."""
+        if not MIN_PROMPT_WORDS <= len(prompt.split()) <= MAX_PROMPT_WORDS:
+            return None
+        if NEGATIONS & set(_TOKEN_RE.findall(prompt.lower())):
+            return None
+
+        ranked = self.scores(prompt)
+        best_score, best = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if best_score < MIN_SCORE or best_score - runner_up < MIN_MARGIN:
+            return None
+        if self.coverage(prompt, best) < MIN_COVERAGE:
+            return None
+        if self.unrequested_slots(prompt, best):
+            return None
+        return best, round(best_score, 3)
+
+    # ==============================
+    # INSTANTIATION
+    # ==============================
+    def instantiate(self, template: dict, prompt: str, available_nodes: list):
+        """
+        LLM-shaped {"summary", "graph"} for the template on the requested
+        cloud, or None when the catalog cannot provide a required slot.
+        """
+        cloud = detect_cloud(prompt, available_nodes)
+        by_service = {}
+        for n in available_nodes:
+            service = CANONICAL_SERVICE_MAP.get(n["id"])
+            if service and n.get("cloud") == cloud:
+                by_service.setdefault(service, n)
+
+        count = None
+        m = _COUNT_RE.search(prompt.lower())
+        if m:
+            count = max(1, int(m.group(1)))
+
+        nodes = []
+        placed = set()
+
+        def add(node_id, catalog_node, config):
+            nodes.append({
+                "id": node_id,
+                "type": "cloudNode",
+                "data": {
+                    "label": catalog_node["label"],
+                    "category": catalog_node["category"],
+                    "icon": catalog_node["icon"],
+                    "cloud": cloud
+                },
+                "config": config
+            })
+            placed.add(node_id)
+
+        # implicit networking; normalize() fills in anything the catalog lacks
+        for node_id in ("vpc", "subnet"):
+            if node_id in by_service:
+                add(node_id, by_service[node_id], {})
+
+        for slot in template["slots"]:
+            catalog_node = next((by_service[s] for s in slot["services"] if s in by_service), None)
+            if catalog_node is None:
+                if slot.get("optional"):
+                    continue
+                return None
+            add(slot["id"], catalog_node, {"count": count} if count and slot.get("scales") else {})
+
+        edges = []
+        if "vpc" in placed and "subnet" in placed:
+            edges.append({"source": "vpc", "target": "subnet", "relation": "contains"})
+        for slot in template["slots"]:
+            if slot.get("in_subnet") and slot["id"] in placed and "subnet" in placed:
+                edges.append({"source": "subnet", "target": slot["id"], "relation": "contains"})
+        for source, target, relation in template["edges"]:
+            if source in placed and target in placed:
+                edges.append({"source": source, "target": target, "relation": relation})
+
+        return {"summary": template["summary"], "graph": {"nodes": nodes, "edges": edges}}
+
+
+def detect_cloud(prompt: str, available_nodes: list) -> str:
+    words = set(_TOKEN_RE.findall(prompt.lower()))
+    for cloud, keywords in CLOUD_KEYWORDS.items():
+        if words.intersection(keywords):
+            return cloud
+
+    # otherwise the cloud the catalog covers best
+    counts = Counter(n.get("cloud") for n in available_nodes)
+    return counts.most_common(1)[0][0] if counts else "aws"
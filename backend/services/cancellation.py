@@ -0,0 +1,154 @@
+"""
+cancellation.py
+
+Cooperative cancellation for request-scoped and job-scoped work:
+1. CancelToken: set on client disconnect, explicit cancel, or when its
+   deadline passes; callbacks (e.g. stopping a container) run once on cancel
+2. The token of the current request is carried in a context variable, so
+   LLM retries, admission waits and replay delays can stop without every
+   call signature changing
+3. Checkpoints raise Cancelled; counts per scope / reason and per
+   interrupted stage are kept for /cancellations
+"""
+
+import threading
+import time
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+REASON_CLIENT_DISCONNECTED = "client_disconnected"
+REASON_DEADLINE = "deadline"
+REASON_REQUESTED = "requested"
+
+# how often blocking waits re-check their token
+CANCEL_POLL_S = 0.25
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+_stats_lock = threading.Lock()
+_cancelled = defaultdict(lambda: defaultdict(int))  # scope -> reason -> count
+_interrupted = defaultdict(int)                     # stage -> count
+
+
+class Cancelled(Exception):
+    def __init__(self, reason: str, scope: str = None):
+        self.reason = reason
+        self.scope = scope
+        super().__init__(f"{scope or 'operation'} cancelled ({reason})")
+
+
+class CancelToken:
+    def __init__(self, scope: str, timeout_s: float = None):
+        self.scope = scope
+        self.deadline = time.monotonic() + timeout_s if timeout_s else None
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._timer = None
+
+    def cancel(self, reason: str = REASON_REQUESTED) -> bool:
+        """Returns False when the token was already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+            if self._timer is not None:
+                self._timer.cancel()
+
+        with _stats_lock:
+            _cancelled[self.scope][reason] += 1
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Cancel callback failed ({self.scope}): {e}")
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(REASON_DEADLINE)
+        return self._event.is_set()
+
+    def remaining(self):
+        """Seconds until the deadline, or None without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self, stage: str = None):
+        if self.cancelled:
+            if stage:
+                with _stats_lock:
+                    _interrupted[stage] += 1
+            raise Cancelled(self.reason, self.scope)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Sleep up to `timeout` (and the deadline); True if cancelled meanwhile."""
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+    def on_cancel(self, callback):
+        """
+        Run callback once when the token is cancelled (immediately if it
+        already is). Arms a timer so the deadline fires the callbacks even
+        while the owner is blocked.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                if self.deadline is not None and self._timer is None:
+                    self._timer = threading.Timer(self.remaining(), self.cancel, (REASON_DEADLINE,))
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        callback()
+
+    def close(self):
+        """Work finished: drop callbacks and the deadline timer."""
+        with self._lock:
+            self._callbacks = []
+            if self._timer is not None:
+                self._timer.cancel()
+
+
+# ==============================
+# CURRENT TOKEN
+# ==============================
+def current_token():
+    return _current.get()
+
+
+@contextmanager
+def use_token(token: CancelToken):
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def checkpoint(stage: str):
+    """Raise Cancelled if the current token (if any) is cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled(stage)
+
+
+# ==============================
+# STATS
+# ==============================
+def cancellation_stats() -> dict:
+    with _stats_lock:
+        return {
+            "cancelled": {scope: dict(reasons) for scope, reasons in _cancelled.items()},
+            "interrupted": dict(_interrupted)
+        }
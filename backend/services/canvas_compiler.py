@@ -1,13 +1,16 @@
-import time
 import random
 
+from services.graph_ir import as_graph
+
 
 NODE_WIDTH = 180
 NODE_HEIGHT = 70
 
 
-def generate_id(base):
-    return f"{base}-{int(time.time() * 1000)}"
+def generate_id(base, node_id):
+    # deterministic: recompiling the same graph must give the same canvas
+    # (architecture versions are content-hashed over it)
+    return f"{base}-{node_id}"
 
 
 def auto_position(index, level=0):
@@ -18,6 +21,8 @@ def auto_position(index, level=0):
 
 
 def compile_to_canvas(logical_graph):
+    """logical_graph: Graph IR or graph dict"""
+    graph = as_graph(logical_graph)
     id_map = {}
     canvas_nodes = []
     canvas_edges = []
@@ -32,10 +37,10 @@ def compile_to_canvas(logical_graph):
     }
 
     # ---------- Nodes ----------
-    for idx, node in enumerate(logical_graph["nodes"]):
-        label = node["data"]["label"]
-        canvas_id = generate_id(label.lower())
-        id_map[node["id"]] = canvas_id
+    for idx, node in enumerate(graph.nodes):
+        label = node.label
+        canvas_id = generate_id(label.lower(), node.id)
+        id_map[node.key] = canvas_id
 
         canvas_nodes.append({
             "id": canvas_id,
@@ -43,7 +48,7 @@ def compile_to_canvas(logical_graph):
             "position": auto_position(idx, levels.get(label, 2)),
             "data": {
                 "label": label,
-                "category": node["data"]["category"],
+                "category": node.category,
                 "icon": label.lower(),
                 "configured": False,
                 "config": {}
@@ -55,13 +60,15 @@ def compile_to_canvas(logical_graph):
         })
 
     # ---------- Edges ----------
-    for edge in logical_graph["edges"]:
+    for edge in graph.edges:
+        source = id_map[edge.source.key]
+        target = id_map[edge.target.key]
         canvas_edges.append({
-            "id": f"xy-edge__{id_map[edge['source']]}-{id_map[edge['target']]}",
+            "id": f"xy-edge__{source}-{target}",
             "type": "smoothstep",
             "animated": True,
-            "source": id_map[edge["source"]],
-            "target": id_map[edge["target"]],
+            "source": source,
+            "target": target,
             "sourceHandle": "right",
             "targetHandle": "left"
         })
@@ -0,0 +1,229 @@
+"""
+catalog_ingest.py
+
+Bulk, incremental catalog ingestion:
+1. Stream entries from JSON / JSONL / YAML files
+2. Validate and normalize each entry
+3. Diff against nodes.db by content hash
+4. Apply only the changes (executemany) in ONE transaction
+5. Bump the catalog version and rebuild the binary snapshot
+
+Usage (from backend/):
+    python -m services.catalog_ingest catalogs/aws.jsonl catalogs/gcp.yaml --prune
+"""
+
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import argparse
+
+from services.catalog_snapshot import SNAPSHOT_PATH, build_snapshot, read_catalog_version
+from services.service_registry import SUPPORTED_CLOUDS
+
+DB_NAME = "nodes.db"
+
+REQUIRED_FIELDS = ("id", "label", "category", "cloud", "icon")
+COLUMNS = ("id", "label", "category", "cloud", "icon", "description", "connections")
+
+
+# ==============================
+# READING
+# ==============================
+class UnparsableEntry:
+    """Placeholder for a JSONL line that is not JSON; rejected by validate_entry."""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def iter_file_entries(path: str):
+    """Yield (location, entry) pairs; JSONL is streamed line by line."""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    # one bad line is an invalid entry, not a failed ingest
+                    entry = UnparsableEntry(f"Invalid JSON: {e}")
+                yield f"{path}:{lineno}", entry
+
+    elif ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("nodes", []) if isinstance(data, dict) else data
+        for i, entry in enumerate(items):
+            yield f"{path}[{i}]", entry
+
+    elif ext in (".yaml", ".yml"):
+        import yaml
+
+        with open(path, encoding="utf-8") as f:
+            for doc_no, doc in enumerate(yaml.safe_load_all(f)):
+                items = doc.get("nodes", []) if isinstance(doc, dict) else (doc or [])
+                for i, entry in enumerate(items):
+                    yield f"{path}#{doc_no}[{i}]", entry
+
+    else:
+        raise ValueError(f"Unsupported catalog file type: {path}")
+
+
+# ==============================
+# VALIDATION
+# ==============================
+def validate_entry(entry) -> tuple:
+    """Return the normalized DB row for an entry or raise ValueError."""
+    if isinstance(entry, UnparsableEntry):
+        raise ValueError(entry.error)
+    if not isinstance(entry, dict):
+        raise ValueError("Entry must be an object")
+
+    missing = [f for f in REQUIRED_FIELDS if not entry.get(f)]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    if entry["cloud"] not in SUPPORTED_CLOUDS:
+        raise ValueError(f"Unsupported cloud: {entry['cloud']}")
+
+    connections = entry.get("connections") or {}
+    normalized = {}
+    for key in ("canConnectTo", "canReceiveFrom"):
+        targets = connections.get(key, [])
+        if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+            raise ValueError(f"connections.{key} must be a list of node ids")
+        normalized[key] = targets
+
+    return (
+        str(entry["id"]),
+        str(entry["label"]),
+        str(entry["category"]),
+        entry["cloud"],
+        str(entry["icon"]),
+        entry.get("description"),
+        json.dumps(normalized, sort_keys=True)
+    )
+
+
+def row_hash(row) -> str:
+    return hashlib.sha256(
+        json.dumps(list(row), ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _canonical_row(row) -> tuple:
+    # stored JSON may predate sort_keys; compare on a canonical form
+    row = tuple(row)
+    connections = json.loads(row[6]) if row[6] else {"canConnectTo": [], "canReceiveFrom": []}
+    return row[:6] + (json.dumps(connections, sort_keys=True),)
+
+
+# ==============================
+# INGESTION
+# ==============================
+def ingest_entries(
+    entries,
+    db_path: str = DB_NAME,
+    prune: bool = False,
+    dry_run: bool = False,
+    snapshot_path: str = SNAPSHOT_PATH
+) -> dict:
+    """
+    entries: iterable of entry dicts or (location, entry) pairs.
+    prune: delete existing nodes of the ingested clouds that are absent
+    from the input (full-catalog sync for those clouds).
+    """
+    incoming = {}
+    invalid = []
+    clouds = set()
+
+    for i, item in enumerate(entries):
+        location, entry = item if isinstance(item, tuple) else (f"[{i}]", item)
+        try:
+            row = validate_entry(entry)
+        except ValueError as e:
+            invalid.append({"location": location, "error": str(e)})
+            continue
+        incoming[row[0]] = (row, row_hash(row))
+        clouds.add(row[3])
+
+    conn = sqlite3.connect(db_path)
+    try:
+        existing = {
+            row[0]: (row[3], row_hash(_canonical_row(row)))
+            for row in conn.execute(f"SELECT {', '.join(COLUMNS)} FROM nodes")
+        }
+
+        inserts = [row for nid, (row, _) in incoming.items() if nid not in existing]
+        updates = [
+            row for nid, (row, digest) in incoming.items()
+            if nid in existing and existing[nid][1] != digest
+        ]
+        deletes = [
+            (nid,) for nid, (cloud, _) in existing.items()
+            if cloud in clouds and nid not in incoming
+        ] if prune else []
+
+        changed = bool(inserts or updates or deletes)
+        version = read_catalog_version(conn)
+
+        if changed and not dry_run:
+            placeholders = ", ".join("?" for _ in COLUMNS)
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO nodes ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                    inserts + updates
+                )
+                conn.executemany("DELETE FROM nodes WHERE id = ?", deletes)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """)
+                conn.execute("""
+                INSERT INTO catalog_meta (key, value) VALUES ('version', '1')
+                ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+                """)
+            version = read_catalog_version(conn)
+    finally:
+        conn.close()
+
+    if snapshot_path and not dry_run and (changed or not os.path.exists(snapshot_path)):
+        build_snapshot(db_path, snapshot_path)
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": len(incoming) - len(inserts) - len(updates),
+        "invalid": invalid,
+        "catalog_version": version,
+        "dry_run": dry_run
+    }
+
+
+def ingest_files(paths: list, **kwargs) -> dict:
+    def entries():
+        for path in paths:
+            yield from iter_file_entries(path)
+
+    return ingest_entries(entries(), **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest catalog files into nodes.db")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    report = ingest_files(args.paths, db_path=args.db, prune=args.prune, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["invalid"] else 0)
@@ -0,0 +1,206 @@
+"""
+catalog_snapshot.py
+
+Compiles nodes.db into a versioned, compact binary snapshot that every
+worker memory-maps instead of loading its own copy from SQLite.
+
+Layout (little endian):
+  header   MAGIC | format | catalog_version | count | keys_offset | keys_length
+  records  msgpack-encoded node dicts, back to back
+  keys     msgpack list of [id, label, category, cloud, icon, offset, length]
+
+Only the small keys table is decoded at load time; full records are
+decoded on access, straight out of the shared page cache, and only
+when a caller asks for a field the keys table does not carry. Writers
+build into a temp file and os.replace() it, so readers swap atomically.
+"""
+
+import os
+import json
+import mmap
+import bisect
+import sqlite3
+import struct
+import threading
+
+import ormsgpack
+
+DB_NAME = "nodes.db"
+SNAPSHOT_PATH = "catalog.snap"
+
+MAGIC = b"INFRCAT\x00"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sHIIQQ")
+
+# fields served from the keys table without decoding the record
+KEY_FIELDS = ("id", "label", "category", "cloud", "icon")
+
+
+def read_catalog_version(conn) -> int:
+    try:
+        row = conn.execute(
+            "SELECT value FROM catalog_meta WHERE key = 'version'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+# ==============================
+# BUILD
+# ==============================
+def build_snapshot(db_path: str = DB_NAME, out_path: str = SNAPSHOT_PATH) -> dict:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    version = read_catalog_version(conn)
+    rows = conn.execute("SELECT * FROM nodes ORDER BY rowid").fetchall()
+    conn.close()
+
+    records = []
+    keys = []
+    offset = HEADER.size
+    for row in rows:
+        blob = ormsgpack.packb({
+            "id": row["id"],
+            "label": row["label"],
+            "category": row["category"],
+            "cloud": row["cloud"],
+            "icon": row["icon"],
+            "description": row["description"],
+            "connections": json.loads(row["connections"]) if row["connections"] else {
+                "canConnectTo": [],
+                "canReceiveFrom": []
+            }
+        })
+        records.append(blob)
+        keys.append([
+            row["id"], row["label"], row["category"], row["cloud"], row["icon"],
+            offset, len(blob)
+        ])
+        offset += len(blob)
+
+    keys_blob = ormsgpack.packb(keys)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, version, len(rows), offset, len(keys_blob))
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for blob in records:
+            f.write(blob)
+        f.write(keys_blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, out_path)
+
+    return {"path": out_path, "catalog_version": version, "count": len(rows), "bytes": offset + len(keys_blob)}
+
+
+# ==============================
+# READ
+# ==============================
+class CatalogSnapshot:
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        magic, fmt, version, count, keys_offset, keys_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Not a catalog snapshot (format {fmt}): {path}")
+
+        self.version = version
+        view = memoryview(self._mm)
+        self.keys = ormsgpack.unpackb(view[keys_offset:keys_offset + keys_length])
+        self.index = {k[0]: i for i, k in enumerate(self.keys)}
+        self.sorted_ids = sorted(self.index)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _decode(self, i: int) -> dict:
+        # not memoized: a per-process cache would copy the catalog back
+        # onto the heap the mmap keeps it off
+        offset, length = self.keys[i][5:7]
+        return ormsgpack.unpackb(self._mm[offset:offset + length])
+
+    def get(self, node_id: str):
+        i = self.index.get(node_id)
+        return None if i is None else self._decode(i)
+
+    def iter_nodes(
+        self,
+        cloud: str = None,
+        category: str = None,
+        label: str = None,
+        fields: tuple = None,
+        after: str = None,
+        ordered: bool = False
+    ):
+        """
+        Same filters as GET /nodes. Projections within KEY_FIELDS never
+        decode a record. ordered/after walk the catalog by id (keyset).
+        """
+        needle = label.lower() if label else None
+        from_keys = fields is not None and all(f in KEY_FIELDS for f in fields)
+
+        if ordered or after is not None:
+            start = bisect.bisect_right(self.sorted_ids, after) if after is not None else 0
+            positions = (self.index[nid] for nid in self.sorted_ids[start:])
+        else:
+            positions = range(len(self.keys))
+
+        for i in positions:
+            key = self.keys[i]
+            if cloud and key[3] != cloud:
+                continue
+            if category and key[2] != category:
+                continue
+            if needle and needle not in key[1].lower():
+                continue
+
+            if from_keys:
+                yield {f: key[KEY_FIELDS.index(f)] for f in fields}
+            elif fields is not None:
+                node = self._decode(i)
+                yield {f: node[f] for f in fields}
+            else:
+                yield self._decode(i)
+
+    def close(self):
+        self._mm.close()
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH):
+    """
+    Process-wide snapshot, re-opened when the file on disk is replaced.
+    Returns None when no (compatible) snapshot has been built.
+    """
+    global _current
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _current_lock:
+        if _current is None or _current.path != path or _current.stat_key != stat_key:
+            # old mapping stays valid for readers still holding it
+            try:
+                _current = CatalogSnapshot(path)
+            except ValueError:
+                return None
+        return _current
+
+
+if __name__ == "__main__":
+    info = build_snapshot()
+    print(f"✅ Catalog snapshot v{info['catalog_version']}: "
+          f"{info['count']} nodes, {info['bytes']} bytes -> {info['path']}")
@@ -0,0 +1,124 @@
+"""
+connectivity.py
+
+Precomputed catalog connectivity, built once per catalog version:
+1. Integer id per catalog node
+2. Outgoing / incoming adjacency bitsets (Python ints)
+An edge src -> tgt is legal when src lists tgt in canConnectTo OR tgt
+lists src in canReceiveFrom. Checks are a shift and a mask.
+"""
+
+import sqlite3
+import threading
+
+from services.catalog_snapshot import load_snapshot, read_catalog_version
+from services.node_catalog import query_nodes
+
+INFO_FIELDS = ("id", "label", "category", "cloud", "icon")
+
+
+class ConnectivityIndex:
+    def __init__(self, nodes: list, version=None):
+        self.version = version
+        self.ids = [n["id"] for n in nodes]
+        self.pos = {nid: i for i, nid in enumerate(self.ids)}
+        self.info = [{f: n.get(f) for f in INFO_FIELDS} for n in nodes]
+
+        # (cloud, label) and label-only lookups for LLM graph nodes
+        self._by_cloud_label = {}
+        self._by_label = {}
+        for n in nodes:
+            key = n["label"].strip().lower()
+            self._by_cloud_label.setdefault((n.get("cloud"), key), n["id"])
+            self._by_label.setdefault(key, []).append(n["id"])
+
+        self.out_bits = [0] * len(nodes)
+        self.in_bits = [0] * len(nodes)
+        self.declares_rules = 0
+        for i, n in enumerate(nodes):
+            connections = n.get("connections") or {}
+            if connections.get("canConnectTo") or connections.get("canReceiveFrom"):
+                self.declares_rules |= 1 << i
+            for target in connections.get("canConnectTo", []):
+                j = self.pos.get(target)
+                if j is not None:
+                    self._link(i, j)
+            for source in connections.get("canReceiveFrom", []):
+                j = self.pos.get(source)
+                if j is not None:
+                    self._link(j, i)
+
+    def _link(self, src: int, tgt: int):
+        self.out_bits[src] |= 1 << tgt
+        self.in_bits[tgt] |= 1 << src
+
+    def __contains__(self, node_id):
+        return node_id in self.pos
+
+    # -------------------------
+    # LOOKUPS
+    # -------------------------
+    def resolve(self, label: str, cloud: str = None):
+        """Catalog id for a graph node label, or None if unknown/ambiguous."""
+        key = label.strip().lower()
+        if cloud and (cloud, key) in self._by_cloud_label:
+            return self._by_cloud_label[(cloud, key)]
+
+        matches = self._by_label.get(key, [])
+        return matches[0] if len(matches) == 1 else None
+
+    def can_connect(self, src_id: str, tgt_id: str) -> bool:
+        return bool((self.out_bits[self.pos[src_id]] >> self.pos[tgt_id]) & 1)
+
+    def allows(self, src_id: str, tgt_id: str) -> bool:
+        """
+        Edge validation: nodes without any declared connection rules
+        are unconstrained; otherwise the pair must be in the matrix.
+        """
+        src, tgt = self.pos[src_id], self.pos[tgt_id]
+        if not ((self.declares_rules >> src) & 1 or (self.declares_rules >> tgt) & 1):
+            return True
+        return bool((self.out_bits[src] >> tgt) & 1)
+
+    def _decode(self, bits: int) -> list:
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.info[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def compatible(self, node_id: str) -> dict:
+        i = self.pos[node_id]
+        return {
+            "id": node_id,
+            "canConnectTo": self._decode(self.out_bits[i]),
+            "canReceiveFrom": self._decode(self.in_bits[i])
+        }
+
+
+_cached = None
+_cached_lock = threading.Lock()
+
+
+def load_connectivity_index(db_path: str, snapshot_path: str = None) -> ConnectivityIndex:
+    """Process-wide index, rebuilt only when the catalog version changes."""
+    global _cached
+
+    snapshot = load_snapshot(snapshot_path) if snapshot_path else None
+    if snapshot is not None:
+        version = ("snapshot", snapshot.version, snapshot.stat_key)
+    else:
+        conn = sqlite3.connect(db_path)
+        version = ("db", read_catalog_version(conn))
+        conn.close()
+
+    with _cached_lock:
+        if _cached is None or _cached.version != version:
+            nodes, _ = query_nodes(
+                db_path=db_path,
+                snapshot_path=snapshot_path,
+                fields=INFO_FIELDS + ("connections",)
+            )
+            _cached = ConnectivityIndex(nodes, version)
+        return _cached
@@ -0,0 +1,155 @@
+"""
+graph_edit.py
+
+Incremental refinement of an existing graph:
+1. summarize_graph: compact text view of the graph for the edit prompt
+   (ids, labels and edges only, no catalog and no config)
+2. apply_edit_script: applies add/remove/update node and edge operations
+   to the Graph IR, resolving new nodes against the catalog locally
+3. The keys of the touched nodes are returned so normalization can be
+   limited to their neighbourhood
+"""
+
+from collections import Counter
+
+from services.connectivity import ConnectivityIndex
+from services.graph_ir import Graph
+from services.schemas import _slug
+
+
+def summarize_graph(graph: Graph) -> str:
+    lines = ["Nodes (id | label | cloud):"]
+    for n in graph.nodes:
+        lines.append(f"{n.id} | {n.label} | {n.cloud or '-'}")
+
+    lines.append("Edges (source -relation-> target):")
+    for e in graph.edges:
+        lines.append(f"{e.source.id} -{e.relation}-> {e.target.id}")
+    return "\n".join(lines)
+
+
+def graph_cloud(graph: Graph):
+    clouds = Counter(n.cloud for n in graph.nodes if n.cloud)
+    return clouds.most_common(1)[0][0] if clouds else None
+
+
+def _unique_id(graph: Graph, base: str) -> str:
+    node_id, suffix = base, 2
+    while graph.node(node_id) is not None:
+        node_id = f"{base}-{suffix}"
+        suffix += 1
+    return node_id
+
+
+def _catalog_entry(connectivity: ConnectivityIndex, label: str, cloud: str):
+    if connectivity is None:
+        return None
+    catalog_id = connectivity.resolve(label, cloud)
+    return connectivity.info[connectivity.pos[catalog_id]] if catalog_id else None
+
+
+def apply_edit_script(graph: Graph, operations: list, connectivity: ConnectivityIndex = None):
+    """
+    Apply operations in order. Returns (touched node keys, applied ops,
+    skipped ops with a reason). Operations referring to unknown ids or
+    labels are skipped instead of failing the whole edit.
+    """
+    cloud = graph_cloud(graph)
+    touched = set()
+    applied = []
+    skipped = []
+    # ids the script used for added nodes -> actual ids (after de-duplication)
+    renamed = {}
+
+    def lookup(node_id):
+        if not node_id:
+            return None
+        # after an add_node whose id collided, the id means the added node
+        return graph.node(renamed.get(node_id, node_id))
+
+    def skip(op, reason):
+        skipped.append({**op, "reason": reason})
+
+    for op in operations:
+        kind = op["op"]
+
+        if kind == "add_node":
+            label = (op.get("label") or "").strip()
+            if not label:
+                skip(op, "label is required")
+                continue
+
+            entry = _catalog_entry(connectivity, label, cloud)
+            if entry is None and connectivity is not None:
+                skip(op, f"unknown node label: {label}")
+                continue
+            entry = entry or {"label": label, "category": "other", "icon": _slug(label), "cloud": cloud}
+
+            requested = op.get("id") or _slug(entry["label"])
+            node = graph.add_node(
+                _unique_id(graph, requested),
+                entry["label"],
+                entry.get("category") or "other",
+                entry.get("icon") or _slug(entry["label"]),
+                cloud=entry.get("cloud") or cloud,
+                config=dict(op.get("config") or {})
+            )
+            renamed[requested] = node.id
+            touched.add(node.key)
+
+        elif kind == "remove_node":
+            node = lookup(op.get("id"))
+            if node is None:
+                skip(op, f"unknown node id: {op.get('id')}")
+                continue
+            # its neighbours lose edges, so they are part of the affected area
+            touched |= graph.neighbours({node.key})
+            touched.discard(node.key)
+            graph.remove_node(node)
+
+        elif kind == "update_node":
+            node = lookup(op.get("id"))
+            if node is None:
+                skip(op, f"unknown node id: {op.get('id')}")
+                continue
+
+            label = (op.get("label") or "").strip()
+            if label and label != node.label:
+                entry = _catalog_entry(connectivity, label, node.cloud or cloud)
+                if entry is None and connectivity is not None:
+                    skip(op, f"unknown node label: {label}")
+                    continue
+                entry = entry or {}
+                graph.relabel(
+                    node,
+                    entry.get("label", label),
+                    category=entry.get("category"),
+                    icon=entry.get("icon"),
+                    cloud=entry.get("cloud")
+                )
+            if op.get("config"):
+                node.config = {**node.config, **op["config"]}
+            touched.add(node.key)
+
+        elif kind in ("add_edge", "remove_edge"):
+            source, target = lookup(op.get("source")), lookup(op.get("target"))
+            if source is None or target is None:
+                skip(op, "unknown edge endpoint")
+                continue
+            if source is target:
+                skip(op, "self-referencing edge")
+                continue
+
+            relation = op.get("relation", "connects_to")
+            if kind == "add_edge":
+                changed = graph.add_edge(source, target, relation)
+            else:
+                changed = graph.remove_edge(source, target, relation)
+            if not changed:
+                skip(op, "edge already exists" if kind == "add_edge" else "unknown edge")
+                continue
+            touched.update((source.key, target.key))
+
+        applied.append(op)
+
+    return touched, applied, skipped
@@ -1,9 +1,37 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from services.architecture_templates import TemplateMatcher
+from services.cancellation import current_token, use_token
+from services.connectivity import ConnectivityIndex
+from services.graph_edit import apply_edit_script, summarize_graph
+from services.graph_ir import Graph, as_graph
 from services.llmchat.factory import get_llm
+from services.schemas import (
+    GRAPH_EDIT_SCHEMA,
+    GRAPH_RESPONSE_SCHEMA,
+    SKELETON_SCHEMA,
+    coerce_edit_response,
+    coerce_graph_response,
+    coerce_skeleton_response
+)
+
+MODES = ("single", "hierarchical")
+
+# one node per architecture, even when several zones emit it
+SHARED_LABELS = {"VPC"}
 
 
 class InfraGraphGenerator:
-    def __init__(self, llm_provider="gemini"):
+    ZONE_MAX_WORKERS = 8
+
+    def __init__(self, llm_provider="gemini", use_templates: bool = True):
         self.llm = get_llm(llm_provider)
+        # confident matches for common architectures skip the LLM
+        self.templates = TemplateMatcher() if use_templates else None
+
+    def warm_up(self):
+        self.llm.warm_up()
 
     # --------------------------------------------------
     # TEXT PROMPT
@@ -26,6 +54,102 @@ User request:
 
 Available nodes (JSON):
 {available_nodes}
+"""
+            }
+        ]
+
+    # --------------------------------------------------
+    # HIERARCHICAL PROMPTS
+    # --------------------------------------------------
+    def build_skeleton_prompt(self, user_prompt, available_nodes):
+        labels = sorted({n["label"] for n in available_nodes})
+        return [
+            {
+                "role": "system",
+                "content": open(
+                    "services/prompts/infra_graph_skeleton.txt",
+                    "r",
+                    encoding="utf-8"
+                ).read()
+            },
+            {
+                "role": "user",
+                "content": f"""
+User request:
+{user_prompt}
+
+Available node labels (JSON):
+{json.dumps(labels)}
+"""
+            }
+        ]
+
+    def build_zone_prompt(self, user_prompt, zone, skeleton, available_nodes):
+        # only this zone's catalog entries (+ networking) instead of the full catalog
+        wanted = {c.strip().lower() for c in zone["components"]}
+        zone_nodes = [
+            n for n in available_nodes
+            if n["label"].strip().lower() in wanted or n.get("category") == "networking"
+        ] or available_nodes
+
+        other_zones = {
+            z["id"]: z["components"] for z in skeleton["zones"] if z["id"] != zone["id"]
+        }
+
+        return [
+            {
+                "role": "system",
+                "content": open(
+                    "services/prompts/infra_graph_zone.txt",
+                    "r",
+                    encoding="utf-8"
+                ).read()
+            },
+            {
+                "role": "user",
+                "content": f"""
+User request:
+{user_prompt}
+
+Zone id: {zone["id"]}
+Zone name: {zone["name"]}
+Zone description: {zone.get("description", "")}
+Zone components (JSON):
+{json.dumps(zone["components"])}
+
+Other zones (context only, JSON):
+{json.dumps(other_zones)}
+
+Available nodes (JSON):
+{zone_nodes}
+"""
+            }
+        ]
+
+    # --------------------------------------------------
+    # EDIT PROMPT
+    # --------------------------------------------------
+    def build_edit_prompt(self, instruction, graph: Graph, labels):
+        return [
+            {
+                "role": "system",
+                "content": open(
+                    "services/prompts/infra_graph_edit.txt",
+                    "r",
+                    encoding="utf-8"
+                ).read()
+            },
+            {
+                "role": "user",
+                "content": f"""
+Change request:
+{instruction}
+
+Current graph:
+{summarize_graph(graph)}
+
+Available node labels (JSON):
+{json.dumps(labels)}
 """
             }
         ]
@@ -43,101 +167,252 @@ Available nodes (JSON):
     # --------------------------------------------------
     # GRAPH NORMALIZATION
     # --------------------------------------------------
-    def normalize(self, graph):
-        nodes = {n["id"]: n for n in graph.get("nodes", [])}
-        edges = graph.get("edges", [])
+    def normalize(self, graph, connectivity: ConnectivityIndex = None, scope: set = None):
+        """
+        Accepts a Graph or a graph dict; returns the same kind.
+        With `scope` (node keys) only edges touching those nodes are
+        checked and only those nodes are re-parented; the rest of the
+        graph is taken as already normalized.
+        """
+        as_dict = not isinstance(graph, Graph)
+        graph = as_graph(graph)
+
+        def in_scope(node):
+            return scope is None or node.key in scope
+
+        catalog_ids = {}
 
-        def get_label(node_id):
-            return nodes[node_id]["data"]["label"]
+        def catalog_id(node):
+            # resolved lazily: a scoped pass only looks up the nodes it checks
+            if node.key not in catalog_ids:
+                catalog_ids[node.key] = connectivity.resolve(node.label, node.cloud)
+            return catalog_ids[node.key]
 
         # ---------- 1. Ensure VPC ----------
-        has_vpc = any(n["data"]["label"] == "VPC" for n in nodes.values())
-        if not has_vpc:
-            vpc_node = {
-                "id": "vpc",
-                "type": "cloudNode",
-                "data": {
-                    "label": "VPC",
-                    "category": "networking",
-                    "icon": "vpc",
-                    "cloud": "aws"
-                },
-                "config": {}
-            }
-            graph["nodes"].insert(0, vpc_node)
-            nodes["vpc"] = vpc_node
+        if not graph.has_label("VPC"):
+            vpc = graph.add_node("vpc", "VPC", "networking", "vpc", cloud="aws", first=True)
+            # e.g. zone subnets when no zone emitted the shared VPC
+            for subnet in graph.nodes_with_label("Subnet"):
+                graph.add_edge(vpc, subnet, "contains")
+            if scope is not None:
+                scope.add(vpc.key)
 
         # ---------- 2. Ensure Subnet ----------
-        has_subnet = any(n["data"]["label"] == "Subnet" for n in nodes.values())
-        if not has_subnet:
-            subnet_node = {
-                "id": "subnet",
-                "type": "cloudNode",
-                "data": {
-                    "label": "Subnet",
-                    "category": "networking",
-                    "icon": "subnet",
-                    "cloud": "aws"
-                },
-                "config": {}
-            }
-            graph["nodes"].append(subnet_node)
-            nodes["subnet"] = subnet_node
+        if not graph.has_label("Subnet"):
+            subnet = graph.add_node("subnet", "Subnet", "networking", "subnet", cloud="aws")
+            vpc = graph.node("vpc")
+            if vpc is not None:
+                graph.add_edge(vpc, subnet, "contains")
+            if scope is not None:
+                scope.add(subnet.key)
 
-            edges.append({
-                "source": "vpc",
-                "target": "subnet",
-                "relation": "contains"
-            })
+        # LLM edges to the vpc / subnet it left out (kept by the repair step)
+        graph.attach_pending()
 
         # ---------- 3. Clean invalid edges ----------
-        cleaned_edges = []
-        for e in edges:
-            if e["source"] not in nodes or e["target"] not in nodes:
-                continue
+        def is_valid(e):
+            if not (in_scope(e.source) or in_scope(e.target)):
+                return True
 
-            src_label = get_label(e["source"])
-            tgt_label = get_label(e["target"])
+            src_label = e.source.label
+            tgt_label = e.target.label
 
             # ❌ EC2 → VPC
             if src_label == "EC2" and tgt_label == "VPC":
-                continue
+                return False
 
             # ❌ Anything → Subnet except VPC
             if tgt_label == "Subnet" and src_label != "VPC":
-                continue
+                return False
+
+            # ❌ Service interactions the catalog does not allow (only when both
+            # ends are known); hierarchy ("contains") is not catalog connectivity
+            if connectivity is not None and e.relation == "connects_to":
+                src_cid = catalog_id(e.source)
+                tgt_cid = catalog_id(e.target)
+                if src_cid and tgt_cid and not connectivity.allows(src_cid, tgt_cid):
+                    return False
 
-            cleaned_edges.append(e)
+            return True
 
-        edges = cleaned_edges
+        graph.retain_edges(is_valid)
 
         # ---------- 4. Enforce hierarchy ----------
         required_containment = {
-            "EC2": "subnet",
-            "RDS": "subnet"
+            "EC2": "Subnet",
+            "RDS": "Subnet"
         }
 
-        for node_id, node in nodes.items():
-            label = node["data"]["label"]
-            if label in required_containment:
-                parent = required_containment[label]
+        def zone_of(node):
+            return (node.data_extra or {}).get("zone")
 
-                exists = any(
-                    e["source"] == parent
-                    and e["target"] == node_id
-                    and e["relation"] == "contains"
-                    for e in edges
+        def parent_for(node, parent_label):
+            # hierarchical graphs have one subnet per zone ("payments-subnet")
+            candidates = graph.nodes_with_label(parent_label)
+            zone = zone_of(node)
+            if zone is not None:
+                same_zone = next((p for p in candidates if zone_of(p) == zone), None)
+                if same_zone is not None:
+                    return same_zone
+            return graph.node(parent_label.lower()) or (candidates[0] if candidates else None)
+
+        for label, parent_label in required_containment.items():
+            for node in graph.nodes_with_label(label):
+                if not in_scope(node):
+                    continue
+                parent = parent_for(node, parent_label)
+                if parent is not None and not graph.has_edge(parent, node, "contains"):
+                    graph.add_edge(parent, node, "contains")
+
+        return graph.to_dict() if as_dict else graph
+
+    # --------------------------------------------------
+    # HIERARCHICAL GENERATION
+    # --------------------------------------------------
+    def generate_hierarchical(self, user_prompt, available_nodes, max_workers: int = None):
+        """
+        1. One short call for the skeleton (zones + components + cross-zone links)
+        2. One call per zone, all concurrently
+        3. Merge: de-duplicate ids, reconcile cross-zone edges
+        Wall time ~ skeleton + slowest zone, independent of the zone count.
+        """
+        skeleton = coerce_skeleton_response(self.llm.generate_json(
+            self.build_skeleton_prompt(user_prompt, available_nodes),
+            schema=SKELETON_SCHEMA
+        ))
+
+        zones = skeleton["zones"]
+        if not zones:
+            # nothing to split; fall back to a single call
+            return self.llm.generate_json(
+                self.build_prompt(user_prompt, available_nodes),
+                schema=GRAPH_RESPONSE_SCHEMA
+            )
+
+        # pool threads do not inherit the request's cancel token
+        token = current_token()
+
+        def generate_zone(zone):
+            with use_token(token):
+                response = self.llm.generate_json(
+                    self.build_zone_prompt(user_prompt, zone, skeleton, available_nodes),
+                    schema=GRAPH_RESPONSE_SCHEMA
                 )
+            return coerce_graph_response(response)["graph"]
+
+        workers = min(max_workers or self.ZONE_MAX_WORKERS, len(zones))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            zone_graphs = list(pool.map(generate_zone, zones))
+
+        return {
+            "summary": skeleton["summary"],
+            "graph": self.merge_zone_graphs(skeleton, zone_graphs)
+        }
+
+    def merge_zone_graphs(self, skeleton: dict, zone_graphs: list) -> dict:
+        nodes = []
+        taken = set()
+        shared = {}         # shared label -> merged node id
+        by_zone_label = {}  # (zone id, lower label) -> merged node id
+        first_owner = {}    # id as emitted by a zone -> merged id of its first owner
+        pending = []
 
-                if not exists:
-                    edges.append({
-                        "source": parent,
-                        "target": node_id,
-                        "relation": "contains"
-                    })
+        # ---------- 1. Nodes, ids made unique per zone ----------
+        for zone, graph in zip(skeleton["zones"], zone_graphs):
+            remap = {}
+            for n in graph.get("nodes", []):
+                label = n["data"]["label"]
 
-        graph["edges"] = edges
-        return graph
+                if label in shared:
+                    remap[n["id"]] = shared[label]
+                    by_zone_label.setdefault((zone["id"], label.lower()), shared[label])
+                    continue
+
+                node_id = n["id"]
+                if node_id in taken:
+                    base = node_id if node_id.startswith(f"{zone['id']}-") else f"{zone['id']}-{node_id}"
+                    node_id, suffix = base, 2
+                    while node_id in taken:
+                        node_id = f"{base}-{suffix}"
+                        suffix += 1
+                taken.add(node_id)
+
+                remap[n["id"]] = node_id
+                first_owner.setdefault(n["id"], node_id)
+                by_zone_label.setdefault((zone["id"], label.lower()), node_id)
+                if label in SHARED_LABELS:
+                    shared[label] = node_id
+
+                nodes.append({**n, "id": node_id, "data": {**n["data"], "zone": zone["id"]}})
+
+            pending.append((remap, graph.get("edges", [])))
+
+        edges = []
+        seen_edges = set()
+
+        def add_edge(source, target, relation):
+            key = (source, target, relation)
+            if source and target and source != target and key not in seen_edges:
+                seen_edges.add(key)
+                edges.append({"source": source, "target": target, "relation": relation})
+
+        # ---------- 2. Zone edges (after all nodes, so references to other zones resolve) ----------
+        for remap, zone_edges in pending:
+            for e in zone_edges:
+                add_edge(
+                    remap.get(e["source"]) or first_owner.get(e["source"]),
+                    remap.get(e["target"]) or first_owner.get(e["target"]),
+                    e["relation"]
+                )
+
+        # ---------- 3. Cross-zone links from the skeleton ----------
+        for link in skeleton["links"]:
+            add_edge(
+                by_zone_label.get((link["source_zone"], link["source"].strip().lower())),
+                by_zone_label.get((link["target_zone"], link["target"].strip().lower())),
+                link.get("relation", "connects_to")
+            )
+
+        # ---------- 4. Every zone's subnet lives in the shared VPC ----------
+        vpc_id = shared.get("VPC")
+        if vpc_id:
+            for n in nodes:
+                if n["data"]["label"] == "Subnet":
+                    add_edge(vpc_id, n["id"], "contains")
+
+        return {"nodes": nodes, "edges": edges}
+
+    # --------------------------------------------------
+    # INCREMENTAL REFINEMENT
+    # --------------------------------------------------
+    def refine(self, graph, instruction, connectivity: ConnectivityIndex = None, as_ir: bool = False):
+        """
+        Edit an existing graph instead of regenerating it:
+        1. The LLM sees a compact summary of the graph and the catalog
+           labels, and answers with a short edit script
+        2. The script is applied locally to the Graph IR
+        3. normalize runs only on the touched nodes and their neighbours
+        A Graph argument is edited in place; a dict is parsed first.
+        The result graph is a dict unless as_ir is set.
+        """
+        graph = as_graph(graph)
+        labels = sorted({i["label"] for i in connectivity.info}) if connectivity is not None else []
+
+        response = coerce_edit_response(self.llm.generate_json(
+            self.build_edit_prompt(instruction, graph, labels),
+            schema=GRAPH_EDIT_SCHEMA
+        ))
+
+        touched, applied, skipped = apply_edit_script(graph, response["operations"], connectivity)
+        scope = touched | graph.neighbours(touched)
+        graph = self.normalize(graph, connectivity, scope=scope)
+
+        return {
+            "summary": response["summary"],
+            "graph": graph if as_ir else graph.to_dict(),
+            "operations": applied,
+            "skipped": skipped
+        }
 
     # --------------------------------------------------
     # GENERATE GRAPH
@@ -147,35 +422,66 @@ Available nodes (JSON):
         user_prompt,
         available_nodes,
         input_type="text",
-        image_path=None
+        image_path=None,
+        connectivity: ConnectivityIndex = None,
+        mode: str = "single",
+        as_ir: bool = False
     ):
-        # ---------- TEXT ----------
-        if input_type == "text":
-            messages = self.build_prompt(user_prompt, available_nodes)
-            response = self.llm.generate_json(messages)
-
-        # ---------- IMAGE ----------
-        elif input_type == "image":
-            if not image_path:
-                raise ValueError("image_path is required for image input")
-
-            instruction = self.build_prompt_image()
-            response = self.llm.generate_json_from_image(
-                image_path=image_path,
-                instruction=instruction
-            )
+        """
+        Returns {"summary", "graph", "template"}; "graph" is a plain dict
+        unless as_ir is set, in which case the Graph IR is returned so
+        callers can compile it without re-parsing.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+
+        # ---------- TEXT (TEMPLATE FAST PATH) ----------
+        response, template = None, None
+        if input_type == "text" and mode == "single" and self.templates is not None:
+            matched = self.templates.match(user_prompt)
+            if matched:
+                response = self.templates.instantiate(matched[0], user_prompt, available_nodes)
+                template = matched[0]["name"] if response is not None else None
+
+        if response is None:
+            # ---------- TEXT (HIERARCHICAL) ----------
+            if input_type == "text" and mode == "hierarchical":
+                response = self.generate_hierarchical(user_prompt, available_nodes)
+
+            # ---------- TEXT ----------
+            elif input_type == "text":
+                messages = self.build_prompt(user_prompt, available_nodes)
+                response = self.llm.generate_json(messages, schema=GRAPH_RESPONSE_SCHEMA)
+
+            # ---------- IMAGE ----------
+            elif input_type == "image":
+                if not image_path:
+                    raise ValueError("image_path is required for image input")
+
+                instruction = self.build_prompt_image()
+                response = self.llm.generate_json_from_image(
+                    image_path=image_path,
+                    instruction=instruction,
+                    schema=GRAPH_RESPONSE_SCHEMA
+                )
+
+            else:
+                raise ValueError("input_type must be 'text' or 'image'")
 
-        else:
-            raise ValueError("input_type must be 'text' or 'image'")
+        # ---------- VALIDATE / REPAIR ----------
+        response = coerce_graph_response(response)
 
         # ---------- EXTRACT ----------
         summary = response.get("summary", "")
-        graph = response.get("graph", {})
+        graph = Graph.from_dict(response.get("graph", {}))
 
         # ---------- NORMALIZE ----------
-        graph = self.normalize(graph)
+        if connectivity is None and available_nodes:
+            connectivity = ConnectivityIndex(available_nodes)
+        graph = self.normalize(graph, connectivity)
 
         return {
             "summary": summary,
-            "graph": graph
+            "graph": graph if as_ir else graph.to_dict(),
+            "template": template
         }
@@ -0,0 +1,234 @@
+"""
+graph_ir.py
+
+Compact internal graph representation shared by the graph generator,
+the canvas compiler and the infra spec builder:
+1. Parsed ONCE from LLM / canvas JSON (Graph.from_dict)
+2. __slots__ nodes and edges; edges hold node references, not id strings
+3. Integer node keys and interned label / category / cloud / relation strings
+4. Id, label and edge indexes built once and kept in sync on mutation
+   (add / remove / relabel, used by incremental refinement)
+5. Converted back to JSON only at the API boundary (to_dict, compile_to_canvas)
+"""
+
+from sys import intern
+
+NODE_DATA_FIELDS = ("label", "category", "icon", "cloud")
+
+
+def _intern(value):
+    return intern(value) if isinstance(value, str) else value
+
+
+class Node:
+    __slots__ = ("key", "id", "type", "label", "category", "icon", "cloud", "config", "data_extra", "extra")
+
+    def __init__(self, key, id, type, label, category, icon, cloud=None, config=None, data_extra=None, extra=None):
+        self.key = key  # int, unique within its graph
+        self.id = id
+        self.type = _intern(type)
+        self.label = _intern(label)
+        self.category = _intern(category)
+        self.icon = icon
+        self.cloud = _intern(cloud)
+        self.config = config if config is not None else {}
+        # unknown keys are kept (None when absent) so to_dict() round-trips
+        self.data_extra = data_extra
+        self.extra = extra
+
+    def to_dict(self) -> dict:
+        data = {"label": self.label, "category": self.category, "icon": self.icon}
+        if self.cloud is not None:
+            data["cloud"] = self.cloud
+        if self.data_extra:
+            data.update(self.data_extra)
+
+        node = {"id": self.id, "type": self.type, "data": data}
+        # canvas nodes carry their settings in data.config; don't add an
+        # empty top-level config they never had
+        if self.config or "config" not in data:
+            node["config"] = self.config
+        if self.extra:
+            node.update(self.extra)
+        return node
+
+
+class Edge:
+    __slots__ = ("source", "target", "relation")
+
+    def __init__(self, source: Node, target: Node, relation: str):
+        self.source = source
+        self.target = target
+        self.relation = _intern(relation)
+
+    def to_dict(self) -> dict:
+        return {"source": self.source.id, "target": self.target.id, "relation": self.relation}
+
+
+class Graph:
+    __slots__ = ("nodes", "edges", "pending_edges", "_next_key", "_by_id", "_by_label", "_edge_keys")
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+        # (source id, target id, relation) parsed before both ends existed
+        self.pending_edges = []
+        self._next_key = 0
+        self._by_id = {}
+        self._by_label = {}
+        self._edge_keys = set()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # -------------------------
+    # PARSE / SERIALIZE
+    # -------------------------
+    @classmethod
+    def from_dict(cls, graph: dict) -> "Graph":
+        """
+        Accepts LLM graphs and canvas graphs. Duplicate edges are dropped
+        while parsing; edges with unknown endpoints are held in
+        pending_edges until attach_pending() (e.g. for the vpc / subnet
+        nodes normalization adds) and never serialized.
+        """
+        ir = cls()
+        for n in graph.get("nodes", []):
+            data = n.get("data") or {}
+            data_extra = {k: v for k, v in data.items() if k not in NODE_DATA_FIELDS} or None
+            extra = {k: v for k, v in n.items() if k not in ("id", "type", "data", "config")} or None
+
+            ir.add_node(
+                n["id"],
+                data["label"],
+                data.get("category"),
+                data.get("icon"),
+                cloud=data.get("cloud"),
+                type=n.get("type", "cloudNode"),
+                config=n.get("config"),
+                data_extra=data_extra,
+                extra=extra
+            )
+
+        for e in graph.get("edges", []):
+            source = ir._by_id.get(e["source"])
+            target = ir._by_id.get(e["target"])
+            if source is not None and target is not None:
+                ir.add_edge(source, target, e.get("relation", "connects_to"))
+            else:
+                ir.pending_edges.append((e["source"], e["target"], e.get("relation", "connects_to")))
+
+        return ir
+
+    def to_dict(self) -> dict:
+        return {
+            "nodes": [n.to_dict() for n in self.nodes],
+            "edges": [e.to_dict() for e in self.edges]
+        }
+
+    # -------------------------
+    # NODES
+    # -------------------------
+    def add_node(
+        self,
+        id,
+        label,
+        category,
+        icon,
+        cloud=None,
+        type="cloudNode",
+        config=None,
+        data_extra=None,
+        extra=None,
+        first: bool = False
+    ) -> Node:
+        node = Node(self._next_key, id, type, label, category, icon, cloud, config, data_extra, extra)
+        self._next_key += 1
+
+        if first:
+            self.nodes.insert(0, node)
+        else:
+            self.nodes.append(node)
+        # a repeated id shadows the earlier node, like a dict keyed by id
+        self._by_id[id] = node
+        self._by_label.setdefault(node.label, []).append(node)
+        return node
+
+    def node(self, node_id):
+        return self._by_id.get(node_id)
+
+    def has_label(self, label: str) -> bool:
+        return bool(self._by_label.get(label))
+
+    def nodes_with_label(self, label: str) -> list:
+        return self._by_label.get(label, [])
+
+    def remove_node(self, node: Node):
+        """Remove a node and every edge touching it."""
+        self.nodes = [n for n in self.nodes if n is not node]
+        if self._by_id.get(node.id) is node:
+            del self._by_id[node.id]
+        self._by_label[node.label].remove(node)
+        self.retain_edges(lambda e: e.source is not node and e.target is not node)
+
+    def relabel(self, node: Node, label: str, category=None, icon=None, cloud=None):
+        self._by_label[node.label].remove(node)
+        node.label = _intern(label)
+        if category is not None:
+            node.category = _intern(category)
+        if icon is not None:
+            node.icon = icon
+        if cloud is not None:
+            node.cloud = _intern(cloud)
+        self._by_label.setdefault(node.label, []).append(node)
+
+    def neighbours(self, keys) -> set:
+        """Keys of the nodes sharing an edge with any node in `keys`."""
+        found = set()
+        for e in self.edges:
+            if e.source.key in keys:
+                found.add(e.target.key)
+            if e.target.key in keys:
+                found.add(e.source.key)
+        return found
+
+    # -------------------------
+    # EDGES
+    # -------------------------
+    def add_edge(self, source: Node, target: Node, relation: str) -> bool:
+        key = (source.key, target.key, relation)
+        if key in self._edge_keys:
+            return False
+        self._edge_keys.add(key)
+        self.edges.append(Edge(source, target, relation))
+        return True
+
+    def attach_pending(self) -> int:
+        """Add the pending edges whose endpoints now exist; drop the rest."""
+        attached = 0
+        for source_id, target_id, relation in self.pending_edges:
+            source = self._by_id.get(source_id)
+            target = self._by_id.get(target_id)
+            if source is not None and target is not None:
+                attached += self.add_edge(source, target, relation)
+        self.pending_edges = []
+        return attached
+
+    def has_edge(self, source: Node, target: Node, relation: str) -> bool:
+        return (source.key, target.key, relation) in self._edge_keys
+
+    def remove_edge(self, source: Node, target: Node, relation: str) -> bool:
+        if not self.has_edge(source, target, relation):
+            return False
+        self.retain_edges(lambda e: not (e.source is source and e.target is target and e.relation == relation))
+        return True
+
+    def retain_edges(self, keep):
+        """Drop every edge for which keep(edge) is false."""
+        kept = [e for e in self.edges if keep(e)]
+        self.edges = kept
+        self._edge_keys = {(e.source.key, e.target.key, e.relation) for e in kept}
+
+
+def as_graph(graph) -> Graph:
+    return graph if isinstance(graph, Graph) else Graph.from_dict(graph)
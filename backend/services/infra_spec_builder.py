@@ -1,21 +1,27 @@
-from service_registry import *
+from services.graph_ir import as_graph
+from services.service_registry import CANONICAL_SERVICE_MAP, DEFAULTS
+
+
 class InfraSpecBuilder:
     """
     Converts a user graph + node catalog into a strict Infra Spec
     """
 
     def __init__(self, node_catalog: list):
-        # index catalog by id
+        # index catalog by id, and by label for node resolution
         self.catalog = {n["id"]: n for n in node_catalog}
+        self.by_label = {}
+        for cid, c in self.catalog.items():
+            self.by_label.setdefault(c["label"].strip().lower(), []).append((cid, c["cloud"]))
 
-    def build(self, graph: dict) -> dict:
-        nodes = graph["nodes"]
-        edges = graph.get("edges", [])
+    def build(self, graph) -> dict:
+        """graph: Graph IR or canvas/graph dict"""
+        graph = as_graph(graph)
 
         # ---------- 1. Detect cloud from node types ----------
         clouds = set()
-        for n in nodes:
-            node_type = n.get("type", "")
+        for n in graph.nodes:
+            node_type = n.type or ""
             if "gcp" in node_type.lower():
                 clouds.add("gcp")
             elif "aws" in node_type.lower():
@@ -30,27 +36,26 @@ class InfraSpecBuilder:
 
         # ---------- 2. Build service entries ----------
         services = {}
-        node_id_to_service = {}
+        node_service = {}
 
-        for n in nodes:
+        for n in graph.nodes:
             catalog_id = self._get_catalog_id(n, preferred_cloud=cloud)
             canonical = CANONICAL_SERVICE_MAP[catalog_id]
 
-            # Extract config from node data
-            node_config = n.get("data", {}).get("config", {})
-            
             services[canonical] = {
                 "id": canonical,
                 **DEFAULTS.get(canonical, {}),
-                **node_config  # Merge node-specific config
+                # Merge node-specific config (canvas data.config, then LLM config)
+                **((n.data_extra or {}).get("config") or {}),
+                **n.config
             }
 
-            node_id_to_service[n["id"]] = canonical
+            node_service[n.key] = canonical
 
         # ---------- 3. Resolve relationships from edges ----------
-        for e in edges:
-            src = node_id_to_service[e["source"]]
-            tgt = node_id_to_service[e["target"]]
+        for e in graph.edges:
+            src = node_service[e.source.key]
+            tgt = node_service[e.target.key]
 
             # Networking containment
             if src in ["vpc", "vnet"] and tgt == "subnet":
@@ -75,18 +80,15 @@ class InfraSpecBuilder:
         }
 
         return infra_spec
-    def _get_catalog_id(self, node: dict, preferred_cloud: str = None) -> str:
-        label = node["data"]["label"].strip().lower()
 
-        matches = []
-        for cid, c in self.catalog.items():
-            if c["label"].strip().lower() == label:
-                # If preferred_cloud is specified, filter by it
-                if preferred_cloud:
-                    if c["cloud"] == preferred_cloud:
-                        matches.append(cid)
-                else:
-                    matches.append(cid)
+    def _get_catalog_id(self, node, preferred_cloud: str = None) -> str:
+        label = node.label.strip().lower()
+
+        matches = [
+            cid for cid, cloud in self.by_label.get(label, [])
+            # If preferred_cloud is specified, filter by it
+            if not preferred_cloud or cloud == preferred_cloud
+        ]
 
         if len(matches) == 1:
             return matches[0]
@@ -94,4 +96,4 @@ class InfraSpecBuilder:
         if len(matches) > 1:
             raise ValueError(f"Ambiguous catalog match for label: {label}. Matches: {matches}")
 
-        raise ValueError(f"Node not found in catalog: {label}")
\ No newline at end of file
+        raise ValueError(f"Node not found in catalog: {label}")
@@ -0,0 +1,256 @@
+# llmchat/admission.py
+"""
+Admission control in front of provider calls:
+1. Per-provider token buckets for requests/min and tokens/min,
+   charged with the estimated prompt + completion tokens of every
+   provider attempt (retries included); a request larger than the burst
+   is admitted once the bucket is full and leaves it in debt
+2. One bounded wait queue per provider, ordered by priority class
+   (interactive before batch), FIFO within a class
+3. Fast rejection (AdmissionRejected, retry_after) when the queue is
+   full or the estimated wait exceeds the class deadline
+Callers over the ceiling wait their turn instead of all hitting the
+provider's own 429s and retrying together.
+
+Limits come from LLM_<PROVIDER>_RPM / LLM_<PROVIDER>_TPM, falling back
+to PROVIDER_LIMITS; LLM_ADMISSION=0 disables admission entirely.
+"""
+
+import os
+import json
+import math
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from services.cancellation import CANCEL_POLL_S, current_token
+from .base import BaseLLM, _attempt_hook
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+# (requests per minute, tokens per minute); None = not limited
+PROVIDER_LIMITS = {
+    "groq": (30, 12000),
+    "gemini": (15, 250000),
+}
+
+# seconds a caller of each class may be queued before being rejected
+MAX_WAIT_S = {PRIORITY_INTERACTIVE: 30, PRIORITY_BATCH: 300}
+MAX_QUEUE = 64
+
+# share of the per-minute allowance that may be spent in one burst
+BURST_FRACTION = 0.5
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, provider, retry_after, reason):
+        self.provider = provider
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"LLM provider '{provider}' is saturated ({reason}); retry after {retry_after}s")
+
+
+def estimate_tokens(messages, max_output_tokens: int = 0) -> int:
+    text = messages if isinstance(messages, str) else json.dumps(messages, ensure_ascii=False)
+    return len(text) // CHARS_PER_TOKEN + (max_output_tokens or 0)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute * BURST_FRACTION)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` is available (after refill)."""
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+
+class AdmissionController:
+    def __init__(self, provider: str, rpm: float, tpm: float, max_queue: int = MAX_QUEUE, max_wait_s: dict = None):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s or MAX_WAIT_S
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+    def _estimated_wait(self, tokens: float, priority: int) -> float:
+        # demand of everything that will be served before this caller
+        ahead = [w for w in self._waiters if w[0] <= priority]
+        return max(
+            self.requests.time_until(len(ahead) + 1),
+            self.tokens.time_until(sum(w[2] for w in ahead) + min(tokens, self.tokens.capacity))
+        )
+
+    def acquire(self, tokens: float, priority: int = PRIORITY_INTERACTIVE, cancel_token=None) -> float:
+        """
+        Block until admitted; returns seconds spent queued. A cancelled
+        cancel_token leaves the queue with Cancelled.
+        """
+        started = time.monotonic()
+        # a request larger than the burst would never fit: it goes once the
+        # bucket is full and is charged in full (the debt delays later callers)
+        needed = min(tokens, self.tokens.capacity)
+
+        with self._cond:
+            self._refill()
+            wait = self._estimated_wait(tokens, priority)
+            reason = None
+            if len(self._waiters) >= self.max_queue:
+                reason = "queue full"
+            elif wait > self.max_wait_s.get(priority, MAX_WAIT_S[PRIORITY_BATCH]):
+                reason = "estimated wait too long"
+            if reason:
+                self.rejected += 1
+                raise AdmissionRejected(self.provider, max(1, math.ceil(wait)), reason)
+
+            entry = [priority, next(self._seq), tokens]
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled("admission_wait")
+                    self._refill()
+                    if self._waiters[0] is entry:
+                        delay = max(self.requests.time_until(1), self.tokens.time_until(needed))
+                        if delay <= 0:
+                            heapq.heappop(self._waiters)
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self.admitted += 1
+                            self._cond.notify_all()
+                            return time.monotonic() - started
+                        self._cond.wait(delay if cancel_token is None else min(delay, CANCEL_POLL_S))
+                    else:
+                        self._cond.wait(None if cancel_token is None else CANCEL_POLL_S)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                "provider": self.provider,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "requests_available": round(self.requests.tokens, 2),
+                "tokens_available": round(self.tokens.tokens, 1)
+            }
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(provider: str):
+    """Process-wide controller for a provider, or None when it is not limited."""
+    if os.getenv("LLM_ADMISSION", "1") == "0":
+        return None
+
+    with _controllers_lock:
+        if provider not in _controllers:
+            rpm, tpm = PROVIDER_LIMITS.get(provider, (None, None))
+            prefix = f"LLM_{provider.upper()}_"
+            rpm = float(os.getenv(prefix + "RPM", rpm or 0))
+            tpm = float(os.getenv(prefix + "TPM", tpm or 0))
+            _controllers[provider] = AdmissionController(provider, rpm, tpm) if rpm and tpm else None
+        return _controllers[provider]
+
+
+def admission_stats() -> list:
+    with _controllers_lock:
+        controllers = [c for c in _controllers.values() if c is not None]
+    return [c.stats() for c in controllers]
+
+
+class AdmittedLLM(BaseLLM):
+    """Wraps a provider so every call is admitted first."""
+
+    def __init__(self, llm: BaseLLM, controller: AdmissionController, priority: int = PRIORITY_INTERACTIVE):
+        self.llm = llm
+        self.controller = controller
+        self.priority = priority
+
+    def __getattr__(self, name):
+        # model, temperature, max_tokens, ... of the wrapped provider
+        return getattr(self.llm, name)
+
+    @property
+    def client(self):
+        # BaseLLM.client is found before __getattr__ is ever consulted
+        return self.llm.client
+
+    def _create_client(self):
+        return self.llm.client
+
+    def warm_up(self):
+        return self.llm.warm_up()
+
+    def _admit(self, payload, images: int = 0):
+        tokens = estimate_tokens(payload, getattr(self.llm, "max_tokens", 0)) + images * IMAGE_TOKENS
+        self.controller.acquire(tokens, self.priority, current_token())
+
+    @contextmanager
+    def _admitting(self, payload, images: int = 0):
+        """
+        Providers that report attempts are admitted per attempt (retries
+        inside generate_json included); others once, up front.
+        """
+        if not getattr(self.llm, "reports_attempts", False):
+            self._admit(payload, images)
+            yield
+            return
+        reset = _attempt_hook.set(self._admit)
+        try:
+            yield
+        finally:
+            _attempt_hook.reset(reset)
+
+    def stream(self, messages):
+        # charged once: the context var cannot follow a generator's consumer
+        self._admit(messages)
+        yield from self.llm.stream(messages)
+
+    def generate_json(self, messages, schema=None):
+        with self._admitting(messages):
+            return self.llm.generate_json(messages, schema=schema)
+
+    def generate_json_from_image(self, image_path, instruction, schema=None):
+        with self._admitting(instruction, images=1):
+            return self.llm.generate_json_from_image(
+                image_path=image_path,
+                instruction=instruction,
+                schema=schema
+            )
@@ -1,12 +1,56 @@
 # llmchat/base.py
+import threading
+import contextvars
 from abc import ABC, abstractmethod
 
+from services.cancellation import checkpoint, current_token
+
+_client_lock = threading.Lock()
+
+# set by AdmittedLLM around a call: charges each provider attempt (retries too)
+_attempt_hook = contextvars.ContextVar("llm_attempt_hook", default=None)
+
+
 class BaseLLM(ABC):
+    # SDK clients are built on first use, not at construction/import time
+    _client = None
+    # providers that call _attempt() before every request they send
+    reports_attempts = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            with _client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    @abstractmethod
+    def _create_client(self):
+        """Build the provider SDK client (called once, lazily)."""
+        pass
+
+    def _attempt(self, payload, images: int = 0):
+        """Before each provider request: stop if cancelled, then wait for admission."""
+        checkpoint("llm_attempt")
+        hook = _attempt_hook.get()
+        if hook is not None:
+            hook(payload, images)
+
+    def _request_timeout(self):
+        """Seconds left before the current request's deadline (None: no deadline)."""
+        token = current_token()
+        return token.remaining() if token is not None else None
+
+    def warm_up(self):
+        """Import the provider SDK and build its client ahead of the first request."""
+        return self.client
 
     @abstractmethod
     def stream(self, messages):
         pass
 
     @abstractmethod
-    def generate_json(self, messages):
+    def generate_json(self, messages, schema=None):
+        """schema: JSON schema to constrain output where the provider supports it"""
         pass
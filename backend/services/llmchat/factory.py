@@ -1,11 +1,28 @@
 # llmchat/factory.py
-from .groq_llm import GroqLLM
-from .gemini_llm import GeminiLLM
-
-def get_llm(provider="groq", **kwargs):
-    if provider == "groq":
-        return GroqLLM(**kwargs)
-    elif provider == "gemini":
-        return GeminiLLM(**kwargs)
-    else:
+import importlib
+
+from .admission import PRIORITIES, AdmittedLLM, get_admission_controller
+
+# provider -> (module, class); modules are imported on first get_llm() call
+PROVIDERS = {
+    "groq": (".groq_llm", "GroqLLM"),
+    "gemini": (".gemini_llm", "GeminiLLM"),
+    "replay": (".replay_llm", "ReplayLLM"),
+}
+
+
+def get_llm(provider="groq", priority="interactive", **kwargs):
+    """priority: admission class for this client, "interactive" or "batch"."""
+    if provider not in PROVIDERS:
         raise ValueError(f"Unsupported LLM provider: {provider}")
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unsupported LLM priority: {priority}")
+
+    module_name, class_name = PROVIDERS[provider]
+    module = importlib.import_module(module_name, __package__)
+    llm = getattr(module, class_name)(**kwargs)
+
+    controller = get_admission_controller(provider)
+    if controller is None:
+        return llm
+    return AdmittedLLM(llm, controller, PRIORITIES[priority])
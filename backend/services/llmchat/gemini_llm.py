@@ -2,14 +2,15 @@
 
 import json
 import os
-from google import genai
 from dotenv import load_dotenv
+from services.cancellation import checkpoint
 from .base import BaseLLM
-from google.genai import types
 load_dotenv()
 
 
 class GeminiLLM(BaseLLM):
+    reports_attempts = True
+
     def __init__(
         self,
         model="gemini-3-flash-preview",
@@ -17,12 +18,16 @@ class GeminiLLM(BaseLLM):
         max_tokens=4096,  # increased for structured outputs
         max_retries=2
     ):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.max_retries = max_retries
 
+    def _create_client(self):
+        from google import genai
+
+        return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
     # --------------------------------------------------
     # Prompt conversion
     # --------------------------------------------------
@@ -44,24 +49,38 @@ class GeminiLLM(BaseLLM):
         )
 
         for chunk in stream:
+            checkpoint("llm_stream")
             if hasattr(chunk, "text") and chunk.text:
                 yield chunk.text
 
     # --------------------------------------------------
     # JSON generation (SAFE)
     # --------------------------------------------------
-    def generate_json(self, messages):
+    def _json_config(self, schema=None):
+        config = {
+            "temperature": self.temperature,
+            "max_output_tokens": self.max_tokens,
+            "response_mime_type": "application/json",
+        }
+        if schema:
+            config["response_json_schema"] = schema
+
+        # an in-flight call must not outlive the request deadline
+        timeout = self._request_timeout()
+        if timeout is not None:
+            config["http_options"] = {"timeout": max(1, int(timeout * 1000))}
+        return config
+
+    def generate_json(self, messages, schema=None):
         last_error = None
 
         for attempt in range(1, self.max_retries + 1):
+            # a cancelled request stops retrying; every retry is admitted
+            self._attempt(messages)
             response = self.client.models.generate_content(
                 model=self.model,
                 contents=self._convert_messages(messages),
-                config={
-                    "temperature": self.temperature,
-                    "max_output_tokens": self.max_tokens,
-                    "response_mime_type": "application/json",
-                }
+                config=self._json_config(schema)
             )
 
             # 🔴 Detect truncation
@@ -130,10 +149,13 @@ class GeminiLLM(BaseLLM):
                 raise ValueError(f"Invalid JSON from Gemini:\n{text}")
 
             return json.loads(text[start:end + 1])
-    def generate_json_from_image(self, image_path, instruction):
+    def generate_json_from_image(self, image_path, instruction, schema=None):
+        from google.genai import types
+
         with open(image_path, "rb") as f:
             image_bytes = f.read()
 
+        self._attempt(instruction, images=1)
         response = self.client.models.generate_content(
             model=self.model,
             contents=[
@@ -143,11 +165,7 @@ class GeminiLLM(BaseLLM):
                 ),
                 instruction
             ],
-            config={
-                "temperature": self.temperature,
-                "max_output_tokens": self.max_tokens,
-                "response_mime_type": "application/json",
-            }
+            config=self._json_config(schema)
         )
 
         # Detect truncation
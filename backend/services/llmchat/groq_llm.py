@@ -1,42 +1,73 @@
 # llmchat/groq_llm.py
-from groq import Groq
 from dotenv import load_dotenv
 import json
+from services.cancellation import checkpoint
 from .base import BaseLLM
 
 load_dotenv()
 
 class GroqLLM(BaseLLM):
+    reports_attempts = True
+
+    # models that accept response_format={"type": "json_schema"}
+    STRUCTURED_OUTPUT_MODELS = {
+        "openai/gpt-oss-20b",
+        "openai/gpt-oss-120b",
+        "moonshotai/kimi-k2-instruct",
+        "meta-llama/llama-4-maverick-17b-128e-instruct",
+        "meta-llama/llama-4-scout-17b-16e-instruct"
+    }
+
     def __init__(
         self,
         model="llama-3.3-70b-versatile",
         temperature=0.2,
         max_tokens=1024
     ):
-        self.client = Groq()
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
 
+    def _create_client(self):
+        from groq import Groq
+
+        return Groq()
+
+    def _timeout_kwargs(self):
+        timeout = self._request_timeout()
+        return {"timeout": max(1.0, timeout)} if timeout is not None else {}
+
     def stream(self, messages):
+        checkpoint("llm_attempt")
         completion = self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=self.temperature,
             max_completion_tokens=self.max_tokens,
-            stream=True
+            stream=True,
+            **self._timeout_kwargs()
         )
 
         for chunk in completion:
+            checkpoint("llm_stream")
             yield chunk.choices[0].delta.content or ""
 
-    def generate_json(self, messages):
+    def generate_json(self, messages, schema=None):
+        response_format = {"type": "json_object"}
+        if schema and self.model in self.STRUCTURED_OUTPUT_MODELS:
+            response_format = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "schema": schema}
+            }
+
+        self._attempt(messages)
         completion = self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=self.temperature,
             max_completion_tokens=self.max_tokens,
-            response_format={"type": "json_object"}
+            response_format=response_format,
+            **self._timeout_kwargs()
         )
 
         return json.loads(completion.choices[0].message.content)
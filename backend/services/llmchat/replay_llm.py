@@ -0,0 +1,215 @@
+# llmchat/replay_llm.py
+"""
+Record/replay provider for deterministic, offline pipeline runs.
+
+record: wraps a real provider and stores one cassette per request
+        (request hash -> response) under the cassette directory
+replay: serves cassettes locally, never touches the network
+
+Configured with kwargs or, since generators call get_llm(provider)
+without arguments, via environment:
+    LLM_REPLAY_MODE       record | replay            (default: replay)
+    LLM_REPLAY_UPSTREAM   provider used for record   (default: groq)
+    LLM_CASSETTE_DIR      cassette directory         (default: cassettes)
+    LLM_REPLAY_LATENCY    seconds, or "recorded"     (default: 0)
+    LLM_REPLAY_CHUNK      stream re-chunk size       (default: as recorded)
+"""
+
+import os
+import json
+import time
+import copy
+import hashlib
+import threading
+
+from services.cancellation import checkpoint, current_token
+from .base import BaseLLM
+
+MODES = ("record", "replay")
+CASSETTE_DIR = "cassettes"
+
+
+class CassetteNotFound(LookupError):
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        super().__init__(f"No cassette for request {key} ({path}); record it first")
+
+
+class ReplayLLM(BaseLLM):
+    def __init__(
+        self,
+        mode=None,
+        upstream=None,
+        cassette_dir=None,
+        latency=None,
+        chunk_size=None,
+        **upstream_kwargs
+    ):
+        self.mode = mode or os.getenv("LLM_REPLAY_MODE", "replay")
+        if self.mode not in MODES:
+            raise ValueError(f"Unsupported replay mode: {self.mode}")
+
+        self.upstream_name = upstream or os.getenv("LLM_REPLAY_UPSTREAM", "groq")
+        self.cassette_dir = cassette_dir or os.getenv("LLM_CASSETTE_DIR", CASSETTE_DIR)
+
+        latency = latency if latency is not None else os.getenv("LLM_REPLAY_LATENCY", 0)
+        self.latency = latency if latency == "recorded" else float(latency)
+
+        chunk_size = chunk_size or os.getenv("LLM_REPLAY_CHUNK")
+        self.chunk_size = int(chunk_size) if chunk_size else None
+
+        self.upstream = None
+        if self.mode == "record":
+            from .factory import get_llm
+            self.upstream = get_llm(self.upstream_name, **upstream_kwargs)
+
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        # replays never reach a provider; recordings use the upstream's client
+        return self.upstream.client if self.upstream is not None else None
+
+    def warm_up(self):
+        if self.upstream is not None:
+            self.upstream.warm_up()
+        return self
+
+    # -------------------------
+    # CASSETTES
+    # -------------------------
+    def _request_key(self, kind: str, payload: dict) -> str:
+        # upstream is part of the key so groq and gemini recordings never mix
+        raw = json.dumps(
+            {"kind": kind, "upstream": self.upstream_name, **payload},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cassette_path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str) -> dict:
+        with self._lock:
+            cassette = self._loaded.get(key)
+        if cassette is not None:
+            return cassette
+
+        path = self._cassette_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                cassette = json.load(f)
+        except FileNotFoundError:
+            raise CassetteNotFound(key, path) from None
+
+        with self._lock:
+            self._loaded[key] = cassette
+        return cassette
+
+    def _save(self, key: str, cassette: dict):
+        path = self._cassette_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._loaded[key] = cassette
+
+    def _simulate_latency(self, cassette: dict):
+        delay = cassette.get("elapsed_s", 0) if self.latency == "recorded" else self.latency
+        if delay:
+            self._sleep(delay)
+        checkpoint("llm_attempt")
+
+    def _sleep(self, delay: float):
+        # simulated latency is cancellable like a real call
+        token = current_token()
+        if token is None:
+            time.sleep(delay)
+        else:
+            token.wait(delay)
+
+    def _call(self, kind: str, payload: dict, produce):
+        """Record: run produce() upstream and store it. Replay: serve the cassette."""
+        key = self._request_key(kind, payload)
+
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = produce()
+            self._save(key, {
+                "kind": kind,
+                "upstream": self.upstream_name,
+                "request": payload,
+                "response": response,
+                "elapsed_s": round(time.perf_counter() - started, 4)
+            })
+            return response
+
+        cassette = self._load(key)
+        self._simulate_latency(cassette)
+        # callers mutate responses (normalize); never hand out the cached copy
+        return copy.deepcopy(cassette["response"])
+
+    # -------------------------
+    # PROVIDER API
+    # -------------------------
+    def stream(self, messages):
+        key = self._request_key("stream", {"messages": messages})
+
+        if self.mode == "record":
+            started = time.perf_counter()
+            chunks = []
+            for chunk in self.upstream.stream(messages):
+                chunks.append(chunk)
+                yield chunk
+            self._save(key, {
+                "kind": "stream",
+                "upstream": self.upstream_name,
+                "request": {"messages": messages},
+                "response": chunks,
+                "elapsed_s": round(time.perf_counter() - started, 4)
+            })
+            return
+
+        cassette = self._load(key)
+        chunks = cassette["response"]
+        if self.chunk_size:
+            text = "".join(chunks)
+            chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+        # spread the simulated latency over the chunks, like a real stream
+        delay = cassette.get("elapsed_s", 0) if self.latency == "recorded" else self.latency
+        per_chunk = delay / len(chunks) if chunks and delay else 0
+        for chunk in chunks:
+            if per_chunk:
+                self._sleep(per_chunk)
+            checkpoint("llm_stream")
+            yield chunk
+
+    def generate_json(self, messages, schema=None):
+        return self._call(
+            "json",
+            {"messages": messages, "schema": schema},
+            lambda: self.upstream.generate_json(messages, schema=schema)
+        )
+
+    def generate_json_from_image(self, image_path, instruction, schema=None):
+        # key on image content, not path, so moved files still replay
+        with open(image_path, "rb") as f:
+            image_hash = hashlib.sha256(f.read()).hexdigest()
+
+        return self._call(
+            "image_json",
+            {"image_sha256": image_hash, "instruction": instruction, "schema": schema},
+            lambda: self.upstream.generate_json_from_image(
+                image_path=image_path,
+                instruction=instruction,
+                schema=schema
+            )
+        )
@@ -0,0 +1,121 @@
+"""
+node_catalog.py
+
+Catalog reads behind GET /nodes:
+1. Optional field projection pushed down into the SELECT
+2. Keyset (cursor) pagination on the node id
+Served from the binary snapshot when present, SQLite otherwise.
+"""
+
+import json
+import sqlite3
+
+from services.catalog_snapshot import load_snapshot
+
+DB_NAME = "nodes.db"
+
+NODE_FIELDS = ("id", "label", "category", "cloud", "icon", "description", "connections")
+
+
+def parse_fields(fields: str = None):
+    """'id,label,icon' -> ('id', 'label', 'icon'); None means every field."""
+    if not fields:
+        return None
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(NODE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return tuple(f for f in NODE_FIELDS if f in requested)
+
+
+def query_nodes(
+    db_path: str = DB_NAME,
+    snapshot_path: str = None,
+    cloud: str = None,
+    category: str = None,
+    label: str = None,
+    fields: tuple = None,
+    limit: int = None,
+    after: str = None
+):
+    """
+    Returns (nodes, next_cursor). next_cursor is the last id of a full
+    page, to be passed back as `after`; None when there is nothing more.
+    """
+    paginate = limit is not None or after is not None
+
+    snapshot = load_snapshot(snapshot_path) if snapshot_path else None
+    if snapshot is not None:
+        # the cursor needs the id even if it was not projected
+        wanted = fields if not fields or "id" in fields else ("id",) + fields
+        nodes = []
+        for node in snapshot.iter_nodes(
+            cloud=cloud, category=category, label=label,
+            fields=wanted, after=after, ordered=paginate
+        ):
+            nodes.append(node)
+            if limit is not None and len(nodes) >= limit:
+                break
+    else:
+        nodes = _query_db(db_path, cloud, category, label, fields, limit, after)
+
+    next_cursor = nodes[-1]["id"] if limit is not None and len(nodes) == limit else None
+
+    if fields and "id" not in fields:
+        nodes = [{f: n[f] for f in fields} for n in nodes]
+
+    return nodes, next_cursor
+
+
+def _query_db(db_path, cloud, category, label, fields, limit, after):
+    columns = fields if not fields or "id" in fields else ("id",) + fields
+    columns = columns or NODE_FIELDS
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+
+    query = f"SELECT {', '.join(columns)} FROM nodes WHERE 1=1"
+    params = []
+
+    if cloud:
+        query += " AND cloud = ?"
+        params.append(cloud)
+
+    if category:
+        query += " AND category = ?"
+        params.append(category)
+
+    if label:
+        query += " AND label LIKE ?"
+        params.append(f"%{label}%")
+
+    if after is not None:
+        query += " AND id > ?"
+        params.append(after)
+
+    # keyset pagination walks the primary key index
+    if limit is not None or after is not None:
+        query += " ORDER BY id"
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    conn.close()
+
+    nodes = []
+    for row in rows:
+        node = {c: row[c] for c in columns}
+        if "connections" in node:
+            node["connections"] = json.loads(row["connections"]) if row["connections"] else {
+                "canConnectTo": [],
+                "canReceiveFrom": []
+            }
+        nodes.append(node)
+
+    return nodes
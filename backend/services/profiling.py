@@ -0,0 +1,259 @@
+"""
+profiling.py
+
+Opt-in per-request profiling:
+1. A request is profiled when it carries the admin header
+   (X-Profile: <PROFILE_ADMIN_TOKEN>) or is picked by PROFILE_SAMPLE_RATE
+2. "deterministic" mode wraps the work in cProfile and stores
+   <id>.pstats plus a cumulative-time report (<id>.txt)
+3. "sampling" mode walks the worker thread's stack every
+   SAMPLE_INTERVAL_S and stores collapsed stacks (<id>.collapsed,
+   flamegraph.pl / speedscope input)
+4. Only the newest MAX_PROFILES profiles are kept; listing and
+   downloading them require the admin header
+Requests that are not picked only pay for the header / sample-rate check.
+Only the worker thread is profiled; work it hands to other threads
+(hierarchical zones) shows up as waiting.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hmac
+import uuid
+import random
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILES_DIR = "profiles"
+PROFILE_HEADER = "x-profile"
+REQUEST_ID_HEADER = "x-request-id"
+
+MODES = ("deterministic", "sampling")
+MAX_PROFILES = 50
+SAMPLE_INTERVAL_S = 0.005
+REPORT_LINES = 40
+TOP_FUNCTIONS = 10
+
+# profile file suffix -> media type
+PROFILE_FORMATS = {
+    "pstats": "application/octet-stream",
+    "txt": "text/plain",
+    "collapsed": "text/plain"
+}
+
+_SAFE_ID_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread."""
+
+    def __init__(self, thread_id: int, interval_s: float = SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        profiles_dir: str = PROFILES_DIR,
+        sample_rate: float = 0.0,
+        admin_token: str = None,
+        mode: str = "deterministic",
+        max_profiles: int = MAX_PROFILES,
+        interval_s: float = SAMPLE_INTERVAL_S
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Profiling mode must be one of {MODES}")
+
+        self.profiles_dir = profiles_dir
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.mode = mode
+        self.max_profiles = max_profiles
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # SELECTION
+    # -------------------------
+    def authorized(self, headers) -> bool:
+        """
+        Admin header check. Also guards listing / downloading, which are
+        therefore disabled while no admin token is configured.
+        """
+        if not self.admin_token:
+            return False
+        return hmac.compare_digest(headers.get(PROFILE_HEADER, ""), self.admin_token)
+
+    def wanted(self, headers):
+        """Trigger ("header" / "sampled") for this request, or None."""
+        if self.admin_token and PROFILE_HEADER in headers and self.authorized(headers):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def new_profile_id(self, scope: str, request_id: str = None) -> str:
+        if request_id:
+            request_id = _SAFE_ID_RE.sub("-", request_id)[:64].strip(".-")
+        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        return f"{scope}_{ts}_{request_id or uuid.uuid4().hex[:8]}"
+
+    # -------------------------
+    # CAPTURE
+    # -------------------------
+    @contextmanager
+    def capture(self, profile_id: str, scope: str, trigger: str):
+        """Profile the enclosed block on the current thread and store the result."""
+        started = time.perf_counter()
+        profiler = sampler = None
+        if self.mode == "sampling":
+            sampler = StackSampler(threading.get_ident(), self.interval_s)
+            sampler.start()
+        else:
+            profiler = self._enable_profiler(profile_id)
+            if profiler is None:
+                yield profile_id
+                return
+
+        error = None
+        try:
+            yield profile_id
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+
+            self._store(profile_id, {
+                "profile_id": profile_id,
+                "scope": scope,
+                "trigger": trigger,
+                "mode": self.mode,
+                "duration_s": round(time.perf_counter() - started, 4),
+                "error": error,
+                "created_at": datetime.utcnow().isoformat()
+            }, profiler, sampler)
+
+    def _enable_profiler(self, profile_id: str):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python >= 3.12 allows one active cProfile per interpreter,
+            # so a concurrent capture runs the request unprofiled
+            print(f"⚠️ Skipping profile {profile_id}: {e}")
+            return None
+        return profiler
+
+    def _store(self, profile_id: str, meta: dict, profiler, sampler):
+        base = os.path.join(self.profiles_dir, profile_id)
+        try:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+            if profiler is not None:
+                profiler.dump_stats(f"{base}.pstats")
+                with open(f"{base}.txt", "w") as f:
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+                meta["formats"] = ["pstats", "txt"]
+                meta["top"] = self._top_functions(stats)
+            else:
+                with open(f"{base}.collapsed", "w") as f:
+                    for stack, count in sampler.stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+                meta["formats"] = ["collapsed"]
+                meta["samples"] = sum(sampler.stacks.values())
+
+            with open(f"{base}.json", "w") as f:
+                json.dump(meta, f, indent=2)
+            print(f"🔬 Profile stored: {profile_id} ({meta['duration_s']}s)")
+        except OSError as e:
+            # a profile must never fail the request it measured
+            print(f"⚠️ Could not store profile {profile_id}: {e}")
+            return
+
+        self._prune()
+
+    def _top_functions(self, stats: pstats.Stats) -> list:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        return [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": nc,
+                "tottime_s": round(tt, 4),
+                "cumtime_s": round(ct, 4)
+            }
+            for (filename, line, name), (cc, nc, tt, ct, callers) in rows[:TOP_FUNCTIONS]
+        ]
+
+    def _prune(self):
+        with self._lock:
+            metas = self._meta_paths()
+            for path in metas[self.max_profiles:]:
+                base = path[:-len(".json")]
+                for suffix in ("json", *PROFILE_FORMATS):
+                    try:
+                        os.remove(f"{base}.{suffix}")
+                    except FileNotFoundError:
+                        pass
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def _meta_paths(self) -> list:
+        """Metadata files, newest first."""
+        try:
+            entries = [e for e in os.scandir(self.profiles_dir) if e.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        entries.sort(key=lambda e: e.stat().st_mtime_ns, reverse=True)
+        return [e.path for e in entries]
+
+    def list_profiles(self, limit: int = 50) -> list:
+        profiles = []
+        for path in self._meta_paths()[:limit]:
+            try:
+                with open(path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # pruned or still being written
+                continue
+        return profiles
+
+    def profile_path(self, profile_id: str, fmt: str):
+        """Path of a stored profile file, or None."""
+        if fmt not in PROFILE_FORMATS or _SAFE_ID_RE.sub("", profile_id) != profile_id:
+            return None
+        path = os.path.join(self.profiles_dir, f"{profile_id}.{fmt}")
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,110 @@
+"""
+run_bundle.py
+
+Downloadable archive of a runs/<run_id> directory:
+1. Built once into runs/<run_id>/bundle.<ext> (next to meta.json)
+2. Rebuilt only when the bundled file set changed: a manifest hash of
+   (name, size, mtime) per file is stored next to the archive, so added,
+   modified and deleted files all trigger a rebuild
+3. Files are streamed into the archive in chunks, never read whole
+4. Credentials, provider plugins, state and binary plans are left out
+Serving is left to FileResponse (sendfile + HTTP Range).
+"""
+
+import os
+import hashlib
+import tarfile
+import zipfile
+import threading
+
+BUNDLE_FORMATS = {
+    "tar.gz": "application/gzip",
+    "zip": "application/zip"
+}
+BUNDLE_PREFIX = "bundle."
+MANIFEST_SUFFIX = ".manifest"
+
+# secrets and heavy / re-creatable artifacts
+EXCLUDED_DIRS = {"creds", ".terraform"}
+# tfplan.json / plan_cache.json carry plan values, including sensitive ones in plaintext
+EXCLUDED_FILES = {
+    ".terraformrc", "tfplan", "tfplan.json", "plan_cache.json",
+    "terraform.tfstate", "terraform.tfstate.backup"
+}
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def _run_lock(run_path: str) -> threading.Lock:
+    key = os.path.abspath(run_path)
+    with _build_locks_guard:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def bundle_path(run_path: str, fmt: str) -> str:
+    return os.path.join(run_path, f"{BUNDLE_PREFIX}{fmt}")
+
+
+def iter_bundle_files(run_path: str):
+    """Yield (absolute path, archive name) in a stable order."""
+    for root, dirs, files in os.walk(run_path):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDED_DIRS)
+        for name in sorted(files):
+            if name in EXCLUDED_FILES or name.startswith(BUNDLE_PREFIX) or name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, run_path)
+
+
+def _manifest_hash(files: list) -> str:
+    digest = hashlib.sha256()
+    for path, arcname in files:
+        st = os.stat(path)
+        digest.update(f"{arcname}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _is_fresh(archive: str, manifest: str) -> bool:
+    if not os.path.exists(archive):
+        return False
+    try:
+        with open(archive + MANIFEST_SUFFIX) as f:
+            return f.read().strip() == manifest
+    except FileNotFoundError:
+        return False
+
+
+def build_bundle(run_path: str, fmt: str = "tar.gz") -> str:
+    """Return the path of an up-to-date bundle, building it if needed."""
+    if fmt not in BUNDLE_FORMATS:
+        raise ValueError(f"Unsupported bundle format: {fmt}")
+
+    archive = bundle_path(run_path, fmt)
+    run_id = os.path.basename(os.path.normpath(run_path))
+
+    with _run_lock(run_path):
+        files = list(iter_bundle_files(run_path))
+        manifest = _manifest_hash(files)
+        if _is_fresh(archive, manifest):
+            return archive
+
+        tmp_path = f"{archive}.{os.getpid()}.tmp"
+        if fmt == "zip":
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for path, arcname in files:
+                    zf.write(path, f"{run_id}/{arcname}")
+        else:
+            with tarfile.open(tmp_path, "w:gz") as tf:
+                for path, arcname in files:
+                    tf.add(path, f"{run_id}/{arcname}", recursive=False)
+
+        # readers holding the old file keep a valid handle
+        os.replace(tmp_path, archive)
+
+        # written last: a crash in between leaves a stale manifest,
+        # which only costs a rebuild
+        with open(tmp_path, "w") as f:
+            f.write(manifest)
+        os.replace(tmp_path, archive + MANIFEST_SUFFIX)
+        return archive
@@ -0,0 +1,117 @@
+"""
+run_logs.py
+
+Executor output for a run, line by line:
+1. Bounded in-memory ring buffer for live tailing
+2. Append-only runs/<run_id>/executor.log for persistence, kept open
+   between begin() and end() instead of reopened for every line
+Offsets are line numbers, so a client can resume from the last line it saw.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+LOG_FILENAME = "executor.log"
+RING_BUFFER_LINES = 2000
+MAX_OPEN_LOGS = 256
+
+
+class RunLog:
+    def __init__(self, run_path: str, max_lines: int = RING_BUFFER_LINES):
+        self.path = os.path.join(run_path, LOG_FILENAME)
+        self._buffer = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._file = None  # open append handle while a writer is active
+
+        # continue numbering after whatever earlier runs persisted
+        self._next = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                self._next = sum(1 for _ in f)
+
+    @property
+    def next_offset(self) -> int:
+        return self._next
+
+    @property
+    def closed(self) -> bool:
+        return self._active == 0
+
+    # -------------------------
+    # WRITERS
+    # -------------------------
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            if self._file is None:
+                # line buffered: file readers past the ring buffer see every line
+                self._file = open(self.path, "a", buffering=1)
+
+    def end(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            if self._active == 0 and self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def append(self, line: str):
+        line = line.rstrip("\n")
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+            else:
+                # outside begin() / end(): one-off write
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            self._buffer.append((self._next, line))
+            self._next += 1
+
+    # -------------------------
+    # READERS
+    # -------------------------
+    def read(self, offset: int = 0, limit: int = 500):
+        """
+        Return ([(offset, line), ...], next_offset) starting at `offset`.
+        Served from memory when still buffered, otherwise from the file.
+        """
+        offset = max(0, offset)
+        with self._lock:
+            if self._buffer and offset >= self._buffer[0][0]:
+                start = offset - self._buffer[0][0]
+                lines = list(islice(self._buffer, start, start + limit))
+                return lines, (lines[-1][0] + 1 if lines else offset)
+
+        if not os.path.exists(self.path):
+            return [], offset
+
+        with open(self.path) as f:
+            lines = [
+                (offset + i, line.rstrip("\n"))
+                for i, line in enumerate(islice(f, offset, offset + limit))
+            ]
+        return lines, (lines[-1][0] + 1 if lines else offset)
+
+
+_logs = OrderedDict()
+_logs_lock = threading.Lock()
+
+
+def get_run_log(run_path: str) -> RunLog:
+    run_path = os.path.abspath(run_path)
+    with _logs_lock:
+        log = _logs.get(run_path)
+        if log is None:
+            log = RunLog(run_path)
+            _logs[run_path] = log
+
+        _logs.move_to_end(run_path)
+        while len(_logs) > MAX_OPEN_LOGS:
+            oldest_path, oldest = next(iter(_logs.items()))
+            if not oldest.closed:
+                break
+            del _logs[oldest_path]
+
+        return log
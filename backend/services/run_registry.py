@@ -0,0 +1,328 @@
+"""
+run_registry.py
+
+SQLite index over runs/<run_id>:
+1. One row per run (provider, services, spec hash, status, timestamps)
+2. Fast list / filter queries instead of walking meta.json files
+3. Retention GC that prunes or compacts old run directories; runs that
+   may still own cloud resources (applied, not destroyed since) are only
+   compacted, never deleted
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+RUNS_DB = "runs.db"
+
+# never garbage-collect runs that still have work in flight
+ACTIVE_STATUSES = ("queued", "running")
+
+# runs.infra: set when an apply starts (even a failed apply may have created
+# resources), cleared by a successful destroy
+INFRA_LIVE = "live"
+INFRA_DESTROYED = "destroyed"
+STATE_FILES = ("terraform.tfstate", "terraform.tfstate.backup")
+
+# heavy, re-creatable artifacts dropped when compacting old runs
+COMPACTABLE = (
+    ".terraform", "tfplan", "tfplan.json",
+    "bundle.tar.gz", "bundle.tar.gz.manifest", "bundle.zip", "bundle.zip.manifest"
+)
+
+
+class RunRegistry:
+    def __init__(self, db_path: str = RUNS_DB):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            provider TEXT,
+            services TEXT,
+            spec_hash TEXT,
+            status TEXT NOT NULL,
+            last_action TEXT,
+            infra TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS run_services (
+            run_id TEXT NOT NULL REFERENCES runs(run_id),
+            service TEXT NOT NULL,
+            PRIMARY KEY (service, run_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at);
+        CREATE INDEX IF NOT EXISTS idx_runs_status ON runs(status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_runs_provider ON runs(provider, created_at);
+        CREATE INDEX IF NOT EXISTS idx_runs_spec_hash ON runs(spec_hash);
+        """)
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(runs)")}
+        if "infra" not in columns:
+            # registries created before infra tracking
+            conn.execute("ALTER TABLE runs ADD COLUMN infra TEXT")
+        conn.commit()
+        conn.close()
+
+    # -------------------------
+    # WRITES
+    # -------------------------
+    def record_run(
+        self,
+        run_id: str,
+        path: str,
+        provider: str,
+        services: list,
+        spec_hash: str = None,
+        status: str = "generated",
+        created_at: str = None
+    ):
+        now = datetime.utcnow().isoformat()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                INSERT OR REPLACE INTO runs
+                (run_id, path, provider, services, spec_hash, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    run_id,
+                    os.path.abspath(path),
+                    provider,
+                    json.dumps(services),
+                    spec_hash,
+                    status,
+                    created_at or now,
+                    now
+                ))
+                conn.execute("DELETE FROM run_services WHERE run_id = ?", (run_id,))
+                conn.executemany(
+                    "INSERT INTO run_services (run_id, service) VALUES (?, ?)",
+                    [(run_id, s) for s in services]
+                )
+        finally:
+            conn.close()
+
+    def update_status(self, run_id: str, status: str, action: str = None):
+        infra = None
+        if action == "apply" and status == "running":
+            infra = INFRA_LIVE
+        elif action == "destroy" and status == "succeeded":
+            infra = INFRA_DESTROYED
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                UPDATE runs
+                SET status = ?, last_action = COALESCE(?, last_action),
+                    infra = COALESCE(?, infra), updated_at = ?
+                WHERE run_id = ?
+                """, (status, action, infra, datetime.utcnow().isoformat(), run_id))
+        finally:
+            conn.close()
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def get_run(self, run_id: str):
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        conn.close()
+        return self._row_to_dict(row) if row else None
+
+    def list_runs(
+        self,
+        provider: str = None,
+        status: str = None,
+        service: str = None,
+        spec_hash: str = None,
+        before: str = None,
+        limit: int = 50
+    ) -> list:
+        """Newest first; pass the last created_at as `before` for the next page."""
+        query = "SELECT runs.* FROM runs"
+        params = []
+
+        if service:
+            query += " JOIN run_services rs ON rs.run_id = runs.run_id AND rs.service = ?"
+            params.append(service)
+
+        query += " WHERE 1=1"
+        if provider:
+            query += " AND provider = ?"
+            params.append(provider)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if spec_hash:
+            query += " AND spec_hash = ?"
+            params.append(spec_hash)
+        if before:
+            query += " AND created_at < ?"
+            params.append(before)
+
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return [self._row_to_dict(r) for r in rows]
+
+    def _row_to_dict(self, row) -> dict:
+        run = dict(row)
+        run["services"] = json.loads(run["services"]) if run["services"] else []
+        return run
+
+    # -------------------------
+    # BACKFILL
+    # -------------------------
+    def sync_from_disk(self, runs_dir: str) -> int:
+        """Index run directories whose meta.json predates the registry."""
+        if not os.path.isdir(runs_dir):
+            return 0
+
+        conn = self._connect()
+        known = {r["run_id"] for r in conn.execute("SELECT run_id FROM runs")}
+        conn.close()
+
+        added = 0
+        for run_id in os.listdir(runs_dir):
+            meta_path = os.path.join(runs_dir, run_id, "meta.json")
+            if run_id in known or not os.path.exists(meta_path):
+                continue
+
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+            self.record_run(
+                run_id=run_id,
+                path=os.path.join(runs_dir, run_id),
+                provider=meta.get("provider"),
+                services=meta.get("services", []),
+                spec_hash=meta.get("spec_hash"),
+                created_at=meta.get("created_at")
+            )
+            added += 1
+
+        return added
+
+    # -------------------------
+    # RETENTION / GC
+    # -------------------------
+    def collect_garbage(
+        self,
+        max_age_days: float = None,
+        max_count: int = None,
+        compact_after_days: float = None,
+        exclude: set = None
+    ) -> dict:
+        """
+        Delete runs older than max_age_days or beyond the newest max_count,
+        and strip re-creatable artifacts from runs older than
+        compact_after_days. Active runs and `exclude` (run ids with queued
+        jobs) are never touched; runs holding infra are only compacted.
+        """
+        exclude = exclude or set()
+        conn = self._connect()
+        placeholders = ",".join("?" for _ in ACTIVE_STATUSES)
+        rows = conn.execute(
+            f"SELECT run_id, path, created_at, infra FROM runs "
+            f"WHERE status NOT IN ({placeholders}) ORDER BY created_at DESC",
+            ACTIVE_STATUSES
+        ).fetchall()
+        conn.close()
+        rows = [r for r in rows if r["run_id"] not in exclude]
+
+        now = datetime.utcnow()
+        age_cutoff = (now - timedelta(days=max_age_days)).isoformat() if max_age_days else None
+        compact_cutoff = (
+            (now - timedelta(days=compact_after_days)).isoformat()
+            if compact_after_days else None
+        )
+
+        pruned, compacted = [], []
+        for i, row in enumerate(rows):
+            too_old = age_cutoff and row["created_at"] < age_cutoff
+            too_many = max_count is not None and i >= max_count
+
+            if (too_old or too_many) and not self._holds_infra(row):
+                shutil.rmtree(row["path"], ignore_errors=True)
+                pruned.append(row["run_id"])
+            elif compact_cutoff and row["created_at"] < compact_cutoff:
+                if self._compact(row["path"]):
+                    compacted.append(row["run_id"])
+
+        if pruned:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "DELETE FROM run_services WHERE run_id = ?", [(r,) for r in pruned]
+                    )
+                    conn.executemany(
+                        "DELETE FROM runs WHERE run_id = ?", [(r,) for r in pruned]
+                    )
+            finally:
+                conn.close()
+
+        return {"pruned": pruned, "compacted": compacted}
+
+    def _holds_infra(self, row) -> bool:
+        """Deleting the run would orphan its tfstate (and the resources in it)."""
+        if row["infra"] == INFRA_LIVE:
+            return True
+        if row["infra"] == INFRA_DESTROYED:
+            return False
+        # no history (e.g. backfilled from disk): trust the state files
+        return any(os.path.exists(os.path.join(row["path"], f)) for f in STATE_FILES)
+
+    def _compact(self, run_path: str) -> bool:
+        removed = False
+        for name in COMPACTABLE:
+            path = os.path.join(run_path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed = True
+            elif os.path.exists(path):
+                os.remove(path)
+                removed = True
+        return removed
+
+    def start_gc(self, interval_s: float = 3600, active_runs=None, **retention) -> threading.Event:
+        """
+        Run collect_garbage every interval_s in a daemon thread; set the
+        returned event to stop. active_runs: callable returning the run ids
+        that have queued / running jobs (see TerraformJobQueue.active_runs).
+        """
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval_s):
+                try:
+                    exclude = active_runs() if active_runs else None
+                    result = self.collect_garbage(exclude=exclude, **retention)
+                    if result["pruned"] or result["compacted"]:
+                        print(
+                            f"🧹 Run GC: pruned {len(result['pruned'])}, "
+                            f"compacted {len(result['compacted'])}"
+                        )
+                except Exception as e:
+                    print("❌ Run GC failed:", e)
+
+        threading.Thread(target=loop, name="run-gc", daemon=True).start()
+        return stop
@@ -0,0 +1,438 @@
+"""
+schemas.py
+
+Output schemas for LLM responses, defined once and used to:
+1. Constrain providers (response schema / JSON schema mode)
+2. Validate responses in one pass with a precompiled validator
+3. Repair common defects locally instead of regenerating
+"""
+
+import re
+
+RELATIONS = ["contains", "connects_to"]
+# ids GraphGenerator.normalize gives the networking nodes it adds when missing
+NORMALIZED_NODE_IDS = {"vpc", "subnet"}
+TF_FILES = ["main.tf", "variables.tf", "outputs.tf"]
+
+GRAPH_NODE_SCHEMA = {
+    "type": "object",
+    "required": ["id", "type", "data"],
+    "properties": {
+        "id": {"type": "string"},
+        "type": {"type": "string"},
+        "data": {
+            "type": "object",
+            "required": ["label", "category", "icon"],
+            "properties": {
+                "label": {"type": "string"},
+                "category": {"type": "string"},
+                "icon": {"type": "string"},
+                "cloud": {"type": "string"}
+            }
+        },
+        "config": {"type": "object"}
+    }
+}
+
+GRAPH_EDGE_SCHEMA = {
+    "type": "object",
+    "required": ["source", "target", "relation"],
+    "properties": {
+        "source": {"type": "string"},
+        "target": {"type": "string"},
+        "relation": {"type": "string", "enum": RELATIONS}
+    }
+}
+
+GRAPH_SCHEMA = {
+    "type": "object",
+    "required": ["nodes", "edges"],
+    "properties": {
+        "nodes": {"type": "array", "items": GRAPH_NODE_SCHEMA},
+        "edges": {"type": "array", "items": GRAPH_EDGE_SCHEMA}
+    }
+}
+
+GRAPH_RESPONSE_SCHEMA = {
+    "type": "object",
+    "required": ["summary", "graph"],
+    "properties": {
+        "summary": {"type": "string"},
+        "graph": GRAPH_SCHEMA
+    }
+}
+
+SKELETON_SCHEMA = {
+    "type": "object",
+    "required": ["summary", "zones", "links"],
+    "properties": {
+        "summary": {"type": "string"},
+        "zones": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["id", "name", "components"],
+                "properties": {
+                    "id": {"type": "string"},
+                    "name": {"type": "string"},
+                    "description": {"type": "string"},
+                    "components": {"type": "array", "items": {"type": "string"}}
+                }
+            }
+        },
+        "links": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["source_zone", "source", "target_zone", "target"],
+                "properties": {
+                    "source_zone": {"type": "string"},
+                    "source": {"type": "string"},
+                    "target_zone": {"type": "string"},
+                    "target": {"type": "string"},
+                    "relation": {"type": "string", "enum": RELATIONS}
+                }
+            }
+        }
+    }
+}
+
+EDIT_OPS = ["add_node", "remove_node", "update_node", "add_edge", "remove_edge"]
+
+# edit script against an existing graph (refine); only the fields an op needs are set
+GRAPH_EDIT_SCHEMA = {
+    "type": "object",
+    "required": ["summary", "operations"],
+    "properties": {
+        "summary": {"type": "string"},
+        "operations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["op"],
+                "properties": {
+                    "op": {"type": "string", "enum": EDIT_OPS},
+                    "id": {"type": "string"},
+                    "label": {"type": "string"},
+                    "config": {"type": "object"},
+                    "source": {"type": "string"},
+                    "target": {"type": "string"},
+                    "relation": {"type": "string", "enum": RELATIONS}
+                }
+            }
+        }
+    }
+}
+
+TERRAFORM_RESPONSE_SCHEMA = {
+    "type": "object",
+    "required": TF_FILES,
+    "properties": {name: {"type": "string"} for name in TF_FILES}
+}
+
+
+class SchemaValidationError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Schema validation failed: " + "; ".join(errors[:10]))
+
+
+# ==============================
+# VALIDATOR COMPILER
+# ==============================
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool
+}
+
+
+def compile_schema(schema: dict):
+    """
+    Compile the JSON-schema subset used here (type, required, properties,
+    items, enum) into a closure: validate(value) -> list of error strings.
+    """
+    checks = []
+
+    if "type" in schema:
+        expected = _TYPES[schema["type"]]
+        type_name = schema["type"]
+
+        def check_type(value, path, errors):
+            if not isinstance(value, expected) or (
+                type_name in ("number", "integer") and isinstance(value, bool)
+            ):
+                errors.append(f"{path}: expected {type_name}")
+                return False
+            return True
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = set(schema["enum"])
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} not in {sorted(allowed)}")
+            return True
+        checks.append(check_enum)
+
+    if "required" in schema:
+        required = list(schema["required"])
+
+        def check_required(value, path, errors):
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path}.{key}: required")
+            return True
+        checks.append(check_required)
+
+    if "properties" in schema:
+        props = {k: compile_schema(v) for k, v in schema["properties"].items()}
+
+        def check_properties(value, path, errors):
+            for key, validate in props.items():
+                if key in value:
+                    validate(value[key], f"{path}.{key}", errors)
+            return True
+        checks.append(check_properties)
+
+    if "items" in schema:
+        validate_item = compile_schema(schema["items"])
+
+        def check_items(value, path, errors):
+            for i, item in enumerate(value):
+                validate_item(item, f"{path}[{i}]", errors)
+            return True
+        checks.append(check_items)
+
+    def validate(value, path="$", errors=None):
+        errors = [] if errors is None else errors
+        for check in checks:
+            # a failed type check makes the structural checks meaningless
+            if not check(value, path, errors):
+                break
+        return errors
+
+    return validate
+
+
+validate_graph_response = compile_schema(GRAPH_RESPONSE_SCHEMA)
+validate_terraform_response = compile_schema(TERRAFORM_RESPONSE_SCHEMA)
+validate_skeleton_response = compile_schema(SKELETON_SCHEMA)
+validate_edit_response = compile_schema(GRAPH_EDIT_SCHEMA)
+
+
+# ==============================
+# LOCAL REPAIRS
+# ==============================
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "node"
+
+
+def repair_graph_response(response) -> dict:
+    """
+    Fix the usual LLM defects in place of a retry: missing wrappers,
+    missing ids/defaults, duplicate nodes, dangling / invalid edges.
+    Edges to a missing vpc / subnet are kept: normalize adds those nodes.
+    Raises SchemaValidationError if the result is still invalid.
+    """
+    if not isinstance(response, dict):
+        raise SchemaValidationError(["$: expected object"])
+
+    if "graph" not in response and "nodes" in response:
+        response = {"summary": response.get("summary", ""), "graph": response}
+
+    graph = response.get("graph") if isinstance(response.get("graph"), dict) else {}
+    summary = response.get("summary")
+
+    nodes = []
+    seen = set()
+    for n in graph.get("nodes") or []:
+        if not isinstance(n, dict):
+            continue
+
+        data = n.get("data") if isinstance(n.get("data"), dict) else {
+            k: n[k] for k in ("label", "category", "icon", "cloud") if k in n
+        }
+        label = data.get("label") or n.get("label")
+        if not isinstance(label, str) or not label.strip():
+            continue
+
+        node_id = str(n.get("id") or _slug(label))
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+
+        nodes.append({
+            **n,
+            "id": node_id,
+            "type": n.get("type") or "cloudNode",
+            "data": {
+                **data,
+                "label": label,
+                "category": str(data.get("category") or "other"),
+                "icon": str(data.get("icon") or _slug(label))
+            },
+            "config": n.get("config") if isinstance(n.get("config"), dict) else {}
+        })
+
+    edges = []
+    seen_edges = set()
+    known = seen | NORMALIZED_NODE_IDS
+    for e in graph.get("edges") or []:
+        if not isinstance(e, dict):
+            continue
+        source, target = str(e.get("source", "")), str(e.get("target", ""))
+        if source not in known or target not in known or source == target:
+            continue
+
+        relation = e.get("relation") if e.get("relation") in RELATIONS else "connects_to"
+        if (source, target, relation) in seen_edges:
+            continue
+        seen_edges.add((source, target, relation))
+
+        edges.append({**e, "source": source, "target": target, "relation": relation})
+
+    repaired = {
+        **response,
+        "summary": summary if isinstance(summary, str) else "",
+        "graph": {**graph, "nodes": nodes, "edges": edges}
+    }
+
+    errors = validate_graph_response(repaired)
+    if errors:
+        raise SchemaValidationError(errors)
+    return repaired
+
+
+def coerce_graph_response(response) -> dict:
+    """One validation pass; repair locally only when it fails."""
+    if isinstance(response, dict) and not validate_graph_response(response):
+        return response
+    return repair_graph_response(response)
+
+
+def coerce_skeleton_response(response) -> dict:
+    if isinstance(response, dict) and not validate_skeleton_response(response):
+        return response
+    if not isinstance(response, dict):
+        raise SchemaValidationError(["$: expected object"])
+
+    zones = []
+    seen = set()
+    renamed = {}
+    for z in response.get("zones") or []:
+        if not isinstance(z, dict):
+            continue
+        components = [c for c in z.get("components") or [] if isinstance(c, str) and c.strip()]
+        if not components:
+            continue
+
+        zone_id = _slug(str(z.get("id") or z.get("name") or f"zone-{len(zones) + 1}"))
+        while zone_id in seen:
+            zone_id = f"{zone_id}-{len(zones) + 1}"
+        seen.add(zone_id)
+        renamed[str(z.get("id") or z.get("name"))] = zone_id
+
+        zones.append({
+            "id": zone_id,
+            "name": str(z.get("name") or zone_id),
+            "description": str(z.get("description") or ""),
+            "components": components
+        })
+
+    links = [
+        {
+            **l,
+            "source_zone": renamed.get(l["source_zone"], l["source_zone"]),
+            "target_zone": renamed.get(l["target_zone"], l["target_zone"]),
+            "relation": l.get("relation") if l.get("relation") in RELATIONS else "connects_to"
+        }
+        for l in response.get("links") or []
+        if isinstance(l, dict)
+        and all(isinstance(l.get(k), str) for k in ("source_zone", "source", "target_zone", "target"))
+    ]
+
+    summary = response.get("summary")
+    repaired = {
+        "summary": summary if isinstance(summary, str) else "",
+        "zones": zones,
+        "links": links
+    }
+
+    errors = validate_skeleton_response(repaired)
+    if errors:
+        raise SchemaValidationError(errors)
+    return repaired
+
+
+def coerce_edit_response(response) -> dict:
+    if isinstance(response, dict) and not validate_edit_response(response):
+        return response
+
+    # bare operation lists and "ops" / "edits" wrappers
+    if isinstance(response, list):
+        response = {"operations": response}
+    if not isinstance(response, dict):
+        raise SchemaValidationError(["$: expected object"])
+
+    operations = []
+    raw = response.get("operations", response.get("ops", response.get("edits")))
+    for op in raw or []:
+        if not isinstance(op, dict):
+            continue
+        name = str(op.get("op") or op.get("type") or "").strip().lower().replace("-", "_")
+        if name not in EDIT_OPS:
+            continue
+
+        fixed = {"op": name}
+        for key in ("id", "label", "source", "target"):
+            if op.get(key) is not None:
+                fixed[key] = str(op[key])
+        if isinstance(op.get("config"), dict):
+            fixed["config"] = op["config"]
+        if name in ("add_edge", "remove_edge"):
+            fixed["relation"] = op.get("relation") if op.get("relation") in RELATIONS else "connects_to"
+        operations.append(fixed)
+
+    summary = response.get("summary")
+    repaired = {
+        "summary": summary if isinstance(summary, str) else "",
+        "operations": operations
+    }
+
+    errors = validate_edit_response(repaired)
+    if errors:
+        raise SchemaValidationError(errors)
+    return repaired
+
+
+def coerce_terraform_response(response) -> dict:
+    if not isinstance(response, dict):
+        raise SchemaValidationError(["$: expected object"])
+
+    if not validate_terraform_response(response):
+        return response
+
+    # {"files": {...}} wrappers and "main" instead of "main.tf"
+    if isinstance(response.get("files"), dict):
+        response = response["files"]
+
+    repaired = {}
+    for name in TF_FILES:
+        value = response.get(name, response.get(name[:-3]))
+        if isinstance(value, list):
+            value = "\n".join(str(v) for v in value)
+        if value is None and name != "main.tf":
+            # an empty variables/outputs file is valid Terraform
+            value = ""
+        if value is not None:
+            repaired[name] = value
+
+    errors = validate_terraform_response(repaired)
+    if errors:
+        raise SchemaValidationError(errors)
+    return repaired
@@ -1,73 +1,464 @@
 import os
+import json
+import time
+import hashlib
 import subprocess
 import tempfile
 import shutil
+import threading
+import uuid
+from datetime import datetime
+
+from services.cancellation import Cancelled
+from services.run_logs import get_run_log
+from services.terraform_runners import (
+    PLUGIN_CACHE_MOUNT,
+    PROVIDER_MIRROR_MOUNT,
+    RUNS_MOUNT,
+    write_cli_config
+)
+
+# First line terraform prints once `init` is done
+INIT_MARKER = "Terraform has been successfully initialized"
+
+ACTIONS = ("apply", "destroy", "plan")
+
+# Plan-first contract with the runner: TF_ACTION=plan writes $TF_PLAN_FILE
+# plus `terraform show -json` output to $TF_PLAN_FILE.json;
+# TF_ACTION=apply with TF_PLAN_FILE set applies that saved plan.
+PLAN_FILE = "tfplan"
+PLAN_CACHE_FILE = "plan_cache.json"
+LOCAL_STATE_FILE = "terraform.tfstate"
+
+# Files whose content decides what a plan would do
+FINGERPRINT_SUFFIXES = (".tf", ".tfvars", ".tfstate", ".lock.hcl")
+
+# SA keys live next to runs/, never inside it: warm containers mount all of
+# runs/, so a key there would be readable by every other job's terraform
+CREDS_DIR_NAME = ".terraform-creds"
+# warm execs get the key content through the exec environment instead
+WARM_CREDS_ENV = "GOOGLE_CREDENTIALS"
+
+# seconds terraform gets to exit on SIGTERM (release the state lock)
+# before the run is killed
+STOP_GRACE_S = 10
 
 
 class TerraformExecutor:
-    def __init__(self, run_path: str, project_id: str, sa_key_json: str):
+    def __init__(
+        self,
+        run_path: str,
+        project_id: str,
+        sa_key_json: str,
+        memory: str = "512m",
+        cpus: float = 1,
+        runner_cmd: list = None,
+        plugin_cache_dir: str = None,
+        mirror_dir: str = None,
+        warm_pool=None,
+        registry=None,
+        cancel_token=None
+    ):
+        """
+        runner_cmd: optional local stand-in for the docker runner
+        (e.g. ["python", "fake_runner.py"]). It is started inside run_path
+        with TF_ACTION and GOOGLE_APPLICATION_CREDENTIALS set.
+        plugin_cache_dir / mirror_dir: shared provider plugin cache and
+        read-only provider mirror reused across runs.
+        warm_pool: optional WarmRunnerPool to exec into instead of
+        starting a fresh container.
+        registry: optional RunRegistry kept in sync with run status.
+        cancel_token: optional CancelToken; cancelling it stops the
+        running container and fails the run with Cancelled.
+        """
         self.run_path = os.path.abspath(run_path)
         self.project_id = project_id
         self.sa_key_json = sa_key_json
+        self.memory = memory
+        self.cpus = cpus
+        self.runner_cmd = runner_cmd
+        self.plugin_cache_dir = plugin_cache_dir and os.path.abspath(plugin_cache_dir)
+        self.mirror_dir = mirror_dir and os.path.abspath(mirror_dir)
+        self.warm_pool = warm_pool
+        self.registry = registry
+        self.cancel_token = cancel_token
+        self.run_id = os.path.basename(self.run_path)
+        # cold runs are named so a cancel can `docker stop` them
+        self.container_name = f"tf-{self.run_id}-{uuid.uuid4().hex[:6]}"
+        self.last_timings = None
+        self.last_plan = None
+        self._creds_dir = None
 
         if not os.path.exists(self.run_path):
             raise FileNotFoundError("Run path not found")
 
     def _prepare_creds(self):
-        creds_dir = os.path.join(self.run_path, "creds")
-        os.makedirs(creds_dir, exist_ok=True)
+        creds_root = os.path.join(os.path.dirname(os.path.dirname(self.run_path)), CREDS_DIR_NAME)
+        os.makedirs(creds_root, mode=0o700, exist_ok=True)
+        self._creds_dir = tempfile.mkdtemp(prefix=f"{self.run_id}-", dir=creds_root)
 
-        key_path = os.path.join(creds_dir, "gcp.json")
-        with open(key_path, "w") as f:
+        key_path = os.path.join(self._creds_dir, "gcp.json")
+        with open(os.open(key_path, os.O_WRONLY | os.O_CREAT, 0o600), "w") as f:
             f.write(self.sa_key_json)
 
-        return creds_dir
+        return self._creds_dir
 
     def _cleanup_creds(self):
-        creds_dir = os.path.join(self.run_path, "creds")
-        if os.path.exists(creds_dir):
-            shutil.rmtree(creds_dir)
+        if self._creds_dir and os.path.exists(self._creds_dir):
+            shutil.rmtree(self._creds_dir)
+        self._creds_dir = None
+
+    def _prepare_cli_config(self, cache_path: str, mirror_path: str):
+        if not (self.plugin_cache_dir or self.mirror_dir):
+            return None
+
+        if self.plugin_cache_dir:
+            os.makedirs(self.plugin_cache_dir, exist_ok=True)
+
+        return write_cli_config(
+            os.path.join(self.run_path, ".terraformrc"),
+            plugin_cache_dir=cache_path if self.plugin_cache_dir else None,
+            mirror_dir=mirror_path if self.mirror_dir else None
+        )
+
+    def build_command(self, action: str, creds_dir: str, env: dict = None) -> list:
+        if self.runner_cmd:
+            return list(self.runner_cmd)
+
+        cmd = [
+            "docker", "run", "--rm",
+            "--name", self.container_name,
+            f"--memory={self.memory}",
+            f"--cpus={self.cpus}",
+            "-e", f"TF_ACTION={action}",
+            "-e", "GOOGLE_APPLICATION_CREDENTIALS=/creds/gcp.json",
+            "-v", f"{self.run_path}:/workspace",
+            "-v", f"{creds_dir}:/creds:ro"
+        ]
+
+        for key, value in (env or {}).items():
+            cmd += ["-e", f"{key}={value}"]
+
+        if self._prepare_cli_config(PLUGIN_CACHE_MOUNT, PROVIDER_MIRROR_MOUNT):
+            cmd += ["-e", "TF_CLI_CONFIG_FILE=/workspace/.terraformrc"]
+        if self.plugin_cache_dir:
+            cmd += ["-v", f"{self.plugin_cache_dir}:{PLUGIN_CACHE_MOUNT}"]
+        if self.mirror_dir:
+            cmd += ["-v", f"{self.mirror_dir}:{PROVIDER_MIRROR_MOUNT}:ro"]
 
-    def run(self, action: str = "apply"):
+        return cmd + ["terraform-runner"]
+
+    def _runner_env(self, action: str, creds_dir: str, extra_env: dict = None) -> dict:
+        # only used by the local stand-in; docker gets its env via -e
+        env = dict(os.environ)
+        env.update(extra_env or {})
+        env["TF_ACTION"] = action
+        env["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.join(creds_dir, "gcp.json")
+
+        cli_config = self._prepare_cli_config(self.plugin_cache_dir, self.mirror_dir)
+        if cli_config:
+            env["TF_CLI_CONFIG_FILE"] = cli_config
+        return env
+
+    def _warm_env(self, extra_env: dict = None) -> dict:
+        workdir = f"{RUNS_MOUNT}/{os.path.basename(self.run_path)}"
+        env = dict(extra_env or {})
+
+        if self._prepare_cli_config(PLUGIN_CACHE_MOUNT, PROVIDER_MIRROR_MOUNT):
+            env["TF_CLI_CONFIG_FILE"] = f"{workdir}/.terraformrc"
+        return env
+
+    def run(self, action: str = "apply", confirmed: bool = False, plan_first: bool = False):
         """
-        action: apply | destroy
+        action: apply | destroy | plan
+        confirmed: skip the interactive destroy prompt (API / job queue)
+        plan_first: plan (or reuse the cached plan), then apply that plan
+        file only if it changes something
         """
-        creds_dir = self._prepare_creds()
-        if action not in ("apply", "destroy"):
-            raise ValueError("Action must be 'apply' or 'destroy'")
+        if action not in ACTIONS:
+            raise ValueError("Action must be 'apply', 'destroy' or 'plan'")
 
-        if action == "destroy":
+        if action == "destroy" and not confirmed:
             confirm = input("⚠️ This will DESTROY all infra. Type 'DESTROY' to confirm: ")
             if confirm != "DESTROY":
                 print("❌ Destroy aborted")
-                return
+                return None
+
+        log = get_run_log(self.run_path)
+        log.begin()
+        creds_dir = self._prepare_creds()
+        self._set_status("running", action)
+        status = "failed"
         try:
-            cmd = [
-                "docker", "run", "--rm",
-                "--memory=512m",
-                "--cpus=1",
-                "-e", f"TF_ACTION={action}",
-                "-e", "GOOGLE_APPLICATION_CREDENTIALS=/creds/gcp.json",
-                "-v", f"{self.run_path}:/workspace",
-                "-v", f"{creds_dir}:/creds:ro",
-                "terraform-runner"
-            ]
+            if action == "plan" or (action == "apply" and plan_first):
+                returncode = self._run_plan_first(action, creds_dir, log)
+            else:
+                # a plain apply / destroy changes state behind the plan cache
+                self._invalidate_applied()
+                returncode = self._run_action(action, creds_dir, log)
 
-            print("▶ Running:", " ".join(cmd))
-            subprocess.run(cmd, check=True)
+            status = "succeeded"
+            return returncode
+
+        except Cancelled:
+            status = "cancelled"
+            log.append("⏹ Run cancelled")
+            raise
 
         finally:
+            self._set_status(status, action)
             self._cleanup_creds()
-# from terraform_executor import TerraformExecutor
+            log.end()
 
-# with open("ters.json") as f:
-#     sa_key = f.read()
+    def _set_status(self, status: str, action: str):
+        if self.registry:
+            self.registry.update_status(self.run_id, status, action)
 
-# executor = TerraformExecutor(
-#     run_path="runs/1233",
-#     project_id="my-gcp-project-id",
-#     sa_key_json=sa_key
-# )
+    def _run_action(self, action: str, creds_dir: str, log, extra_env: dict = None) -> int:
+        if self.cancel_token is not None:
+            # e.g. cancelled between plan and apply
+            self.cancel_token.raise_if_cancelled("terraform_run")
 
-# executor.run("destroy")
-# executor.run("apply")
\ No newline at end of file
+        container = None
+        try:
+            started = time.monotonic()
+            popen_kwargs = {}
+
+            if self.runner_cmd:
+                mode = "local"
+                cmd = self.build_command(action, creds_dir)
+                popen_kwargs = {
+                    "cwd": self.run_path,
+                    "env": self._runner_env(action, creds_dir, extra_env)
+                }
+            elif (
+                self.warm_pool
+                and self.warm_pool.covers(self.run_path)
+                and self.warm_pool.sized_for(self.memory, self.cpus)
+            ):
+                mode = "warm"
+                container = self.warm_pool.acquire()
+                cmd = self.warm_pool.exec_command(
+                    container, action, self.run_path, self._warm_env(extra_env),
+                    passthrough=(WARM_CREDS_ENV,)
+                )
+                # value only in the docker client's env: not on argv, not on disk
+                popen_kwargs = {"env": {**os.environ, WARM_CREDS_ENV: self.sa_key_json}}
+            else:
+                mode = "cold"
+                cmd = self.build_command(action, creds_dir, extra_env)
+
+            print("▶ Running:", " ".join(cmd))
+            log.append(f"▶ Running: {action} ({mode})")
+            returncode = self._execute(cmd, action, mode, started, popen_kwargs, log, container)
+
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd)
+            return returncode
+
+        finally:
+            if container:
+                self.warm_pool.release(container)
+
+    # -------------------------
+    # PLAN CACHE
+    # -------------------------
+    def _run_plan_first(self, action: str, creds_dir: str, log) -> int:
+        cache = self._load_plan_cache()
+        fingerprint = self._fingerprint()
+        plan_env = {"TF_PLAN_FILE": PLAN_FILE}
+
+        # with a remote backend the tree does not change when the state does
+        if (
+            action == "apply"
+            and os.path.exists(os.path.join(self.run_path, LOCAL_STATE_FILE))
+            and fingerprint == cache.get("applied_fingerprint")
+        ):
+            return self._skip_apply("unchanged_since_last_apply", cache.get("plan"), log)
+
+        plan_path = os.path.join(self.run_path, PLAN_FILE)
+        if (
+            fingerprint == cache.get("fingerprint")
+            and os.path.exists(plan_path)
+            and os.path.exists(f"{plan_path}.json")
+        ):
+            plan = dict(cache["plan"], reused=True)
+            log.append(f"♻ Reusing cached plan {plan['plan_hash'][:12]}")
+        else:
+            self._run_action("plan", creds_dir, log, plan_env)
+            plan = dict(self._summarize_plan(f"{plan_path}.json"), reused=False)
+            # init may have written the lock file; key on the post-plan tree
+            cache["fingerprint"] = self._fingerprint()
+            cache["plan"] = plan
+            self._save_plan_cache(cache)
+
+        self.last_plan = plan
+        if action == "plan":
+            return 0
+
+        if plan["empty"]:
+            return self._skip_apply("no_changes", plan, log)
+        if plan["plan_hash"] == cache.get("applied_plan_hash"):
+            return self._skip_apply("identical_to_last_applied_plan", plan, log)
+
+        # a failed apply may still have changed state
+        self._invalidate_applied(cache)
+        returncode = self._run_action("apply", creds_dir, log, plan_env)
+
+        # state changed: the saved plan is stale, remember what was applied
+        cache["fingerprint"] = None
+        cache["applied_plan_hash"] = plan["plan_hash"]
+        cache["applied_fingerprint"] = self._fingerprint()
+        cache["applied_at"] = datetime.utcnow().isoformat()
+        self._save_plan_cache(cache)
+
+        return returncode
+
+    def _invalidate_applied(self, cache: dict = None):
+        """Forget the last applied plan / tree; the next plan_first apply re-plans."""
+        cache = self._load_plan_cache() if cache is None else cache
+        if not cache:
+            return
+        cache["fingerprint"] = None
+        cache["applied_fingerprint"] = None
+        cache["applied_plan_hash"] = None
+        self._save_plan_cache(cache)
+
+    def _skip_apply(self, reason: str, plan: dict, log) -> int:
+        self.last_plan = dict(plan or {}, skipped=reason)
+        log.append(f"⏭ Apply skipped: {reason}")
+        return 0
+
+    def _summarize_plan(self, plan_json_path: str) -> dict:
+        with open(plan_json_path) as f:
+            plan = json.load(f)
+
+        changes = sorted(
+            (
+                {
+                    "address": rc.get("address"),
+                    "actions": rc.get("change", {}).get("actions", []),
+                    "after": rc.get("change", {}).get("after")
+                }
+                for rc in plan.get("resource_changes", [])
+                if rc.get("change", {}).get("actions", []) not in (["no-op"], ["read"])
+            ),
+            key=lambda c: c["address"] or ""
+        )
+        digest = hashlib.sha256(
+            json.dumps(changes, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+        return {
+            "plan_hash": digest,
+            "empty": not changes,
+            "changes": [
+                {"address": c["address"], "actions": c["actions"]} for c in changes
+            ]
+        }
+
+    def _fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(self.run_path):
+            dirs[:] = sorted(d for d in dirs if d not in (".terraform", "creds"))
+            for name in sorted(files):
+                if not name.endswith(FINGERPRINT_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, self.run_path).encode("utf-8"))
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(65536), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load_plan_cache(self) -> dict:
+        path = os.path.join(self.run_path, PLAN_CACHE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_plan_cache(self, cache: dict):
+        with open(os.path.join(self.run_path, PLAN_CACHE_FILE), "w") as f:
+            json.dump(cache, f, indent=2)
+
+    # -------------------------
+    # PROCESS + TIMINGS
+    # -------------------------
+    def _execute(self, cmd, action, mode, started, popen_kwargs, log, container=None) -> int:
+        first_output = None
+        init_done = None
+
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            **popen_kwargs
+        )
+        if self.cancel_token is not None:
+            # stopping may take STOP_GRACE_S; never block the canceller
+            self.cancel_token.on_cancel(lambda: threading.Thread(
+                target=self._stop, args=(proc, mode, container), daemon=True
+            ).start())
+
+        for line in proc.stdout:
+            now = time.monotonic()
+            if first_output is None:
+                first_output = now
+            if init_done is None and INIT_MARKER in line:
+                init_done = now
+            log.append(line)
+
+        returncode = proc.wait()
+        finished = time.monotonic()
+
+        # startup ~ time to first output; init ~ time until init finished
+        self.last_timings = {
+            "action": action,
+            "mode": mode,
+            "plugin_cache": bool(self.plugin_cache_dir),
+            "mirror": bool(self.mirror_dir),
+            "startup_s": round(first_output - started, 3) if first_output else None,
+            "init_s": round(init_done - started, 3) if init_done else None,
+            "total_s": round(finished - started, 3),
+            "returncode": returncode,
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        with open(os.path.join(self.run_path, "timings.jsonl"), "a") as f:
+            f.write(json.dumps(self.last_timings) + "\n")
+
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled("terraform_run")
+        return returncode
+
+    def _stop(self, proc, mode: str, container: str = None):
+        if proc.poll() is not None:
+            return
+        print(f"⏹ Stopping {mode} run {self.run_id}")
+
+        if mode == "cold":
+            # the docker client exiting does not stop the container
+            subprocess.run(
+                ["docker", "stop", f"--time={STOP_GRACE_S}", self.container_name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        elif mode == "warm":
+            # like `docker stop` for cold runs: SIGTERM lets terraform finish
+            # its current operation and release the state lock before the
+            # container is removed; retire first so no other job gets it
+            self.warm_pool.retire(container)
+            self.warm_pool.signal(container, "terraform")
+            try:
+                proc.wait(STOP_GRACE_S)
+            except subprocess.TimeoutExpired:
+                pass
+            self.warm_pool.discard(container)
+
+        proc.terminate()
+        try:
+            proc.wait(STOP_GRACE_S)
+        except subprocess.TimeoutExpired:
+            proc.kill()
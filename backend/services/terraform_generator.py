@@ -1,8 +1,16 @@
 import os
 import json
 import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from llmchat import GroqLLM
+from services.llmchat.factory import get_llm
+from services.run_registry import RunRegistry
+from services.schemas import TERRAFORM_RESPONSE_SCHEMA, coerce_terraform_response
+from services.terraform_hcl import merge_file_sets, preflight
+
+# Bump when the module prompt/contract changes so cached modules are rebuilt
+MODULE_PROMPT_VERSION = "1"
 
 
 class TerraformGenerator:
@@ -13,9 +21,14 @@ class TerraformGenerator:
 
     BASE_DIR = os.path.join(os.getcwd(), "runs")
    # Docker-safe base path
+    MODULE_CACHE_DIR = os.path.join(BASE_DIR, "_module_cache")
+    FANOUT_MAX_WORKERS = 4
 
-    def __init__(self):
-        self.llm = GroqLLM()
+    def __init__(self, llm_provider="groq", registry: RunRegistry = None):
+        self.llm = get_llm(llm_provider, priority="batch")
+        # pass the app's registry; without one, runs are indexed by
+        # RunRegistry.sync_from_disk on the next startup
+        self.registry = registry
 
     # -------------------------
     # PROMPT
@@ -52,15 +65,143 @@ Output format:
             }
         ]
 
+    def build_module_prompt(self, provider: str, name: str, service: dict, deps: list):
+        dep_vars = "\n".join(f"  - {d}_id (string)" for d in deps) or "  (none)"
+
+        return [
+            {
+                "role": "system",
+                "content": f"""
+You are a Terraform module generator.
+
+STRICT RULES:
+- Cloud: Google Cloud (GCP) ONLY
+- Generate ONE reusable Terraform module for the service in the input
+- Generate EXACTLY 3 files:
+  - main.tf
+  - variables.tf
+  - outputs.tf
+- Do NOT declare provider or terraform blocks
+- Declare these input variables:
+  - project_id (string)
+  - region (string)
+{dep_vars}
+- Reference other services ONLY through the variables above
+- Declare an output named "id" with the primary resource id
+- Do NOT create resources not in input
+- Do NOT exceed instance counts
+- Do NOT explain anything
+- Output MUST be valid JSON
+
+Output format:
+{{
+  "main.tf": "...",
+  "variables.tf": "...",
+  "outputs.tf": "..."
+}}
+"""
+            },
+            {
+                "role": "user",
+                "content": json.dumps({
+                    "provider": provider,
+                    "service": name,
+                    "config": service,
+                    "depends_on": deps
+                }, indent=2)
+            }
+        ]
+
     # -------------------------
     # GENERATE + SAVE
     # -------------------------
     def generate_and_store(self, infra_spec: dict) -> dict:
         messages = self.build_prompt(infra_spec)
 
-        response = self.llm.generate_json(messages)
+        response = self.llm.generate_json(messages, schema=TERRAFORM_RESPONSE_SCHEMA)
         files = self.normalize(response)
 
+        return self._store_run(infra_spec, files)
+
+    def generate_modular(self, infra_spec: dict) -> dict:
+        """
+        One module per canonical service, cached by a hash of the
+        service config + relationships. Only changed services hit the LLM;
+        the root module is recomposed from the cached pieces.
+        """
+        provider = infra_spec.get("provider")
+        services = infra_spec.get("services", {})
+
+        files = {}
+        module_hashes = {}
+        regenerated = []
+
+        for name, service in services.items():
+            deps = self._service_dependencies(name, services)
+            key = self._module_hash(provider, name, services)
+
+            module_files = self._load_cached_module(key)
+            if module_files is None:
+                messages = self.build_module_prompt(provider, name, service, deps)
+                module_files = self.normalize(self.llm.generate_json(messages, schema=TERRAFORM_RESPONSE_SCHEMA))
+                self._save_cached_module(key, module_files)
+                regenerated.append(name)
+
+            for filename, content in module_files.items():
+                files[f"modules/{name}/{filename}"] = content
+            module_hashes[name] = key
+
+        files.update(self._compose_root(services))
+
+        result = self._store_run(infra_spec, files, {
+            "mode": "modular",
+            "modules": module_hashes,
+            "regenerated": regenerated
+        })
+        result["regenerated"] = regenerated
+        result["reused"] = [n for n in services if n not in regenerated]
+        return result
+
+    def generate_fanout(self, infra_spec: dict, max_workers: int = None) -> dict:
+        """
+        Split the spec into independent service groups (connected along
+        relationship edges) and generate each group concurrently.
+        Wall-clock time is bounded by the slowest group.
+        """
+        provider = infra_spec.get("provider")
+        services = infra_spec.get("services", {})
+        groups = self._service_groups(services)
+
+        def generate_group(group):
+            sub_spec = {
+                "provider": provider,
+                "services": {name: services[name] for name in group}
+            }
+            messages = self.build_prompt(sub_spec)
+            messages.append({
+                "role": "system",
+                "content": (
+                    "This is ONE PART of a larger infrastructure. "
+                    "Use a single provider \"google\" block that sets "
+                    "project = var.project_id and region = var.region. "
+                    "Declare variables project_id and region with no defaults. "
+                    "Prefix every output name with its service name."
+                )
+            })
+            return self.normalize(self.llm.generate_json(messages, schema=TERRAFORM_RESPONSE_SCHEMA))
+
+        workers = min(max_workers or self.FANOUT_MAX_WORKERS, len(groups)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            file_sets = list(pool.map(generate_group, groups))
+
+        files = merge_file_sets(file_sets)
+
+        return self._store_run(infra_spec, files, {
+            "mode": "fanout",
+            "groups": groups
+        })
+
+    def _store_run(self, infra_spec: dict, files: dict, extra_meta: dict = None) -> dict:
         run_id = self._create_run_id()
         run_path = os.path.join(self.BASE_DIR, run_id)
 
@@ -68,7 +209,9 @@ Output format:
 
         # Save Terraform files
         for filename, content in files.items():
-            with open(os.path.join(run_path, filename), "w") as f:
+            file_path = os.path.join(run_path, filename)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
                 f.write(content)
 
         # Save metadata (important for later execution)
@@ -76,37 +219,163 @@ Output format:
             "run_id": run_id,
             "provider": infra_spec.get("provider"),
             "created_at": datetime.utcnow().isoformat(),
-            "services": list(infra_spec.get("services", {}).keys())
+            "services": list(infra_spec.get("services", {}).keys()),
+            "spec_hash": self._spec_hash(infra_spec),
+            **(extra_meta or {})
         }
 
         with open(os.path.join(run_path, "meta.json"), "w") as f:
             json.dump(meta, f, indent=2)
 
+        if self.registry:
+            self.registry.record_run(
+                run_id=run_id,
+                path=run_path,
+                provider=meta["provider"],
+                services=meta["services"],
+                spec_hash=meta["spec_hash"],
+                created_at=meta["created_at"]
+            )
+
         return {
             "run_id": run_id,
             "path": run_path,
             "files": list(files.keys())
         }
 
+    # -------------------------
+    # MODULE COMPOSITION
+    # -------------------------
+    def _compose_root(self, services: dict) -> dict:
+        main = [
+            'provider "google" {',
+            "  project = var.project_id",
+            "  region  = var.region",
+            "}"
+        ]
+        outputs = []
+
+        for name in services:
+            main += [
+                "",
+                f'module "{name}" {{',
+                f'  source     = "./modules/{name}"',
+                "  project_id = var.project_id",
+                "  region     = var.region"
+            ]
+            for dep in self._service_dependencies(name, services):
+                main.append(f"  {dep}_id = module.{dep}.id")
+            main.append("}")
+
+            outputs += [
+                f'output "{name}_id" {{',
+                f"  value = module.{name}.id",
+                "}",
+                ""
+            ]
+
+        variables = [
+            'variable "project_id" {',
+            "  type = string",
+            "}",
+            "",
+            'variable "region" {',
+            "  type    = string",
+            '  default = "us-central1"',
+            "}"
+        ]
+
+        return {
+            "main.tf": "\n".join(main) + "\n",
+            "variables.tf": "\n".join(variables) + "\n",
+            "outputs.tf": "\n".join(outputs).rstrip() + "\n"
+        }
+
+    def _service_dependencies(self, name: str, services: dict) -> list:
+        # InfraSpecBuilder links services by name (e.g. "subnet": "subnet")
+        return sorted({
+            v for v in services[name].values()
+            if isinstance(v, str) and v in services and v != name
+        })
+
+    def _service_groups(self, services: dict) -> list:
+        # connected components over (undirected) relationship edges
+        parent = {name: name for name in services}
+
+        def find(name):
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        for name in services:
+            for dep in self._service_dependencies(name, services):
+                parent[find(name)] = find(dep)
+
+        groups = {}
+        for name in services:
+            groups.setdefault(find(name), []).append(name)
+
+        return list(groups.values())
+
+    def _module_hash(self, provider: str, name: str, services: dict) -> str:
+        dependents = sorted(
+            other for other in services
+            if other != name and name in self._service_dependencies(other, services)
+        )
+        payload = json.dumps({
+            "version": MODULE_PROMPT_VERSION,
+            "provider": provider,
+            "service": name,
+            "config": services[name],
+            "depends_on": self._service_dependencies(name, services),
+            "dependents": dependents
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_cached_module(self, key: str):
+        path = os.path.join(self.MODULE_CACHE_DIR, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_cached_module(self, key: str, files: dict):
+        os.makedirs(self.MODULE_CACHE_DIR, exist_ok=True)
+        path = os.path.join(self.MODULE_CACHE_DIR, f"{key}.json")
+
+        # write-then-rename so concurrent generators never read a partial file
+        tmp_path = f"{path}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(files, f)
+        os.replace(tmp_path, path)
+
     # -------------------------
     # NORMALIZATION
     # -------------------------
     def normalize(self, response: dict) -> dict:
         required = ["main.tf", "variables.tf", "outputs.tf"]
 
+        response = coerce_terraform_response(response)
         for f in required:
             if f not in response:
                 raise ValueError(f"Missing Terraform file: {f}")
 
-        return {
+        # syntax / reference check in pure Python, before any container runs
+        return preflight({
             "main.tf": response["main.tf"],
             "variables.tf": response["variables.tf"],
             "outputs.tf": response["outputs.tf"]
-        }
+        })
 
     # -------------------------
     # HELPERS
     # -------------------------
+    def _spec_hash(self, infra_spec: dict) -> str:
+        payload = json.dumps(infra_spec, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     def _create_run_id(self) -> str:
         ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
         uid = uuid.uuid4().hex[:6]
@@ -0,0 +1,514 @@
+"""
+terraform_hcl.py
+
+Minimal, dependency-free HCL helpers for LLM-generated Terraform:
+1. Top-level block splitting (strings, heredocs and comments aware)
+2. Merging several generated file sets with conflict detection
+3. Pre-flight checks (syntax, undefined references, duplicate blocks)
+   with local repair, run before any container is started
+"""
+
+import re
+
+TF_FILES = ["main.tf", "variables.tf", "outputs.tf"]
+
+# Blocks that may legally appear more than once with the same key
+REPEATABLE_BLOCKS = {"locals"}
+
+# Undefined variables repair may declare: a non-interactive plan fails on a
+# variable without a value, so only names with a safe default qualify
+INFERRED_DEFAULTS = {
+    "region": "us-central1",
+    "zone": "us-central1-a"
+}
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*")
+_HEREDOC_RE = re.compile(r"<<-?([A-Za-z_][A-Za-z0-9_]*)[ \t]*\n")
+
+
+class HCLSyntaxError(ValueError):
+    def __init__(self, message, line=None):
+        self.message = message
+        self.line = line
+        super().__init__(f"line {line}: {message}" if line else message)
+
+
+class TerraformValidationError(ValueError):
+    def __init__(self, issues):
+        self.issues = issues
+        super().__init__(
+            "Terraform pre-flight failed: "
+            + "; ".join(f"{i['file']}:{i['line']} {i['message']}" for i in issues[:10])
+        )
+
+
+class TerraformMergeConflict(ValueError):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(
+            "Conflicting Terraform blocks: " + ", ".join(conflicts)
+        )
+
+
+# ==============================
+# LEXING HELPERS
+# ==============================
+def _line_of(text, pos):
+    return text.count("\n", 0, pos) + 1
+
+
+def _skip_comment(text, i):
+    """Return index after a comment starting at i, or i if none."""
+    if text.startswith("#", i) or text.startswith("//", i):
+        end = text.find("\n", i)
+        return len(text) if end == -1 else end + 1
+
+    if text.startswith("/*", i):
+        end = text.find("*/", i + 2)
+        if end == -1:
+            raise HCLSyntaxError("Unterminated block comment", _line_of(text, i))
+        return end + 2
+
+    return i
+
+
+def _skip_string(text, i):
+    """i points at the opening quote; returns index after the closing one."""
+    start = i
+    i += 1
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == '"':
+            return i + 1
+        if ch == "\n":
+            break
+        if text.startswith("${", i) or text.startswith("%{", i):
+            i = _skip_braces(text, i + 1)
+            continue
+        i += 1
+
+    raise HCLSyntaxError("Unterminated string", _line_of(text, start))
+
+
+def _skip_heredoc(text, i):
+    m = _HEREDOC_RE.match(text, i)
+    marker = m.group(1)
+    end = re.compile(rf"^[ \t]*{marker}[ \t]*$", re.M).search(text, m.end())
+    if not end:
+        raise HCLSyntaxError(f"Unterminated heredoc <<{marker}", _line_of(text, i))
+    return end.end()
+
+
+def _skip_braces(text, i):
+    """i points at '{'; returns index after the matching '}'."""
+    start = i
+    depth = 0
+    while i < len(text):
+        j = _skip_comment(text, i)
+        if j != i:
+            i = j
+            continue
+
+        ch = text[i]
+        if ch == '"':
+            i = _skip_string(text, i)
+            continue
+        if ch == "<" and _HEREDOC_RE.match(text, i):
+            i = _skip_heredoc(text, i)
+            continue
+
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+
+    raise HCLSyntaxError("Unbalanced '{'", _line_of(text, start))
+
+
+# ==============================
+# BLOCK SPLITTING
+# ==============================
+def split_blocks(text):
+    """
+    Split a .tf file into its top-level blocks.
+
+    Returns a list of dicts:
+      {"type", "labels", "key", "body", "text", "line"}
+    """
+    blocks = []
+    i = 0
+    n = len(text)
+
+    while i < n:
+        if text[i].isspace():
+            i += 1
+            continue
+
+        j = _skip_comment(text, i)
+        if j != i:
+            i = j
+            continue
+
+        start = i
+        m = _IDENT_RE.match(text, i)
+        if not m:
+            raise HCLSyntaxError(
+                f"Unexpected character {text[i]!r} at top level", _line_of(text, i)
+            )
+        block_type = m.group(0)
+        i = m.end()
+
+        # ---------- labels ----------
+        labels = []
+        while True:
+            while i < n and text[i] in " \t":
+                i += 1
+            if i >= n:
+                raise HCLSyntaxError(f"Incomplete '{block_type}' block", _line_of(text, start))
+
+            if text[i] == '"':
+                end = _skip_string(text, i)
+                labels.append(text[i + 1:end - 1])
+                i = end
+            elif text[i] == "{":
+                break
+            else:
+                m = _IDENT_RE.match(text, i)
+                if not m:
+                    raise HCLSyntaxError(
+                        f"Expected '{{' after '{block_type}'", _line_of(text, i)
+                    )
+                labels.append(m.group(0))
+                i = m.end()
+
+        body_start = i
+        i = _skip_braces(text, i)
+
+        blocks.append({
+            "type": block_type,
+            "labels": labels,
+            "key": (block_type, *labels),
+            "body": text[body_start + 1:i - 1],
+            "text": text[start:i],
+            "line": _line_of(text, start)
+        })
+
+    return blocks
+
+
+def _canonical(block_text):
+    return " ".join(block_text.split())
+
+
+# ==============================
+# MERGING
+# ==============================
+def merge_file_sets(file_sets):
+    """
+    Merge several {main.tf, variables.tf, outputs.tf} dicts into one.
+
+    Identical blocks (ignoring whitespace) are de-duplicated; the same
+    block key with different content anywhere raises TerraformMergeConflict.
+    """
+    merged = {name: [] for name in TF_FILES}
+    seen = {}
+    conflicts = []
+
+    for files in file_sets:
+        for filename in TF_FILES:
+            for block in split_blocks(files.get(filename, "")):
+                key = block["key"]
+                canonical = _canonical(block["text"])
+
+                if key in seen and block["type"] not in REPEATABLE_BLOCKS:
+                    if seen[key] != canonical:
+                        conflicts.append(".".join(key))
+                    continue
+
+                if block["type"] in REPEATABLE_BLOCKS and canonical in seen.values():
+                    continue
+
+                seen[key] = canonical
+                merged[filename].append(block["text"])
+
+    if conflicts:
+        raise TerraformMergeConflict(sorted(set(conflicts)))
+
+    return {
+        filename: "\n\n".join(blocks) + "\n" if blocks else ""
+        for filename, blocks in merged.items()
+    }
+
+
+# ==============================
+# PRE-FLIGHT VALIDATION
+# ==============================
+# Blocks whose key must be unique across the configuration
+UNIQUE_BLOCKS = {"resource", "data", "variable", "output", "module"}
+
+_VAR_REF_RE = re.compile(r"(?<![\w.])var\.([A-Za-z_][A-Za-z0-9_\-]*)")
+_LOCAL_REF_RE = re.compile(r"(?<![\w.])local\.([A-Za-z_][A-Za-z0-9_\-]*)")
+_MODULE_REF_RE = re.compile(r"(?<![\w.])module\.([A-Za-z_][A-Za-z0-9_\-]*)")
+_DATA_REF_RE = re.compile(r"(?<![\w.])data\.([A-Za-z0-9_]+)\.([A-Za-z_][A-Za-z0-9_\-]*)")
+# provider resource types always contain an underscore: google_compute_instance.web
+_RESOURCE_REF_RE = re.compile(r"(?<![\w.])([a-z][a-z0-9]*_[a-z0-9_]+)\.([A-Za-z_][A-Za-z0-9_\-]*)")
+_LOCAL_DEF_RE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_\-]*)[ \t]*=(?!=)", re.M)
+# names bound inside a block that look like resource references
+# (log_config.value, sub_net.id): dynamic block iterators and for-expression variables
+_DYNAMIC_RE = re.compile(r'\bdynamic\s+"([A-Za-z_][A-Za-z0-9_\-]*)"')
+_ITERATOR_RE = re.compile(r"\biterator\s*=\s*([A-Za-z_][A-Za-z0-9_\-]*)")
+_FOR_RE = re.compile(
+    r"[\[{]\s*for\s+([A-Za-z_][A-Za-z0-9_\-]*)(?:\s*,\s*([A-Za-z_][A-Za-z0-9_\-]*))?\s+in\b"
+)
+
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+
+def _interpolations(text, start, end):
+    """Expressions inside ${...} / %{...} of a string or heredoc body."""
+    parts = []
+    i = start
+    while i < end:
+        if text.startswith("$${", i) or text.startswith("%%{", i):
+            i += 3
+            continue
+        if text.startswith("${", i) or text.startswith("%{", i):
+            close = _skip_braces(text, i + 1)
+            parts.append(_code_text(text[i + 2:close - 1]))
+            i = close
+            continue
+        i += 1
+    return " ".join(parts)
+
+
+def _code_text(text):
+    """text with comments and literal string parts blanked; interpolations kept."""
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        j = _skip_comment(text, i)
+        if j != i:
+            out.append(" ")
+            i = j
+            continue
+
+        ch = text[i]
+        if ch == '"':
+            end = _skip_string(text, i)
+            out.append(f" \"{_interpolations(text, i + 1, end - 1)}\" ")
+            i = end
+            continue
+        if ch == "<" and _HEREDOC_RE.match(text, i):
+            body_start = _HEREDOC_RE.match(text, i).end()
+            end = _skip_heredoc(text, i)
+            out.append(f" \"{_interpolations(text, body_start, end)}\" ")
+            i = end
+            continue
+
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _check_brackets(code):
+    stack = []
+    for ch in code:
+        if ch in "([{":
+            stack.append(ch)
+        elif ch in _CLOSING:
+            if not stack or stack.pop() != _CLOSING[ch]:
+                return f"Unbalanced '{ch}'"
+    return f"Unclosed '{stack[-1]}'" if stack else None
+
+
+def _issue(filename, line, kind, message, **extra):
+    return {"file": filename, "line": line, "kind": kind, "message": message, **extra}
+
+
+def _parse_files(files):
+    """[(filename, block, code)] for every block, plus syntax issues."""
+    parsed = []
+    issues = []
+    for filename in TF_FILES:
+        try:
+            blocks = split_blocks(files.get(filename, ""))
+        except HCLSyntaxError as e:
+            issues.append(_issue(filename, e.line, "syntax", e.message))
+            continue
+
+        for block in blocks:
+            try:
+                code = _code_text(block["body"])
+            except HCLSyntaxError as e:
+                line = block["line"] + (e.line or 1) - 1
+                issues.append(_issue(filename, line, "syntax", e.message))
+                continue
+
+            problem = _check_brackets(code)
+            if problem:
+                issues.append(_issue(filename, block["line"], "syntax", f"{problem} in '{'.'.join(block['key'])}'"))
+                continue
+            parsed.append((filename, block, code))
+
+    return parsed, issues
+
+
+def _bound_names(text, code) -> set:
+    """Iterator / for-expression names a block binds (not resource types)."""
+    # dynamic labels are string literals, which code has blanked
+    bound = set(_DYNAMIC_RE.findall(text))
+    bound.update(_ITERATOR_RE.findall(code))
+    for key, value in _FOR_RE.findall(code):
+        bound.add(key)
+        if value:
+            bound.add(value)
+    return bound
+
+
+def validate_files(files):
+    """
+    Check a {main.tf, variables.tf, outputs.tf} set without terraform.
+
+    Returns a list of issues:
+      {"file", "line", "kind", "message", ...}
+    kinds: syntax, duplicate_block, undefined_variable, undefined_local,
+    undefined_resource, undefined_data, undefined_module.
+    """
+    parsed, issues = _parse_files(files)
+
+    # ---------- definitions ----------
+    seen = {}
+    variables, locals_, modules, resources, data_sources = set(), set(), set(), set(), set()
+
+    for filename, block, code in parsed:
+        key = block["key"]
+        labels = block["labels"]
+
+        if block["type"] in UNIQUE_BLOCKS:
+            if key in seen:
+                first_file, first_block = seen[key]
+                identical = _canonical(first_block["text"]) == _canonical(block["text"])
+                issues.append(_issue(
+                    filename, block["line"], "duplicate_block",
+                    f"Duplicate {'.'.join(key)} (first defined in {first_file}:{first_block['line']})",
+                    key=key, identical=identical
+                ))
+            else:
+                seen[key] = (filename, block)
+
+        if block["type"] == "variable" and labels:
+            variables.add(labels[0])
+        elif block["type"] == "module" and labels:
+            modules.add(labels[0])
+        elif block["type"] == "resource" and len(labels) == 2:
+            resources.add((labels[0], labels[1]))
+        elif block["type"] == "data" and len(labels) == 2:
+            data_sources.add((labels[0], labels[1]))
+        elif block["type"] == "locals":
+            locals_.update(_LOCAL_DEF_RE.findall(code))
+
+    # ---------- references ----------
+    reported = set()
+
+    def report(filename, line, kind, name, message):
+        if (kind, name) not in reported:
+            reported.add((kind, name))
+            issues.append(_issue(filename, line, kind, message, name=name))
+
+    for filename, block, code in parsed:
+        line = block["line"]
+
+        for name in _VAR_REF_RE.findall(code):
+            if name not in variables:
+                report(filename, line, "undefined_variable", name, f"Undefined variable var.{name}")
+
+        for name in _LOCAL_REF_RE.findall(code):
+            if name not in locals_:
+                report(filename, line, "undefined_local", name, f"Undefined local.{name}")
+
+        for name in _MODULE_REF_RE.findall(code):
+            if name not in modules:
+                report(filename, line, "undefined_module", name, f"Undefined module.{name}")
+
+        for ref in _DATA_REF_RE.findall(code):
+            if ref not in data_sources:
+                report(filename, line, "undefined_data", ref, f"Undefined data.{ref[0]}.{ref[1]}")
+
+        bound = _bound_names(block["text"], code)
+        for ref in _RESOURCE_REF_RE.findall(code):
+            if ref[0] in bound:
+                continue
+            if ref not in resources:
+                report(filename, line, "undefined_resource", ref, f"Undefined resource {ref[0]}.{ref[1]}")
+
+    return issues
+
+
+def repair_files(files, issues):
+    """
+    Fix what can be fixed locally:
+    - undefined var.x with a default in INFERRED_DEFAULTS -> declare
+      variable "x" (with that default) in variables.tf; any other
+      undefined variable stays an issue
+    - byte-identical duplicate blocks -> keep the first copy
+    Returns (files, remaining_issues).
+    """
+    files = dict(files)
+    remaining = []
+
+    missing_vars = []
+    for i in issues:
+        if i["kind"] == "undefined_variable" and i["name"] in INFERRED_DEFAULTS:
+            if i["name"] not in missing_vars:
+                missing_vars.append(i["name"])
+    duplicates = {
+        (i["file"], i["line"]) for i in issues
+        if i["kind"] == "duplicate_block" and i["identical"]
+    }
+
+    for i in issues:
+        if i["kind"] == "undefined_variable" and i["name"] in INFERRED_DEFAULTS:
+            continue
+        if i["kind"] == "duplicate_block" and i["identical"]:
+            continue
+        remaining.append(i)
+
+    if duplicates:
+        for filename in TF_FILES:
+            blocks = split_blocks(files.get(filename, ""))
+            kept = [b["text"] for b in blocks if (filename, b["line"]) not in duplicates]
+            if len(kept) != len(blocks):
+                files[filename] = "\n\n".join(kept) + "\n" if kept else ""
+
+    if missing_vars:
+        declared = "\n\n".join(
+            f'variable "{name}" {{\n  type    = string\n  default = "{INFERRED_DEFAULTS[name]}"\n}}'
+            for name in missing_vars
+        )
+        current = files.get("variables.tf", "").rstrip()
+        files["variables.tf"] = f"{current}\n\n{declared}\n" if current else f"{declared}\n"
+
+    return files, remaining
+
+
+def preflight(files):
+    """Validate, repair locally, re-validate; raise if anything is left."""
+    issues = validate_files(files)
+    if not issues:
+        return files
+
+    files, remaining = repair_files(files, issues)
+    if remaining:
+        raise TerraformValidationError(remaining)
+
+    issues = validate_files(files)
+    if issues:
+        raise TerraformValidationError(issues)
+    return files
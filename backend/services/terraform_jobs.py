@@ -0,0 +1,379 @@
+"""
+terraform_jobs.py
+
+Asynchronous apply/destroy jobs on top of TerraformExecutor:
+1. submit() returns a job id immediately
+2. A bounded worker pool runs jobs concurrently
+3. Container --memory/--cpus limits are scheduled against a shared budget
+4. One job per run_path at a time; later jobs for a busy run are parked
+   (not holding a worker) and requeued in submission order
+5. cancel() (or a job timeout) drops queued jobs and stops running containers;
+   the timeout counts from submit(), so time spent queued is included
+"""
+
+import os
+import queue
+import subprocess
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+from services.cancellation import REASON_REQUESTED, CancelToken, Cancelled
+from services.run_logs import get_run_log
+from services.terraform_executor import ACTIONS, TerraformExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TERMINAL = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+def parse_memory(value) -> int:
+    """'512m' / '2g' / 256 -> megabytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    value = value.strip().lower()
+    units = {"k": 1 / 1024, "m": 1, "g": 1024}
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value) // (1024 * 1024)
+
+
+class ResourcePool:
+    """
+    Counting semaphore over (memory MB, cpus).
+    """
+
+    def __init__(self, memory_mb: int, cpus: float):
+        self.memory_mb = memory_mb
+        self.cpus = cpus
+        self._free_memory = memory_mb
+        self._free_cpus = cpus
+        self._cond = threading.Condition()
+
+    def fits(self, memory_mb: int, cpus: float) -> bool:
+        return memory_mb <= self.memory_mb and cpus <= self.cpus
+
+    def acquire(self, memory_mb: int, cpus: float):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: memory_mb <= self._free_memory and cpus <= self._free_cpus
+            )
+            self._free_memory -= memory_mb
+            self._free_cpus -= cpus
+
+    def release(self, memory_mb: int, cpus: float):
+        with self._cond:
+            self._free_memory += memory_mb
+            self._free_cpus += cpus
+            self._cond.notify_all()
+
+    def usage(self) -> dict:
+        with self._cond:
+            return {
+                "memory_mb": self.memory_mb - self._free_memory,
+                "cpus": self.cpus - self._free_cpus
+            }
+
+
+class TerraformJob:
+    def __init__(self, run_path, action, project_id, sa_key_json, memory, cpus, plan_first=False, timeout_s=None):
+        self.id = uuid.uuid4().hex
+        self.run_path = os.path.abspath(run_path)
+        self.action = action
+        self.project_id = project_id
+        self.sa_key_json = sa_key_json
+        self.memory = memory
+        self.cpus = cpus
+        self.plan_first = plan_first
+        self.cancel_token = CancelToken("terraform-job", timeout_s=timeout_s)
+
+        self.status = JOB_QUEUED
+        self.returncode = None
+        self.error = None
+        self.timings = None
+        self.plan = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        # never expose credentials
+        return {
+            "job_id": self.id,
+            "run_id": os.path.basename(self.run_path),
+            "action": self.action,
+            "status": self.status,
+            "returncode": self.returncode,
+            "error": self.error,
+            "timings": self.timings,
+            "plan": self.plan,
+            "memory": self.memory,
+            "cpus": self.cpus,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class TerraformJobQueue:
+    def __init__(
+        self,
+        max_workers: int = 2,
+        total_memory: str = "2g",
+        total_cpus: float = 2,
+        runner_cmd: list = None,
+        plugin_cache_dir: str = None,
+        mirror_dir: str = None,
+        warm_pool=None,
+        registry=None
+    ):
+        self.max_workers = max_workers
+        self.runner_cmd = runner_cmd
+        self.plugin_cache_dir = plugin_cache_dir
+        self.mirror_dir = mirror_dir
+        self.warm_pool = warm_pool
+        self.registry = registry
+        self.resources = ResourcePool(parse_memory(total_memory), total_cpus)
+
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._run_owners = {}  # run_path -> id of the job holding it
+        self._deferred = {}    # run_path -> jobs waiting for it
+        self._lock = threading.Lock()
+        self._workers = []
+
+    # -------------------------
+    # LIFECYCLE
+    # -------------------------
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                t = threading.Thread(
+                    target=self._worker, name=f"terraform-worker-{i}", daemon=True
+                )
+                t.start()
+                self._workers.append(t)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for t in workers:
+                t.join()
+
+    # -------------------------
+    # PUBLIC API
+    # -------------------------
+    def submit(
+        self,
+        run_path: str,
+        action: str,
+        project_id: str,
+        sa_key_json: str,
+        confirm_destroy: bool = False,
+        memory: str = "512m",
+        cpus: float = 1,
+        plan_first: bool = False,
+        timeout_s: float = None
+    ) -> str:
+        if action not in ACTIONS:
+            raise ValueError("Action must be 'apply', 'destroy' or 'plan'")
+
+        if action == "destroy" and not confirm_destroy:
+            raise ValueError("Destroy jobs require confirm_destroy=True")
+
+        if not os.path.exists(run_path):
+            raise FileNotFoundError("Run path not found")
+
+        if not self.resources.fits(parse_memory(memory), cpus):
+            raise ValueError(
+                f"Job needs {memory} / {cpus} cpus, pool only has "
+                f"{self.resources.memory_mb}m / {self.resources.cpus} cpus"
+            )
+
+        job = TerraformJob(
+            run_path, action, project_id, sa_key_json, memory, cpus, plan_first, timeout_s
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+
+        # keep log tails open while the job waits for a worker
+        get_run_log(job.run_path).begin()
+        # the run record is only written once the executor starts: a job
+        # cancelled while queued must not overwrite what last ran (run GC
+        # keeps runs with queued jobs via active_runs())
+        self.start()
+        self._queue.put(job)
+        return job.id
+
+    def status(self, job_id: str) -> dict:
+        return self._get(job_id).to_dict()
+
+    def result(self, job_id: str, timeout: float = None) -> dict:
+        """Block until the job finishes (or timeout) and return its status."""
+        job = self._get(job_id)
+        job.done.wait(timeout)
+        return job.to_dict()
+
+    def cancel(self, job_id: str) -> dict:
+        """
+        Queued jobs are finished as cancelled right away; running jobs get
+        their container stopped and finish as cancelled shortly after.
+        Raises ValueError for jobs that already finished.
+        """
+        job = self._get(job_id)
+        with self._lock:
+            if job.status in JOB_TERMINAL:
+                raise ValueError(f"Job already {job.status}: {job_id}")
+            queued = job.status == JOB_QUEUED
+            if queued:
+                job.status = JOB_CANCELLED
+                job.error = "Cancelled before start"
+
+        job.cancel_token.cancel(REASON_REQUESTED)
+        if queued:
+            self._finish(job)
+        return job.to_dict()
+
+    def active_runs(self) -> set:
+        """Run ids with a queued or running job (kept away from run GC)."""
+        with self._lock:
+            return {
+                os.path.basename(j.run_path) for j in self._jobs.values()
+                if j.status in (JOB_QUEUED, JOB_RUNNING)
+            }
+
+    def list_jobs(self, run_id: str = None) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [
+            j.to_dict() for j in jobs
+            if run_id is None or os.path.basename(j.run_path) == run_id
+        ]
+
+    # -------------------------
+    # WORKERS
+    # -------------------------
+    def _get(self, job_id: str) -> TerraformJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return job
+
+    def _claim_run(self, job: TerraformJob) -> bool:
+        """Take job.run_path, or park the job until it is released."""
+        with self._lock:
+            owner = self._run_owners.setdefault(job.run_path, job.id)
+            if owner == job.id:
+                return True
+            self._deferred.setdefault(job.run_path, deque()).append(job)
+            return False
+
+    def _release_run(self, job: TerraformJob):
+        """Hand the run to the next parked job (if any) and requeue it."""
+        with self._lock:
+            waiting = self._deferred.get(job.run_path)
+            if waiting:
+                next_job = waiting.popleft()
+                if not waiting:
+                    del self._deferred[job.run_path]
+                self._run_owners[job.run_path] = next_job.id
+            else:
+                next_job = None
+                self._run_owners.pop(job.run_path, None)
+        if next_job is not None:
+            self._queue.put(next_job)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: TerraformJob):
+        if not self._claim_run(job):
+            # another job is on this run; don't hold a worker waiting for it
+            return
+
+        memory_mb = parse_memory(job.memory)
+        try:
+            # cancelled jobs still pass the run on to the next parked one
+            if job.status == JOB_CANCELLED:
+                return
+            self.resources.acquire(memory_mb, job.cpus)
+            try:
+                with self._lock:
+                    # cancel() may have finished it while it waited
+                    started = job.status == JOB_QUEUED
+                    if started:
+                        job.status = JOB_RUNNING
+                if started:
+                    self._run(job)
+            finally:
+                self.resources.release(memory_mb, job.cpus)
+        finally:
+            self._release_run(job)
+
+    def _run(self, job: TerraformJob):
+        try:
+            job.started_at = datetime.utcnow().isoformat()
+
+            executor = TerraformExecutor(
+                run_path=job.run_path,
+                project_id=job.project_id,
+                sa_key_json=job.sa_key_json,
+                memory=job.memory,
+                cpus=job.cpus,
+                runner_cmd=self.runner_cmd,
+                plugin_cache_dir=self.plugin_cache_dir,
+                mirror_dir=self.mirror_dir,
+                warm_pool=self.warm_pool,
+                registry=self.registry,
+                cancel_token=job.cancel_token
+            )
+            try:
+                job.returncode = executor.run(
+                    job.action, confirmed=True, plan_first=job.plan_first
+                )
+            finally:
+                job.timings = executor.last_timings
+                job.plan = executor.last_plan
+            job.status = JOB_SUCCEEDED
+
+        except Cancelled as e:
+            job.error = str(e)
+            job.status = JOB_CANCELLED
+
+        except subprocess.CalledProcessError as e:
+            job.returncode = e.returncode
+            job.error = f"Runner exited with code {e.returncode}"
+            job.status = JOB_FAILED
+
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+
+        finally:
+            self._finish(job)
+
+    def _finish(self, job: TerraformJob):
+        job.sa_key_json = None
+        job.finished_at = datetime.utcnow().isoformat()
+        job.cancel_token.close()
+        get_run_log(job.run_path).end()
+        job.done.set()
@@ -0,0 +1,177 @@
+"""
+terraform_runners.py
+
+Cold-start helpers for terraform-runner:
+1. Shared provider plugin cache / filesystem mirror (CLI config)
+2. Pool of pre-warmed runner containers that jobs are exec'd into
+"""
+
+import os
+import queue
+import subprocess
+import threading
+import uuid
+
+PLUGIN_CACHE_MOUNT = "/plugin-cache"
+PROVIDER_MIRROR_MOUNT = "/provider-mirror"
+RUNS_MOUNT = "/runs"
+
+
+def write_cli_config(path: str, plugin_cache_dir: str = None, mirror_dir: str = None) -> str:
+    """
+    Write a terraform CLI config (TF_CLI_CONFIG_FILE) pointing at the
+    plugin cache and, optionally, a read-only filesystem mirror.
+    """
+    lines = []
+    if mirror_dir:
+        lines += [
+            "provider_installation {",
+            "  filesystem_mirror {",
+            f'    path = "{mirror_dir}"',
+            "  }",
+            "  direct {}",
+            "}"
+        ]
+    if plugin_cache_dir:
+        lines.append(f'plugin_cache_dir = "{plugin_cache_dir}"')
+        # cache hits should not fail on lock files written elsewhere
+        lines.append("plugin_cache_may_break_dependency_lock_file = true")
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+class WarmRunnerPool:
+    """
+    Long-lived terraform-runner containers with runs/, the plugin cache
+    and the mirror already mounted. A job borrows one, runs via
+    `docker exec`, and hands it back, skipping container startup.
+
+    entrypoint: command executed inside the container per job; it must
+    honour TF_ACTION and run from the working directory it is given.
+    Credentials are never written under runs/ (every warm container sees
+    all of it); they reach the exec through its environment. Containers
+    are sized once, so only jobs asking for the pool's memory / cpus are
+    exec'd into them.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        runs_dir: str = "runs",
+        image: str = "terraform-runner",
+        entrypoint: tuple = ("/entrypoint.sh",),
+        plugin_cache_dir: str = None,
+        mirror_dir: str = None,
+        memory: str = "512m",
+        cpus: float = 1
+    ):
+        self.size = size
+        self.runs_dir = os.path.abspath(runs_dir)
+        self.image = image
+        self.entrypoint = list(entrypoint)
+        self.plugin_cache_dir = plugin_cache_dir and os.path.abspath(plugin_cache_dir)
+        self.mirror_dir = mirror_dir and os.path.abspath(mirror_dir)
+        self.memory = memory
+        self.cpus = cpus
+
+        self._idle = queue.Queue()
+        self._containers = []
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # LIFECYCLE
+    # -------------------------
+    def start(self):
+        with self._lock:
+            while len(self._containers) < self.size:
+                name = self._start_container()
+                self._containers.append(name)
+                self._idle.put(name)
+
+    def stop(self):
+        with self._lock:
+            containers, self._containers = self._containers, []
+        for name in containers:
+            subprocess.run(
+                ["docker", "rm", "-f", name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+    def _start_container(self) -> str:
+        name = f"tf-warm-{uuid.uuid4().hex[:8]}"
+        cmd = [
+            "docker", "run", "-d", "--rm",
+            "--name", name,
+            f"--memory={self.memory}",
+            f"--cpus={self.cpus}",
+            "-v", f"{self.runs_dir}:{RUNS_MOUNT}"
+        ]
+        if self.plugin_cache_dir:
+            os.makedirs(self.plugin_cache_dir, exist_ok=True)
+            cmd += ["-v", f"{self.plugin_cache_dir}:{PLUGIN_CACHE_MOUNT}"]
+        if self.mirror_dir:
+            cmd += ["-v", f"{self.mirror_dir}:{PROVIDER_MIRROR_MOUNT}:ro"]
+
+        cmd += ["--entrypoint", "sleep", self.image, "infinity"]
+
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        return name
+
+    # -------------------------
+    # DISPATCH
+    # -------------------------
+    def acquire(self, timeout: float = None) -> str:
+        return self._idle.get(timeout=timeout)
+
+    def release(self, name: str):
+        with self._lock:
+            alive = name in self._containers
+        if alive:
+            self._idle.put(name)
+
+    def retire(self, name: str):
+        """Stop handing a container out; release() will not return it to the pool."""
+        with self._lock:
+            if name in self._containers:
+                self._containers.remove(name)
+
+    def signal(self, name: str, process: str, sig: str = "TERM"):
+        """Signal an exec'd process inside a container (the docker client cannot)."""
+        subprocess.run(
+            ["docker", "exec", name, "pkill", f"-{sig}", process],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def discard(self, name: str):
+        """Drop a container that misbehaved and start a replacement."""
+        self.retire(name)
+        subprocess.run(
+            ["docker", "rm", "-f", name],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.start()
+
+    def covers(self, run_path: str) -> bool:
+        return os.path.dirname(os.path.abspath(run_path)) == self.runs_dir
+
+    def sized_for(self, memory: str, cpus: float) -> bool:
+        """Whether a job's limits match the containers' --memory / --cpus."""
+        return (
+            str(memory).strip().lower() == str(self.memory).strip().lower()
+            and float(cpus) == float(self.cpus)
+        )
+
+    def exec_command(self, name: str, action: str, run_path: str, env: dict, passthrough: tuple = ()) -> list:
+        """passthrough: variable names whose values docker exec takes from its own env."""
+        workdir = f"{RUNS_MOUNT}/{os.path.basename(run_path)}"
+        cmd = ["docker", "exec", "-w", workdir, "-e", f"TF_ACTION={action}"]
+        for key, value in env.items():
+            cmd += ["-e", f"{key}={value}"]
+        for key in passthrough:
+            cmd += ["-e", key]
+        return cmd + [name] + self.entrypoint
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import services.* the way main.py does, from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
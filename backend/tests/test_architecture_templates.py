@@ -0,0 +1,57 @@
+import pytest
+
+from services.architecture_templates import TEMPLATES, TemplateMatcher
+
+matcher = TemplateMatcher()
+
+FAST_PATH = [
+    ("3-tier web app on aws", "three_tier_web"),
+    ("web app with a load balancer and mysql database", "three_tier_web"),
+    ("static site + cdn", "static_site_cdn"),
+    ("queue with 3 workers", "queue_worker"),
+    ("serverless api with dynamodb", "serverless_api"),
+    ("k8s cluster with a database behind a load balancer", "kubernetes_microservices"),
+    ("a single vm", "single_vm"),
+    ("blog with a database", "vm_with_database"),
+    ("ingest data through a queue into storage", "data_ingestion"),
+]
+
+LLM_PATH = [
+    # slots the prompt never asked for
+    "5 web servers",
+    "web app",
+    "k8s cluster",
+    "serverless api",
+    "containerized web app",
+    "event driven architecture",
+    # negations and unknown services
+    "3-tier web app without a database",
+    "three tier web app with redis",
+    # too vague / too long
+    "server",
+    " ".join(["web app with a load balancer and a database"] * 6),
+]
+
+
+@pytest.mark.parametrize("prompt,template", FAST_PATH)
+def test_fast_path(prompt, template):
+    matched = matcher.match(prompt)
+    assert matched is not None
+    assert matched[0]["name"] == template
+
+
+@pytest.mark.parametrize("prompt", LLM_PATH)
+def test_deferred_to_llm(prompt):
+    assert matcher.match(prompt) is None
+
+
+@pytest.mark.parametrize("template", TEMPLATES, ids=lambda t: t["name"])
+def test_one_primary_slot(template):
+    assert sum(bool(slot.get("primary")) for slot in template["slots"]) == 1
+
+
+def test_unrequested_slots():
+    three_tier = next(t for t in TEMPLATES if t["name"] == "three_tier_web")
+    assert matcher.unrequested_slots("5 web servers", three_tier) == ["lb", "db"]
+    assert matcher.unrequested_slots("web servers with a database", three_tier) == ["lb"]
+    assert matcher.unrequested_slots("3-tier web app", three_tier) == []